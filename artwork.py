@@ -0,0 +1,213 @@
+# 封面圖片：ID3v2 APIC/PIC（MP3，以及 WAV 的 id3 chunk）、FLAC PICTURE 區塊，沒有內嵌封面時改用
+# 同一資料夾中的 cover.jpg / folder.jpg 等圖檔。這裡只取出原始的圖檔位元組，解碼與縮小在 dmp.py 的執行緒池中。
+# 縮圖以圖片內容的雜湊為鍵存在資料目錄的 thumbnails/ 之下：同一張專輯封面只會解碼、縮小一次
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+
+from library import atomic_write, data_dir
+from tags import flac_blocks, read_id3v2
+
+FRONT_COVER = 3  # ID3 與 FLAC 的圖片類型：封面
+MAX_PICTURE = 32 << 20  # 超過這個大小的圖片視為損壞，不讀取
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# 資料夾封面的檔名（不分大小寫），越前面越優先；AlbumArt_{...}_Large.jpg 之類的名稱以前綴比對
+FOLDER_NAMES = ("cover", "folder", "front", "album", "albumart")
+
+
+# 封面所在的 ID3 frame（v2.3/2.4 與 v2.2）與 FLAC metadata 區塊類型
+PICTURE_FRAMES = ("APIC", "PIC")
+FLAC_PICTURE = 6
+
+
+def _skip_text(data, pos, enc):
+    # 回傳以 NUL 結尾的字串之後的位置；UTF-16 以兩個位元組的 NUL 結尾
+    if enc in (1, 2):
+        while pos + 1 < len(data) and data[pos:pos + 2] != b"\x00\x00":
+            pos += 2
+        return pos + 2
+    end = data.find(b"\x00", pos)
+    return len(data) if end < 0 else end + 1
+
+
+def _apic(fid, body):
+    # 回傳 (圖片類型, 圖片位元組)
+    enc = body[0]
+    if fid == "PIC":
+        pos = 4  # 編碼、三個字元的格式
+    else:
+        pos = _skip_text(body, 1, 0)  # MIME 類型一律為 latin-1
+    kind = body[pos]
+    pos = _skip_text(body, pos + 1, enc)
+    return kind, body[pos:]
+
+
+def _flac_picture(block):
+    ptype, mime_len = struct.unpack(">II", block[:8])
+    pos = 8 + mime_len
+    desc_len = struct.unpack(">I", block[pos:pos + 4])[0]
+    pos += 4 + desc_len + 16  # 寬、高、色深、色盤數
+    size = struct.unpack(">I", block[pos:pos + 4])[0]
+    return ptype, block[pos + 4:pos + 4 + size]
+
+
+def _front_cover(pictures):
+    # pictures: (圖片類型, 圖片位元組)；封面優先，沒有時取第一張
+    found = None
+    for kind, picture in pictures:
+        if picture and kind == FRONT_COVER:
+            return picture
+        if picture and found is None:
+            found = picture
+    return found
+
+
+def read_id3_picture(f):
+    # f 位於 ID3v2 標籤可能的開頭
+    _, frames = read_id3v2(f, PICTURE_FRAMES, MAX_PICTURE)
+    return _front_cover(_apic(fid, body) for fid, body in frames)
+
+
+def read_flac_picture(f):
+    # FLAC 前面也可能有 ID3v2 標籤，不是 FLAC 時改用其中的封面
+    end, frames = read_id3v2(f, PICTURE_FRAMES, MAX_PICTURE)
+    f.seek(end)
+    blocks = flac_blocks(f, (FLAC_PICTURE,), MAX_PICTURE)
+    if blocks is None:
+        return _front_cover(_apic(fid, body) for fid, body in frames)
+    return _front_cover(_flac_picture(block) for _, block in blocks)
+
+
+def read_wav_picture(f):
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        cid, size = chunk[:4], struct.unpack("<I", chunk[4:8])[0]
+        if cid in (b"id3 ", b"ID3 "):
+            return read_id3_picture(f)
+        f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+_READERS = {".mp3": read_id3_picture, ".flac": read_flac_picture, ".wav": read_wav_picture}
+
+
+def read_picture(path):
+    # 內嵌的封面；沒有或無法解析時回傳 None
+    reader = _READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return reader(f) or None
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+
+
+def folder_image(directory):
+    # 資料夾中的封面圖檔路徑，沒有時回傳 None
+    best, best_rank = None, len(FOLDER_NAMES)
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name.lower())
+                if ext not in IMAGE_EXTENSIONS:
+                    continue
+                for rank, name in enumerate(FOLDER_NAMES):
+                    if stem == name or (name == "albumart" and stem.startswith(name)):
+                        if rank < best_rank or (rank == best_rank and stem.endswith("large")):
+                            best, best_rank = entry.path, rank
+                        break
+    except OSError:
+        return None
+    return best
+
+
+def find_artwork(path, folder_image=folder_image):
+    # 一首歌的封面位元組：內嵌封面優先，其次是資料夾封面；都沒有時回傳 None
+    picture = read_picture(path)
+    if picture is not None:
+        return picture
+    image = folder_image(os.path.dirname(path))
+    if not image:
+        return None
+    try:
+        with open(image, "rb") as f:
+            return f.read(MAX_PICTURE) or None
+    except OSError:
+        return None
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class LRUCache:
+    # 以總成本（例如位元組數）為上限的 LRU；超過上限時從最久沒用的開始丟棄。不是執行緒安全的
+    def __init__(self, max_cost):
+        self.max_cost = max_cost
+        self.cost = 0
+        self.evictions = 0
+        self._items = OrderedDict()  # key -> (value, cost)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        item = self._items.get(key)
+        if item is None:
+            return default
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, cost=1):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.cost -= old[1]
+        if cost > self.max_cost:
+            return
+        self._items[key] = (value, cost)
+        self.cost += cost
+        while self.cost > self.max_cost:
+            _, (_, dropped) = self._items.popitem(last=False)
+            self.cost -= dropped
+            self.evictions += 1
+
+    def pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.cost -= item[1]
+
+    def clear(self):
+        self._items.clear()
+        self.cost = 0
+
+
+class ThumbnailCache:
+    # 縮好的封面（PNG）以 (內容雜湊, 邊長) 為鍵存成檔案
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), "thumbnails")
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, digest, size):
+        return os.path.join(self.path, digest[:2], f"{digest}-{size}.png")
+
+    def load(self, digest, size):
+        try:
+            with open(self._file(digest, size), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store(self, digest, size, data):
+        path = self._file(digest, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(data)
@@ -0,0 +1,96 @@
+# 將音訊解碼成 float32 樣本，分段交給 sink(samples)；samples 的形狀為 (frames, channels)。
+# PCM WAV 直接用 wave 模組讀取，其他格式透過 VLC 的音訊回呼（S16N）解碼，不輸出到音效卡
+import ctypes
+import threading
+import wave
+
+import numpy as np
+
+
+def pcm_to_float(raw, width, channels):
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        # 24-bit：補上最低位元組後當作 int32 解讀
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((b.shape[0], 4), dtype=np.uint8)
+        padded[:, 1:] = b
+        data = padded.view("<i4").ravel().astype(np.float32) / 2 ** 31
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2 ** 31
+    else:
+        raise ValueError(f"unsupported sample width: {width}")
+    return data.reshape(-1, channels)
+
+
+def wav_format(path):
+    # 回傳 (取樣率, 聲道數)；不是 PCM WAV 時丟出 wave.Error
+    with wave.open(path, "rb") as w:
+        return w.getframerate(), w.getnchannels()
+
+
+def decode_wav(path, sink, chunk_frames=1 << 16, cancelled=None):
+    # 完整讀完回傳 True，中途取消回傳 False
+    with wave.open(path, "rb") as w:
+        width, channels = w.getsampwidth(), w.getnchannels()
+        while True:
+            if cancelled is not None and cancelled():
+                return False
+            raw = w.readframes(chunk_frames)
+            if not raw:
+                return True
+            sink(pcm_to_float(raw, width, channels))
+
+
+def decode_vlc(path, sink, rate=44100, channels=2, instance=None, cancelled=None, timeout=None):
+    # 完整解碼回傳 True；取消、逾時或 VLC 回報錯誤時回傳 False。
+    # 以原速播放：速度不是 1 時 VLC 會先對音訊做時間伸縮（或重新取樣），回呼收到的就不是原本的樣本
+    import vlc
+    done = threading.Event()
+    failed = []
+
+    @vlc.CallbackDecorators.AudioPlayCb
+    def play(opaque, samples, count, pts):
+        raw = ctypes.string_at(samples, count * channels * 2)
+        sink(np.frombuffer(raw, dtype=np.int16).reshape(-1, channels).astype(np.float32) / 32768)
+
+    def error(event):
+        failed.append(True)
+        done.set()
+
+    instance = instance or vlc.Instance(["--quiet", "--no-video"])
+    player = instance.media_player_new()
+    player.audio_set_callbacks(play, None, None, None, None, None)
+    player.audio_set_format("S16N", rate, channels)
+    events = player.event_manager()
+    events.event_attach(vlc.EventType.MediaPlayerEndReached, lambda e: done.set())
+    events.event_attach(vlc.EventType.MediaPlayerEncounteredError, error)
+    media = instance.media_new(path)
+    player.set_media(media)
+    player.play()
+    try:
+        waited = 0.0
+        while not done.wait(0.1):
+            waited += 0.1
+            if (cancelled is not None and cancelled()) or (timeout is not None and waited > timeout):
+                return False
+    finally:
+        player.stop()
+        player.release()
+        media.release()
+    return not failed
+
+
+def decode(path, sink, cancelled=None, instance=None, timeout=3600):
+    # 依格式選擇解碼方式，回傳 (是否完整解碼, 取樣率)；非 PCM 的 WAV 也交給 VLC
+    if path.lower().endswith(".wav"):
+        try:
+            rate = wav_format(path)[0]
+            return decode_wav(path, sink, cancelled=cancelled), rate
+        except (wave.Error, EOFError, ValueError):
+            pass
+    if cancelled is not None and cancelled():
+        return False, None
+    return decode_vlc(path, sink, instance=instance, cancelled=cancelled, timeout=timeout), 44100
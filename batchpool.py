@@ -0,0 +1,117 @@
+# 以 process pool 分批處理檔案的共用機制（標籤解析與響度分析）：工作切成固定大小的批次，
+# 同時送出的批次可設上限，其餘排隊，大型音樂庫不會一次建立大量 future。
+# 只依賴標準函式庫，方便在 process pool 的子行程中匯入
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+class BatchPool:
+    # func 在子行程中處理一批 (path, size, mtime)，回傳結果列；on_result 會在背景執行緒被呼叫。
+    # max_in_flight 為 None 時不限制同時送出的批次
+    def __init__(self, func, on_result, workers=None, chunk_size=64, max_in_flight=None, initializer=None):
+        self.func = func
+        self.on_result = on_result
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.initializer = initializer
+        self._pool = None
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._futures = set()
+        self._closed = False
+        # 吞吐量統計
+        self.files_done = 0
+        self.busy_since = None
+        self.busy_seconds = 0.0
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._futures) + len(self._queue)
+
+    @property
+    def files_per_second(self):
+        busy = self.busy_seconds
+        if self.busy_since is not None:
+            busy += time.perf_counter() - self.busy_since
+        return self.files_done / busy if busy > 0 else 0.0
+
+    def submit(self, items):
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            for i in range(0, len(items), self.chunk_size):
+                self._queue.append(items[i:i + self.chunk_size])
+            started = self._fill()
+        self._watch(started)
+
+    def _fill(self):
+        # 呼叫時需持有 _lock；回傳新送出的 future，由呼叫端在釋放 _lock 後交給 _watch
+        if self._pool is None:
+            # 子行程以 spawn 啟動：從有許多執行緒的播放器（Qt、libvlc）fork 時，
+            # 其他執行緒持有的鎖會被複製成永遠不會釋放的狀態，子行程再建立 vlc.Instance 可能卡住
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        started = []
+        while self._queue and (self.max_in_flight is None or len(self._futures) < self.max_in_flight):
+            chunk = self._queue.popleft()
+            if self.busy_since is None:
+                self.busy_since = time.perf_counter()
+            try:
+                future = self._pool.submit(self.func, chunk)
+            except RuntimeError:
+                # 直譯器結束中，pool 已不接受新工作
+                self._closed = True
+                self._queue.clear()
+                break
+            future.chunk = chunk
+            self._futures.add(future)
+            started.append(future)
+        return started
+
+    def _watch(self, futures):
+        # 已完成的 future 會在 add_done_callback 中直接呼叫 _done，不能持有 _lock
+        for future in futures:
+            future.add_done_callback(self._done)
+
+    def _done(self, future):
+        started = []
+        with self._lock:
+            self._futures.discard(future)
+            if not self._closed:
+                started = self._fill()
+            if not self._futures and self.busy_since is not None:
+                self.busy_seconds += time.perf_counter() - self.busy_since
+                self.busy_since = None
+        self._watch(started)
+        if future.cancelled() or future.exception() is not None:
+            return
+        rows = future.result()
+        with self._lock:
+            self._count(future.chunk, rows)
+            if self._closed:
+                # shutdown 之後才完成的工作：接收端可能已經不存在
+                return
+        self.on_result(rows)
+
+    def _count(self, chunk, rows):
+        # 持有 _lock 時呼叫；子類別可加上自己的統計
+        self.files_done += len(rows)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,1204 @@
+# 效能測試：python bench.py <項目> [選項]，結果以 JSON 輸出
+import argparse
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from library import LibraryIndex
+from playlists import PlaylistReader, iter_entries
+from prefetch import Prefetcher, evict
+from scanner import AUDIO_EXTENSIONS, FolderScanner, ScannedDir
+from search import SearchIndex, search_text
+from tags import TagExtractor, read_tags_many
+from tracks import TrackStore
+
+# 需要 numpy 的模組（sorting、waveform、loudness）在各自的項目中才匯入，其他項目不需要 numpy
+
+
+def synthetic_scan(tracks, per_dir=20, root="/music"):
+    # 產生不需要真實檔案的掃描結果，用來快速填滿索引
+    scanned = []
+    for start in range(0, tracks, per_dir):
+        d = os.path.join(root, f"artist{start // (per_dir * 10):05d}", f"album{start // per_dir:06d}")
+        files = [(os.path.join(d, f"{i:02d} track {start + i}.mp3"), 4_000_000 + i, 1_600_000_000_000_000_000)
+                 for i in range(min(per_dir, tracks - start))]
+        scanned.append(ScannedDir(d, os.path.dirname(d), 1_600_000_000_000_000_000, files, []))
+    return scanned
+
+
+def make_tree(root, files, per_dir=20, fanout=10):
+    # 在磁碟上建立巢狀的空白音樂檔結構
+    for n in range(files):
+        leaf = n // per_dir
+        d = os.path.join(root, f"a{leaf // (fanout * fanout):04d}", f"b{leaf // fanout:04d}", f"c{leaf:05d}")
+        if n % per_dir == 0:
+            os.makedirs(d, exist_ok=True)
+        open(os.path.join(d, f"{n % per_dir:02d} track.mp3"), "wb").close()
+
+
+def write_wav(path, title, artist, album, trackno, seconds=1.0, rate=8000):
+    # 8 kHz 單聲道 16-bit 的極小 WAV，附 LIST INFO 標籤
+    data = b"\x00\x00" * int(rate * seconds)
+    info = b"INFO"
+    for key, value in ((b"INAM", title), (b"IART", artist), (b"IPRD", album), (b"ITRK", str(trackno))):
+        raw = value.encode("utf-8") + b"\x00"
+        info += key + struct.pack("<I", len(raw)) + raw + (b"\x00" if len(raw) & 1 else b"")
+    fmt = struct.pack("<HHIIHH", 1, 1, rate, rate * 2, 2, 16)
+    body = (b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+            + b"LIST" + struct.pack("<I", len(info)) + info
+            + b"data" + struct.pack("<I", len(data)) + data)
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+
+def write_mp3(path, title, artist, album, trackno, picture=None):
+    # ID3v2.3 標籤加上幾個 128 kbps 的 MPEG-1 Layer III frame 標頭；picture 為封面的 JPEG 位元組
+    frames = b""
+    for fid, value in ((b"TIT2", title), (b"TPE1", artist), (b"TALB", album), (b"TRCK", str(trackno))):
+        raw = b"\x03" + value.encode("utf-8")
+        frames += fid + struct.pack(">I", len(raw)) + b"\x00\x00" + raw
+    if picture:
+        raw = b"\x00image/jpeg\x00\x03Cover\x00" + picture
+        frames += b"APIC" + struct.pack(">I", len(raw)) + b"\x00\x00" + raw
+    size = len(frames)
+    syncsafe = bytes(((size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F))
+    audio = (b"\xff\xfb\x90\x64" + b"\x00" * 413) * 8
+    with open(path, "wb") as f:
+        f.write(b"ID3\x03\x00\x00" + syncsafe + frames + audio)
+
+
+def write_flac(path, title, artist, album, trackno, rate=44100, samples=44100, picture=None):
+    info = bytearray(34)
+    info[10:18] = ((rate << 44) | (1 << 36) | samples).to_bytes(8, "big")
+    comments = [f"TITLE={title}", f"ARTIST={artist}", f"ALBUM={album}", f"TRACKNUMBER={trackno}"]
+    vc = struct.pack("<I", 3) + b"dmp" + struct.pack("<I", len(comments))
+    for c in comments:
+        raw = c.encode("utf-8")
+        vc += struct.pack("<I", len(raw)) + raw
+    blocks = [(0, bytes(info)), (4, vc)]
+    if picture:
+        mime = b"image/jpeg"
+        blocks.append((6, struct.pack(">II", 3, len(mime)) + mime + struct.pack(">I", 0)
+                       + struct.pack(">IIIII", 0, 0, 24, 0, len(picture)) + picture))
+    with open(path, "wb") as f:
+        f.write(b"fLaC")
+        for i, (kind, body) in enumerate(blocks):
+            last = 0x80 if i == len(blocks) - 1 else 0
+            f.write(bytes([last | kind]) + len(body).to_bytes(3, "big") + body)
+
+
+WRITERS = {".wav": write_wav, ".mp3": write_mp3, ".flac": write_flac}
+
+
+def make_tagged_library(root, files, per_dir=12, kinds=(".wav", ".mp3", ".flac")):
+    # 產生帶有標籤的合成音樂庫，回傳 (path, size, mtime) 清單
+    items = []
+    for n in range(files):
+        album = n // per_dir
+        d = os.path.join(root, f"artist{album // 10:04d}", f"album{album:05d}")
+        if n % per_dir == 0:
+            os.makedirs(d, exist_ok=True)
+        ext = kinds[n % len(kinds)]
+        path = os.path.join(d, f"{n % per_dir + 1:02d} song{n}{ext}")
+        WRITERS[ext](path, f"Song {n}", f"Artist {album // 10}", f"Album {album}", n % per_dir + 1)
+        st = os.stat(path)
+        items.append((path, st.st_size, st.st_mtime_ns))
+    return items
+
+
+def make_wav_library(root, files, per_dir=12, depth=2, fanout=10, seconds=0.05):
+    # 產生巢狀的極小 WAV 音樂庫（depth 為歌曲上方的目錄層數），可重複使用：
+    # 同樣參數產生過的目錄直接沿用，大型音樂庫不必每次重建
+    params = {"files": files, "per_dir": per_dir, "depth": depth, "fanout": fanout, "seconds": seconds}
+    marker = os.path.join(root, ".dmp-bench.json")
+    try:
+        with open(marker) as f:
+            if json.load(f) == params:
+                return False
+    except (OSError, ValueError):
+        pass
+    for n in range(files):
+        leaf = n // per_dir
+        d = os.path.join(root, *(f"d{level}_{leaf // fanout ** (depth - 1 - level):06d}"
+                                 for level in range(depth)))
+        if n % per_dir == 0:
+            os.makedirs(d, exist_ok=True)
+        write_wav(os.path.join(d, f"{n % per_dir + 1:02d} song{n}.wav"),
+                  f"Song {n}", f"Artist {leaf // fanout}", f"Album {leaf}", n % per_dir + 1, seconds)
+    with open(marker, "w") as f:
+        json.dump(params, f)
+    return True
+
+
+def synthetic_rows(tracks, per_dir=12, root="/srv/music/library"):
+    # 音樂庫索引格式的合成歌曲列，每列都是新的字串物件（和從 SQLite 讀出時相同）
+    for n in range(tracks):
+        album = n // per_dir
+        artist = album // 10
+        yield (f"{root}/Artist {artist:05d}/Album {album:06d}/{n % per_dir + 1:02d} Song {n}.flac",
+               30_000_000, 1_600_000_000_000_000_000,
+               f"Song {n}", f"Artist {artist}", f"Album {album}", 240_000, n % per_dir + 1)
+
+
+def rss_bytes():
+    # 目前的常駐記憶體大小；沒有 /proc 的平台退回使用峰值
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentiles(samples, scale=1000):
+    # 回傳 (p50, p95, max)，預設由秒換算成毫秒
+    if not samples:
+        return None, None, None
+    samples = sorted(samples)
+    return (samples[len(samples) // 2] * scale, samples[int(len(samples) * 0.95)] * scale,
+            samples[-1] * scale)
+
+
+def _list_layout(rows):
+    # 舊的做法：完整路徑清單、清單元件中的另一份檔名，以及以路徑為鍵的標籤
+    songs, names, tags = [], [], {}
+    for row in rows:
+        songs.append(row[0])
+        names.append(os.path.basename(row[0]))
+        tags[row[0]] = tuple(row[3:])
+    return songs, names, tags
+
+
+def _store_layout(rows):
+    store = TrackStore()
+    return store, store.add(rows)
+
+
+def _measure_layout(layout, tracks):
+    # 在獨立的行程中執行，避免前一次配置的記憶體影響結果
+    build = {"list": _list_layout, "store": _store_layout}[layout]
+    before = rss_bytes()
+    t0 = time.perf_counter()
+    kept = build(synthetic_rows(tracks))
+    build_s = time.perf_counter() - t0
+    rss = rss_bytes() - before
+    del kept
+    return rss, build_s
+
+
+def run_scan(index, roots):
+    scanner = FolderScanner(roots, on_batch=lambda b: pending.extend(b),
+                            known_dirs=index.known_dirs())
+    pending = []
+    t0 = time.perf_counter()
+    scanner.start()
+    scanner.wait()
+    added, _, removed = index.apply_scan(pending)
+    return time.perf_counter() - t0, scanner, len(added), len(removed)
+
+
+def bench_library_load(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "library.db")
+        index = LibraryIndex(db)
+        index.set_roots(["/music"])
+        index.apply_scan(synthetic_scan(args.tracks))
+        index.close()
+
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            index = LibraryIndex(db)
+            rows = index.load()
+            times.append(time.perf_counter() - t0)
+            index.close()
+        assert len(rows) == args.tracks
+    return {"tracks": args.tracks, "load_s_min": min(times), "load_s_max": max(times)}
+
+
+def bench_library_rescan(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "music")
+        make_tree(root, args.files)
+        index = LibraryIndex(os.path.join(tmp, "library.db"))
+        index.set_roots([root])
+        full_s, full, added, _ = run_scan(index, [root])
+        inc_s, inc, inc_added, _ = run_scan(index, [root])
+        index.close()
+    return {
+        "files": args.files,
+        "full_scan_s": full_s, "full_dirs_listed": full.dirs_done - full.dirs_skipped, "added": added,
+        "rescan_s": inc_s, "rescan_dirs_listed": inc.dirs_done - inc.dirs_skipped, "rescan_added": inc_added,
+    }
+
+
+def bench_tags(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        items = make_tagged_library(os.path.join(tmp, "music"), args.files)
+
+        t0 = time.perf_counter()
+        rows = read_tags_many(items)
+        serial_s = time.perf_counter() - t0
+        assert all(row[3] for row in rows), "synthetic tags were not parsed"
+
+        done = threading.Event()
+        parsed = []
+
+        def on_result(batch):
+            parsed.extend(batch)
+            if len(parsed) == len(items):
+                done.set()
+
+        extractor = TagExtractor(on_result, workers=args.workers)
+        # 先啟動 pool，避免把行程啟動時間算進吞吐量
+        extractor.submit(items[:1])
+        while extractor.pending:
+            time.sleep(0.01)
+        parsed.clear()
+        t0 = time.perf_counter()
+        extractor.submit(items)
+        done.wait()
+        pool_s = time.perf_counter() - t0
+        extractor.shutdown()
+    return {
+        "files": args.files, "workers": args.workers or os.cpu_count(),
+        "serial_files_per_s": len(items) / serial_s,
+        "pool_files_per_s": len(items) / pool_s,
+    }
+
+
+def bench_search(args):
+    words = ("love night dance blue river song moon fire heart rain sun dream road city star light"
+             " gold wild home time").split()
+    rng = random.Random(1)
+    index = SearchIndex()
+    t0 = time.perf_counter()
+    index.add_many((n, search_text(f"/music/{n:06d} {' '.join(rng.sample(words, 3))}.mp3",
+                                   f"Song {n}", f"Artist {n % 500}", f"Album {n % 5000}"))
+                   for n in range(args.tracks))
+    build_s = time.perf_counter() - t0
+
+    # 模擬逐字輸入，每個查詢都記錄一次延遲
+    latencies = []
+    for query in args.queries:
+        for i in range(1, len(query) + 1):
+            t0 = time.perf_counter()
+            index.search(query[:i])
+            latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return {
+        "tracks": args.tracks, "build_s": build_s, "keystrokes": len(latencies),
+        "keystroke_ms_p50": latencies[len(latencies) // 2] * 1000,
+        "keystroke_ms_p95": latencies[int(len(latencies) * 0.95)] * 1000,
+        "keystroke_ms_max": latencies[-1] * 1000,
+    }
+
+
+def bench_sort(args):
+    # 第一次排序（計算並快取排序鍵）、之後的重新排序，以及每次排序都重新計算鍵的做法；
+    # 最後更新 1% 歌曲的標籤再排序一次（只重新計算這些歌的鍵）
+    from sorting import SORT_MODES, TAG_MODES, SortKeys
+    rng = random.Random(1)
+    store = TrackStore()
+    songs = store.add(
+        (f"/music/Artist {n % 700}/Album {n % 3000}/{rng.randrange(1, 30):02d} Track {rng.randrange(200)}.mp3",
+         1, 1, f"Song {n}", f"Artist {rng.randrange(700)}", f"Album {rng.randrange(3000)}",
+         rng.randrange(60_000, 600_000), rng.randrange(1, 30))
+        for n in range(args.tracks))
+    rng.shuffle(songs)
+    result = {"tracks": args.tracks}
+    keys = SortKeys(store)
+    for mode in SORT_MODES:
+        t0 = time.perf_counter()
+        keys.sorted(songs, mode)
+        result[f"{mode}_first_ms"] = (time.perf_counter() - t0) * 1000
+        samples = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            keys.sorted(songs, mode)
+            samples.append(time.perf_counter() - t0)
+        result[f"{mode}_resort_ms_p50"], _, result[f"{mode}_resort_ms_max"] = percentiles(samples)
+        fresh = SortKeys(store)
+        t0 = time.perf_counter()
+        fresh.sorted(songs, mode)
+        result[f"{mode}_uncached_ms"] = (time.perf_counter() - t0) * 1000
+    changed = rng.sample(list(songs), args.tracks // 100)
+    store.set_tags((store.path(tid), 1, 1, "Retagged", "Artist 1", "Album 1", 1000, 1) for tid in changed)
+    keys.invalidate(changed, TAG_MODES)
+    t0 = time.perf_counter()
+    keys.sorted(songs, "artist")
+    result["artist_after_retag_ms"] = (time.perf_counter() - t0) * 1000
+    return result
+
+
+def bench_memory(args):
+    result = {"tracks": args.tracks}
+    for layout in ("list", "store"):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            rss, build_s = pool.submit(_measure_layout, layout, args.tracks).result()
+        result[f"{layout}_rss_mb"] = rss / 2 ** 20
+        result[f"{layout}_bytes_per_track"] = rss / args.tracks
+        result[f"{layout}_build_s"] = build_s
+    result["rss_ratio"] = result["store_rss_mb"] / result["list_rss_mb"]
+    return result
+
+
+def bench_player(args):
+    # 以 offscreen Qt 與 VLC dummy 音訊輸出實際執行 dmp.py 的熱點路徑
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DMP_HOME"] = os.path.join(tmp, "home")
+        root = args.library or os.path.join(tmp, "music")
+        t0 = time.perf_counter()
+        make_wav_library(root, args.files, per_dir=args.per_dir, depth=args.depth)
+        generate_s = time.perf_counter() - t0
+
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        import dmp
+        dmp.VLC_ARGS = dmp.VLC_ARGS + ["--aout=dummy", "--vout=dummy"]
+
+        def pump_until(done, timeout):
+            deadline = time.perf_counter() + timeout
+            while not done():
+                if time.perf_counter() > deadline:
+                    return False
+                app.processEvents()
+                time.sleep(0.001)
+            return True
+
+        player = dmp.MusicPlayer()
+        player.show()
+        pump_until(lambda: player.ready, args.timeout)
+        result = {"files": args.files, "per_dir": args.per_dir, "depth": args.depth,
+                  "generate_s": generate_s}
+
+        # add_folder：第一首可播放的時間與整個掃描完成的時間
+        t0 = time.perf_counter()
+        player.load_folder(root)
+        pump_until(lambda: len(player.song_list) > 0, args.timeout)
+        result["add_folder_first_track_s"] = time.perf_counter() - t0
+        pump_until(lambda: player.scanner is None, args.timeout)
+        result["add_folder_s"] = time.perf_counter() - t0
+        result["tracks"] = len(player.song_list)
+        pump_until(lambda: not player.tag_extractor.pending, args.timeout)
+        result["tags_s"] = time.perf_counter() - t0
+
+        # load_and_play：呼叫本身的耗時，以及到 VLC 回報開始播放的時間
+        started = []
+        player.player_bridge.playing.connect(lambda: started.append(time.perf_counter()))
+        rng = random.Random(1)
+        call_s, playing_s = [], []
+        for _ in range(args.switches):
+            index = rng.randrange(len(player.song_list))
+            started.clear()
+            t0 = time.perf_counter()
+            player.current_index = index
+            player.load_and_play(index)
+            call_s.append(time.perf_counter() - t0)
+            if pump_until(lambda: started, 2.0):
+                playing_s.append(started[0] - t0)
+        (result["load_and_play_ms_p50"], result["load_and_play_ms_p95"],
+         result["load_and_play_ms_max"]) = percentiles(call_s)
+        result["time_to_playing_ms_p50"], result["time_to_playing_ms_p95"], _ = percentiles(playing_s)
+        result["time_to_playing_samples"] = len(playing_s)
+
+        # 拖曳進度條：約 60 Hz 的 sliderMoved，最後放開
+        player.slider_pressed()
+        for i in range(args.scrub_moves):
+            value = i * 1000 // args.scrub_moves
+            player.progress_slider.setValue(value)
+            player.set_position(value)
+            pump_until(lambda: False, 1 / 60)
+        player.slider_released()
+        pump_until(lambda: player.seeker.in_flight is None, 2.0)
+        result.update({f"seek_{k}": v for k, v in player.seeker.stats().items()})
+
+        # apply_theme：包含之後 Qt 重新套用樣式的事件處理
+        theme_s = []
+        names = list(player.themes)
+        for i in range(args.theme_switches):
+            t0 = time.perf_counter()
+            player.apply_theme(names[i % len(names)])
+            app.processEvents()
+            theme_s.append(time.perf_counter() - t0)
+        result["apply_theme_ms_p50"], result["apply_theme_ms_p95"], _ = percentiles(theme_s)
+
+        # update_ui：每一次進度更新的成本
+        length = max(player.progress.length, 180_000)
+        player.progress.set_length(length)
+        t0 = time.perf_counter()
+        for i in range(args.ticks):
+            player.update_ui(i * 37 % length)
+        result["update_ui_us"] = (time.perf_counter() - t0) / args.ticks * 1e6
+
+        player.close()
+        app.processEvents()
+        peak = peak_rss_bytes()
+        result["peak_rss_mb"] = None if peak is None else peak / 2 ** 20
+    return result
+
+
+def bench_ipc(args):
+    # 控制介面的往返延遲：ping 只經過 asyncio 執行緒，state 需要主執行緒處理；
+    # 另外比較一次加入多首與逐首加入，以及第二次啟動轉送參數後結束的時間
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DMP_HOME"] = os.path.join(tmp, "home")
+        root = os.path.join(tmp, "music")
+        make_wav_library(root, 100, depth=1)
+        extra = os.path.join(tmp, "extra")
+        os.makedirs(extra)
+        paths = []
+        for n in range(args.batch * 2):
+            paths.append(os.path.join(extra, f"extra{n}.wav"))
+            write_wav(paths[-1], f"Extra {n}", "Bench", "IPC", n + 1, 0.05)
+
+        from PyQt5.QtCore import QMetaObject, Qt
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        import dmp
+        import ipc
+        dmp.VLC_ARGS = dmp.VLC_ARGS + ["--aout=dummy", "--vout=dummy"]
+        player = dmp.MusicPlayer()
+        player.show()
+        while not player.ready:
+            app.processEvents()
+        if not player.start_control_server():
+            raise SystemExit("control server is not available on this platform")
+        player.load_folder(root)
+
+        result = {"requests": args.requests, "batch": args.batch}
+
+        def client():
+            with ipc.Client() as c:
+                for cmd in ("ping", "state"):
+                    samples = []
+                    for _ in range(args.requests):
+                        t0 = time.perf_counter()
+                        c.request({"cmd": cmd})
+                        samples.append(time.perf_counter() - t0)
+                    (result[f"{cmd}_ms_p50"], result[f"{cmd}_ms_p95"],
+                     result[f"{cmd}_ms_max"]) = percentiles(samples)
+                # 一次送出多個請求再依序讀回（pipelining）
+                t0 = time.perf_counter()
+                for _ in range(args.requests):
+                    c.send({"cmd": "state"})
+                for _ in range(args.requests):
+                    c.receive()
+                result["state_pipelined_us_per_request"] = (time.perf_counter() - t0) / args.requests * 1e6
+                t0 = time.perf_counter()
+                added = c.request({"cmd": "enqueue", "paths": paths[:args.batch]})["added"]
+                result["enqueue_batch_ms"] = (time.perf_counter() - t0) * 1000
+                t0 = time.perf_counter()
+                for path in paths[args.batch:]:
+                    added += c.request({"cmd": "enqueue", "paths": [path]})["added"]
+                result["enqueue_one_by_one_ms"] = (time.perf_counter() - t0) * 1000
+                result["enqueued"] = added
+            # 第二次啟動：只轉送參數，不載入 Qt 與 libvlc
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "dmp.py"),
+                            paths[0]], check=True)
+            result["forward_launch_ms"] = (time.perf_counter() - t0) * 1000
+
+        def run_client():
+            try:
+                client()
+            finally:
+                QMetaObject.invokeMethod(app, "quit", Qt.QueuedConnection)
+
+        # 主執行緒跑真正的事件迴圈，請求一送達就會被處理
+        thread = threading.Thread(target=run_client)
+        thread.start()
+        app.exec_()
+        thread.join()
+        player.close()
+        app.processEvents()
+    return result
+
+
+def _event_work(app, seconds):
+    # 在 seconds 內持續處理事件，只累計真正有工作的 processEvents（閒置時的輪詢不算）
+    work = 0.0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        app.processEvents()
+        elapsed = time.perf_counter() - t0
+        if elapsed > 0.0002:
+            work += elapsed
+        else:
+            time.sleep(0.0005)
+    return work
+
+
+def bench_theme(args):
+    # 切換主題的成本：apply_theme 本身，加上之後事件迴圈中的重新套用樣式、排版與重繪。
+    # 事件迴圈的工作量扣掉同樣長度的閒置時段，比較小清單與大清單
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DMP_HOME"] = os.path.join(tmp, "home")
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        import dmp
+        player = dmp.MusicPlayer()
+        player.show()
+        while not player.ready:
+            app.processEvents()
+        names = list(player.themes)
+        result = {"switches": args.switches, "settle_s": args.settle}
+        for rows in sorted({args.small_rows, args.rows}):
+            player.set_songs([(f"/music/{n // 100:05d}/{n:07d} Track {n}.mp3", 1, 1,
+                               None, None, None, None, None) for n in range(rows)])
+            # 等搜尋索引與清單的批次排版做完
+            while player.playlist_model._index_timer.isActive():
+                app.processEvents()
+            _event_work(app, args.settle)
+            idle = _event_work(app, args.settle)
+            call_s, total_s = [], []
+            for i in range(args.switches):
+                t0 = time.perf_counter()
+                player.apply_theme(names[(i + 1) % len(names)])
+                call = time.perf_counter() - t0
+                call_s.append(call)
+                total_s.append(call + max(0.0, _event_work(app, args.settle) - idle))
+            result[f"rows_{rows}_apply_ms_p50"], _, result[f"rows_{rows}_apply_ms_max"] = percentiles(call_s)
+            result[f"rows_{rows}_total_ms_p50"], result[f"rows_{rows}_total_ms_p95"], \
+                result[f"rows_{rows}_total_ms_max"] = percentiles(total_s)
+        small, large = sorted({args.small_rows, args.rows})
+        result["total_ratio_large_to_small"] = \
+            result[f"rows_{large}_total_ms_p50"] / result[f"rows_{small}_total_ms_p50"]
+        player.close()
+        app.processEvents()
+    return result
+
+
+def _startup_child(args):
+    # 在新的行程中量測：各階段的 import 時間、建構視窗與第一次繪製的時間
+    t0 = time.perf_counter()
+    from PyQt5.QtCore import QEvent, QObject
+    from PyQt5.QtWidgets import QApplication
+    qt_import_s = time.perf_counter() - t0
+    app = QApplication(sys.argv[:1])
+    t1 = time.perf_counter()
+    import dmp
+    dmp_import_s = time.perf_counter() - t1
+    dmp.VLC_ARGS = dmp.VLC_ARGS + ["--aout=dummy", "--vout=dummy"]
+    vlc_at_import = "vlc" in sys.modules
+    t1 = time.perf_counter()
+    window = dmp.MusicPlayer()
+    construct_s = time.perf_counter() - t1
+    painted = []
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and not painted:
+                painted.append(time.perf_counter())
+            return False
+
+    watcher = PaintWatcher()
+    window.installEventFilter(watcher)
+    window.show()
+    deadline = time.perf_counter() + args.timeout
+    while not painted and time.perf_counter() < deadline:
+        app.processEvents()
+    first_paint_wall = time.time()
+    vlc_at_paint = "vlc" in sys.modules
+    while not window.ready and time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    restored_s = time.perf_counter() - t0
+    if args.prepare:
+        # 建立音樂庫索引並播放中間的一首，關閉時留下播放狀態
+        deadline = time.perf_counter() + args.timeout
+        window.load_folder(args.library)
+        while (window.scanner is not None or not window.song_list) and time.perf_counter() < deadline:
+            app.processEvents()
+            time.sleep(0.001)
+        window.current_index = len(window.song_list) // 2
+        window.load_and_play(window.current_index)
+        app.processEvents()
+    result = {
+        "qt_import_ms": qt_import_s * 1000, "dmp_import_ms": dmp_import_s * 1000,
+        "construct_ms": construct_s * 1000,
+        "first_paint_ms": (painted[0] - t0) * 1000 if painted else None,
+        "first_paint_wall": first_paint_wall, "restored_ms": restored_s * 1000,
+        "tracks": len(window.song_list), "current_index": window.current_index,
+        "vlc_at_import": vlc_at_import, "vlc_at_first_paint": vlc_at_paint,
+    }
+    window.close()
+    app.processEvents()
+    return result
+
+
+def bench_startup(args):
+    # 每次啟動都是新的行程；第一次只用來建立音樂庫索引與上次的播放狀態
+    if args.child:
+        return _startup_child(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DMP_HOME=os.path.join(tmp, "home"), QT_QPA_PLATFORM="offscreen")
+        library = args.library or os.path.join(tmp, "music")
+        make_wav_library(library, args.files, per_dir=args.per_dir, depth=2)
+        output = os.path.join(tmp, "run.json")
+        command = [sys.executable, os.path.abspath(__file__), "-o", output, "startup", "--child",
+                   "--library", library, "--timeout", str(args.timeout)]
+        subprocess.run(command + ["--prepare"], env=env, check=True, stdout=subprocess.DEVNULL)
+        runs = []
+        for _ in range(args.repeat):
+            spawned = time.time()
+            subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(output) as f:
+                run = json.load(f)
+            run["launch_to_first_paint_ms"] = (run["first_paint_wall"] - spawned) * 1000
+            runs.append(run)
+    last = runs[-1]
+    result = {"files": args.files, "repeat": args.repeat, "tracks": last["tracks"],
+              "restored_index": last["current_index"],
+              "vlc_at_import": last["vlc_at_import"], "vlc_at_first_paint": last["vlc_at_first_paint"]}
+    for key in ("qt_import_ms", "dmp_import_ms", "construct_ms", "first_paint_ms",
+                "launch_to_first_paint_ms", "restored_ms"):
+        result[f"{key[:-3]}_ms_p50"], _, result[f"{key[:-3]}_ms_max"] = percentiles(
+            [run[key] for run in runs], scale=1)
+    return result
+
+
+def bench_compare(args):
+    # 比較兩次結果中的數值欄位，ratio > 1 表示新版較大（時間類指標即變慢）
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) \
+                and not isinstance(value, bool):
+            rows[key] = {"old": before, "new": value, "ratio": value / before if before else None}
+    return {"old": args.old, "new": args.new, "metrics": rows}
+
+
+def bench_waveform(args):
+    import numpy as np
+    import wave
+    from waveform import WaveformCache, track_peaks
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n in range(args.files):
+            path = os.path.join(tmp, f"{n:03d}.wav")
+            frames = args.seconds * 44100
+            # 音量由小漸大的雜訊，峰值會隨時間變化
+            noise = rng.standard_normal((frames, 2)) * np.linspace(0.05, 0.3, frames)[:, None]
+            with wave.open(path, "wb") as w:
+                w.setnchannels(2)
+                w.setsampwidth(2)
+                w.setframerate(44100)
+                w.writeframes((np.clip(noise, -1, 1) * 32767).astype("<i2").tobytes())
+            paths.append(path)
+        cache = WaveformCache(os.path.join(tmp, "waveforms"))
+        t0 = time.perf_counter()
+        for path in paths:
+            track_peaks(path, cache)
+        cold_s = time.perf_counter() - t0
+        cached = []
+        for path in paths:
+            t0 = time.perf_counter()
+            peaks, hit = track_peaks(path, cache)
+            peaks.max()  # 實際讀取 mmap 的內容
+            cached.append(time.perf_counter() - t0)
+            assert hit
+        audio_mb = sum(os.path.getsize(p) for p in paths) / 2 ** 20
+    return {
+        "files": args.files, "seconds_per_track": args.seconds,
+        "compute_ms_per_track": cold_s / args.files * 1000, "compute_mb_per_s": audio_mb / cold_s,
+        "cached_ms_p50": percentiles(cached)[0], "cached_ms_max": percentiles(cached)[2],
+    }
+
+
+def make_cover(n, px):
+    # 有漸層與雜訊的 JPEG 封面，大小接近真實的專輯封面
+    import numpy as np
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+    from PyQt5.QtGui import QImage
+    rng = np.random.default_rng(n)
+    ramp = np.linspace(0, 255, px, dtype=np.float32)
+    pixels = np.empty((px, px, 4), dtype=np.uint8)
+    pixels[..., 0] = (ramp[None, :] + n * 37) % 256
+    pixels[..., 1] = (ramp[:, None] + n * 91) % 256
+    pixels[..., 2] = rng.integers(0, 64, (px, px), dtype=np.uint8) + 96
+    pixels[..., 3] = 255
+    image = QImage(pixels.data, px, px, px * 4, QImage.Format_RGB32)
+    out = QByteArray()
+    buffer = QBuffer(out)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPEG", 90)
+    return bytes(out)
+
+
+def make_artwork_library(root, files, per_dir=12, px=1000):
+    # 每張專輯一張封面：MP3 / FLAC 內嵌在每首歌中，WAV 專輯放 folder.jpg
+    paths = []
+    kinds = (".mp3", ".flac", ".wav")
+    for n in range(files):
+        album = n // per_dir
+        ext = kinds[album % len(kinds)]
+        d = os.path.join(root, f"artist{album // 10:04d}", f"album{album:05d}")
+        if n % per_dir == 0:
+            os.makedirs(d, exist_ok=True)
+            cover = make_cover(album, px)
+            if ext == ".wav":
+                with open(os.path.join(d, "folder.jpg"), "wb") as f:
+                    f.write(cover)
+        path = os.path.join(d, f"{n % per_dir + 1:02d} song{n}{ext}")
+        title, artist, name = f"Song {n}", f"Artist {album // 10}", f"Album {album}"
+        if ext == ".wav":
+            write_wav(path, title, artist, name, n % per_dir + 1, seconds=0.05)
+        else:
+            WRITERS[ext](path, title, artist, name, n % per_dir + 1, picture=cover)
+        paths.append(path)
+    return paths
+
+
+def bench_artwork(args):
+    # 封面縮圖：在 UI 執行緒直接解碼原圖縮小（舊做法的成本）vs. 背景執行緒池 + 磁碟快取 + 記憶體 LRU；
+    # 最後開啟縮圖並捲動整個播放清單，量測每一步事件處理的時間
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DMP_HOME"] = os.path.join(tmp, "home")
+        from PyQt5.QtCore import Qt
+        from PyQt5.QtGui import QImage
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        import dmp
+        from artwork import find_artwork
+        paths = make_artwork_library(os.path.join(tmp, "music"), args.files, args.per_dir, args.cover_px)
+        size = dmp.THUMB_SIZE
+        result = {"files": args.files, "albums": -(-args.files // args.per_dir),
+                  "cover_px": args.cover_px, "thumb_px": size, "memory_mb": args.memory_mb}
+
+        inline = []
+        for path in paths[::max(1, len(paths) // 50)]:
+            t0 = time.perf_counter()
+            QImage.fromData(find_artwork(path)).scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            inline.append(time.perf_counter() - t0)
+        result["ui_thread_decode_ms_p50"], _, result["ui_thread_decode_ms_max"] = percentiles(inline)
+
+        def load_all(loader):
+            # 一次要求全部縮圖（堆疊放得下），回傳 (秒數, image() 呼叫的耗時)
+            loader.queue = len(paths)
+            done = set()
+            loader.loaded.connect(lambda path, _: done.add(path))
+            calls = []
+            t0 = time.perf_counter()
+            for path in paths:
+                c0 = time.perf_counter()
+                loader.image(path, size)
+                calls.append(time.perf_counter() - c0)
+            while len(done) < len(paths):
+                app.processEvents()
+            return time.perf_counter() - t0, calls
+
+        memory = int(args.memory_mb * 2 ** 20)
+        for phase in ("cold", "disk_cache"):
+            loader = dmp.ArtworkLoader(workers=args.workers, memory=memory)
+            seconds, calls = load_all(loader)
+            result[f"{phase}_files_per_s"] = len(paths) / seconds
+            result[f"{phase}_decoded"] = loader.decoded
+            result[f"{phase}_request_us_max"] = percentiles(calls, 1e6)[2]
+            loader.shutdown()
+        hits = []
+        for path in paths:
+            t0 = time.perf_counter()
+            image = loader.image(path, size)
+            hits.append(time.perf_counter() - t0)
+        result["memory_hit_us_p50"], _, result["memory_hit_us_max"] = percentiles(hits, 1e6)
+        result["memory_images"] = len(loader.images)
+        result["memory_bytes"] = loader.images.cost
+        result["memory_evictions"] = loader.images.evictions
+        result["memory_hit"] = image is not None
+
+        # 實際的播放清單：開啟縮圖後一頁一頁往下捲
+        player = dmp.MusicPlayer()
+        player.resize(500, 800)
+        player.show()
+        while not player.ready:
+            app.processEvents()
+        player.set_songs([(path, 1, 1, None, None, None, None, None) for path in paths])
+        player.set_thumbnails(True)
+        view = player.playlist_view
+        bar = view.verticalScrollBar()
+        _event_work(app, 0.3)
+        frames = []
+        value = 0
+        while value < bar.maximum():
+            value = min(bar.maximum(), value + bar.pageStep())
+            t0 = time.perf_counter()
+            bar.setValue(value)
+            view.viewport().repaint()
+            app.processEvents()
+            frames.append(time.perf_counter() - t0)
+            time.sleep(args.scroll_interval)
+        result["scroll_pages"] = len(frames)
+        result["scroll_frame_ms_p50"], result["scroll_frame_ms_p95"], result["scroll_frame_ms_max"] = \
+            percentiles(frames)
+        player.close()
+        app.processEvents()
+    return result
+
+
+def bench_playlist(args):
+    # 匯入大型 M3U8：串流解析、分批 stat，以及在實際播放器中匯入時事件迴圈最長卡住多久
+    # （對照：在 UI 執行緒一次讀完、stat 完再放進清單）；匯出比較整塊寫入與逐行寫入
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DMP_HOME"] = os.path.join(tmp, "home")
+        root = os.path.join(tmp, "music")
+        make_tree(root, args.lines)
+        tracks = sorted(os.path.join(d, name) for d, _, names in os.walk(root) for name in names)
+        random.Random(1).shuffle(tracks)
+        missing = int(len(tracks) * args.missing)
+        entries = tracks[missing:] + [f"{path}.gone.mp3" for path in tracks[:missing]]
+        random.Random(2).shuffle(entries)
+        playlist = os.path.join(tmp, "big.m3u8")
+        with open(playlist, "w", encoding="utf-8") as f:
+            f.write("#EXTM3U\n")
+            for path in entries:
+                f.write(f"#EXTINF:-1,{os.path.basename(path)}\n{os.path.relpath(path, tmp)}\n")
+        result = {"lines": len(entries), "missing": missing,
+                  "playlist_mb": os.path.getsize(playlist) / 2 ** 20}
+
+        t0 = time.perf_counter()
+        count = sum(1 for _ in iter_entries(playlist))
+        result["parse_ms"] = (time.perf_counter() - t0) * 1000
+        assert count == len(entries)
+
+        first = []
+        done = threading.Event()
+        t0 = time.perf_counter()
+        reader = PlaylistReader(playlist, on_batch=lambda rows: first or first.append(time.perf_counter() - t0),
+                                on_finished=lambda cancelled: done.set())
+        reader.start()
+        done.wait()
+        result["reader_ms"] = (time.perf_counter() - t0) * 1000
+        result["reader_first_batch_ms"] = first[0] * 1000
+        assert reader.found == len(entries) - missing and reader.missing == missing
+
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        import dmp
+        player = dmp.MusicPlayer()
+        player.show()
+        while not player.ready:
+            app.processEvents()
+
+        # 對照：整份清單在 UI 執行緒讀完、逐一 stat 之後一次放進清單
+        t0 = time.perf_counter()
+        rows = []
+        for path in iter_entries(playlist):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rows.append((path, st.st_size, st.st_mtime_ns, None, None, None, None, None))
+        player.set_songs(rows)
+        result["blocking_import_ms"] = (time.perf_counter() - t0) * 1000
+        player.set_songs([])
+        _event_work(app, 0.3)
+
+        # 背景匯入，期間以每 5 ms 一次的計時器量測事件迴圈的回應時間（兩次觸發的間隔）
+        from PyQt5.QtCore import QTimer
+        gaps = []
+        last = [time.perf_counter()]
+
+        def beat():
+            now = time.perf_counter()
+            gaps.append(now - last[0])
+            last[0] = now
+
+        heartbeat = QTimer()
+        heartbeat.setInterval(5)
+        heartbeat.timeout.connect(beat)
+        heartbeat.start()
+        t0 = last[0] = time.perf_counter()
+        player.load_playlist(playlist)
+        first_row = None
+        while player.playlist_reader is not None:
+            app.processEvents()
+            if first_row is None and player.song_list:
+                first_row = time.perf_counter() - t0
+        result["import_ms"] = (time.perf_counter() - t0) * 1000
+        heartbeat.stop()
+        result["import_first_rows_ms"] = first_row * 1000
+        result["import_heartbeat_ms_p95"], result["import_heartbeat_ms_max"] = percentiles(gaps)[1:]
+        result["imported"] = len(player.song_list)
+        # 背景解析標籤的結果也要在 UI 執行緒套用，等它做完再匯出
+        while player.tag_extractor.pending:
+            app.processEvents()
+
+        out = os.path.join(tmp, "out.m3u8")
+        t0 = time.perf_counter()
+        player.export_playlist(out)
+        result["export_ms"] = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        player.export_playlist(os.path.join(tmp, "out.pls"))
+        result["export_pls_ms"] = (time.perf_counter() - t0) * 1000
+        # 對照：每一行各寫一次（行緩衝）
+        store = player.playlist_model.store
+        t0 = time.perf_counter()
+        with open(os.path.join(tmp, "slow.m3u8"), "w", encoding="utf-8", buffering=1) as f:
+            f.write("#EXTM3U\n")
+            for tid in player.song_list:
+                duration = store.duration(tid)
+                f.write(f"#EXTINF:{-1 if duration is None else round(duration / 1000)},"
+                        f"{player.playlist_model.display_name(tid)}\n")
+                f.write(store.path(tid) + "\n")
+        result["export_per_line_ms"] = (time.perf_counter() - t0) * 1000
+        assert sum(1 for _ in iter_entries(out)) == result["imported"]
+        player.close()
+        app.processEvents()
+    return result
+
+
+def bench_loudness(args):
+    import numpy as np
+    import wave
+    from loudness import LoudnessAnalyzer, analyze_many
+    with tempfile.TemporaryDirectory() as tmp:
+        items = []
+        expected = {}
+        for n in range(args.files):
+            path = os.path.join(tmp, f"{n:03d}.wav")
+            frames = args.seconds * 44100
+            # 兩聲道相同的 1 kHz 正弦波，整合響度約等於其 dBFS 位準
+            level = -30 + 20 * n / max(1, args.files - 1)
+            tone = 10 ** (level / 20) * np.sin(2 * np.pi * 1000 * np.arange(frames) / 44100)
+            with wave.open(path, "wb") as w:
+                w.setnchannels(2)
+                w.setsampwidth(2)
+                w.setframerate(44100)
+                w.writeframes(np.repeat((tone * 32767).astype("<i2"), 2).tobytes())
+            st = os.stat(path)
+            items.append((path, st.st_size, st.st_mtime_ns))
+            expected[path] = level
+
+        t0 = time.perf_counter()
+        rows = analyze_many(items)
+        serial_s = time.perf_counter() - t0
+        error = max(abs(lufs - expected[path]) for path, _, _, lufs, _ in rows)
+
+        done = threading.Event()
+        analyzed = []
+
+        def on_result(batch):
+            analyzed.extend(batch)
+            if len(analyzed) == len(items):
+                done.set()
+
+        analyzer = LoudnessAnalyzer(on_result, workers=args.workers)
+        # 先啟動 pool，避免把行程啟動時間算進吞吐量
+        analyzer.submit(items[:1])
+        while analyzer.pending:
+            time.sleep(0.01)
+        analyzed.clear()
+        t0 = time.perf_counter()
+        analyzer.submit(items)
+        done.wait()
+        pool_s = time.perf_counter() - t0
+        analyzer.shutdown()
+    audio_s = args.files * args.seconds
+    return {
+        "files": args.files, "seconds_per_track": args.seconds, "workers": analyzer.workers,
+        "serial_files_per_s": len(items) / serial_s, "serial_realtime_factor": audio_s / serial_s,
+        "pool_files_per_s": len(items) / pool_s, "pool_realtime_factor": audio_s / pool_s,
+        "max_error_lu": error,
+    }
+
+
+def first_audio_read(path, probe=512 << 10, block=64 << 10):
+    # VLC 開始出聲前需要的 I/O：開檔並讀入開頭（demuxer 探測與第一批音訊）
+    t0 = time.perf_counter()
+    with open(path, "rb", buffering=0) as f:
+        remaining = probe
+        while remaining > 0 and f.read(min(block, remaining)):
+            remaining -= block
+    return time.perf_counter() - t0
+
+
+def bench_prefetch(args):
+    # 模擬一段播放：每首「聽」listen_ms 後換下一首，檔案一開始都不在 page cache。
+    # 分別量測沒有預讀與有預讀時，換歌後開始出聲前的 I/O 時間與預讀命中率
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.library or os.path.join(tmp, "music")
+        if not args.library:
+            make_wav_library(root, args.files, per_dir=12, depth=1, seconds=args.seconds)
+        paths = sorted(os.path.join(d, name) for d, _, names in os.walk(root)
+                       for name in names if name.lower().endswith(AUDIO_EXTENSIONS))
+        rng = random.Random(1)
+        if args.mode == "shuffle":
+            order = [rng.randrange(len(paths)) for _ in range(args.plays)]
+        else:
+            order = [n % len(paths) for n in range(args.plays)]
+        result = {"tracks": len(paths), "plays": len(order), "mode": args.mode,
+                  "listen_ms": args.listen_ms, "budget_mb": args.budget_mb}
+        if hasattr(os, "sync"):
+            os.sync()  # 剛產生的檔案是 dirty page，寫回後才能移出快取
+        for label in ("cold", "prefetch"):
+            if not all(evict(p) for p in paths):
+                result["evict"] = "unsupported (posix_fadvise missing), caches may be warm"
+            prefetcher = Prefetcher(budget=args.budget_mb << 20) if label == "prefetch" else None
+            samples = []
+            for n, i in enumerate(order):
+                if prefetcher is not None:
+                    prefetcher.claim(paths[i])
+                    prefetcher.pause()
+                samples.append(first_audio_read(paths[i]))
+                if prefetcher is not None:
+                    # 隨機模式的接下來幾首在 dmp.py 中預先抽好，因此可以預測
+                    prefetcher.predict(paths[j] for j in order[n + 1:n + 1 + args.count])
+                time.sleep(args.listen_ms / 1000)
+            (result[f"{label}_first_audio_ms_p50"], result[f"{label}_first_audio_ms_p95"],
+             result[f"{label}_first_audio_ms_max"]) = percentiles(samples)
+            if prefetcher is not None:
+                stats = prefetcher.stats()
+                prefetcher.close()
+                result["hit_rate"] = stats["hit_rate"]
+                result["prefetch_mb_read"] = stats["mb_read"]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Desktop Music Player benchmarks")
+    parser.add_argument("-o", "--output", help="also write the JSON result to this file")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("library-load", help="load time of a persisted library index")
+    p.add_argument("--tracks", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_library_load)
+
+    p = sub.add_parser("library-rescan", help="full scan vs. incremental rescan of a tree")
+    p.add_argument("--files", type=int, default=10_000)
+    p.set_defaults(func=bench_library_rescan)
+
+    p = sub.add_parser("tags", help="tag extraction throughput on a synthetic library")
+    p.add_argument("--files", type=int, default=5_000)
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=bench_tags)
+
+    p = sub.add_parser("search", help="per-keystroke search latency on a synthetic playlist")
+    p.add_argument("--tracks", type=int, default=100_000)
+    p.add_argument("--queries", nargs="+", default=["love night", "artist 42", "album 1234", "dream"])
+    p.set_defaults(func=bench_search)
+
+    p = sub.add_parser("sort", help="playlist sort: cached sort keys vs. recomputing them")
+    p.add_argument("--tracks", type=int, default=100_000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_sort)
+
+    p = sub.add_parser("memory", help="resident size of path lists vs. the compact track store")
+    p.add_argument("--tracks", type=int, default=1_000_000)
+    p.set_defaults(func=bench_memory)
+
+    p = sub.add_parser("player", help="hot paths of the real player, headless (offscreen Qt, dummy audio)")
+    p.add_argument("--files", type=int, default=1_000)
+    p.add_argument("--per-dir", type=int, default=12)
+    p.add_argument("--depth", type=int, default=2)
+    p.add_argument("--library", help="directory to generate the library in and reuse across runs")
+    p.add_argument("--switches", type=int, default=50)
+    p.add_argument("--scrub-moves", type=int, default=120)
+    p.add_argument("--theme-switches", type=int, default=12)
+    p.add_argument("--ticks", type=int, default=2_000)
+    p.add_argument("--timeout", type=float, default=600.0)
+    p.set_defaults(func=bench_player)
+
+    p = sub.add_parser("waveform", help="waveform peak computation vs. cached (memory-mapped) load")
+    p.add_argument("--files", type=int, default=10)
+    p.add_argument("--seconds", type=int, default=180)
+    p.set_defaults(func=bench_waveform)
+
+    p = sub.add_parser("artwork", help="cover thumbnails: UI-thread decode vs. worker pool, disk cache and LRU")
+    p.add_argument("--files", type=int, default=1_200)
+    p.add_argument("--per-dir", type=int, default=12)
+    p.add_argument("--cover-px", type=int, default=1000)
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--memory-mb", type=float, default=32)
+    p.add_argument("--scroll-interval", type=float, default=0.02, help="seconds between scrolled pages")
+    p.set_defaults(func=bench_artwork)
+
+    p = sub.add_parser("playlist", help="M3U8 import (streaming, batched stat) and export of a large playlist")
+    p.add_argument("--lines", type=int, default=50_000)
+    p.add_argument("--missing", type=float, default=0.02, help="fraction of entries that do not exist")
+    p.set_defaults(func=bench_playlist)
+
+    p = sub.add_parser("loudness", help="loudness analysis throughput and accuracy (low-priority pool)")
+    p.add_argument("--files", type=int, default=20)
+    p.add_argument("--seconds", type=int, default=180)
+    p.add_argument("--workers", type=int, default=None)
+    p.set_defaults(func=bench_loudness)
+
+    p = sub.add_parser("prefetch", help="time to first audio with and without read-ahead on a cold cache")
+    p.add_argument("--files", type=int, default=60)
+    p.add_argument("--seconds", type=float, default=240.0)
+    p.add_argument("--library", help="existing music folder to use, e.g. on an NFS/SMB mount")
+    p.add_argument("--mode", choices=("sequential", "shuffle"), default="shuffle")
+    p.add_argument("--plays", type=int, default=30)
+    p.add_argument("--count", type=int, default=3, help="tracks predicted ahead")
+    p.add_argument("--listen-ms", type=int, default=500)
+    p.add_argument("--budget-mb", type=int, default=64)
+    p.set_defaults(func=bench_prefetch)
+
+    p = sub.add_parser("ipc", help="control socket round-trip latency and forwarding launch time")
+    p.add_argument("--requests", type=int, default=1000)
+    p.add_argument("--batch", type=int, default=1000, help="paths per enqueue batch")
+    p.set_defaults(func=bench_ipc)
+
+    p = sub.add_parser("startup", help="cold start: import time, time to first paint and session restore")
+    p.add_argument("--files", type=int, default=20_000)
+    p.add_argument("--per-dir", type=int, default=12)
+    p.add_argument("--library", help="folder for the generated library (reused across runs)")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("theme", help="theme switch cost on a small vs. a large playlist")
+    p.add_argument("--rows", type=int, default=100_000)
+    p.add_argument("--small-rows", type=int, default=1_000)
+    p.add_argument("--switches", type=int, default=12)
+    p.add_argument("--settle", type=float, default=0.5, help="seconds of event processing after each switch")
+    p.set_defaults(func=bench_theme)
+
+    p = sub.add_parser("compare", help="compare two JSON results")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.set_defaults(func=bench_compare)
+
+    args = parser.parse_args(argv)
+    result = {"bench": args.bench, **args.func(args)}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,1076 @@
 import sys
 import os
 import random
+import re
+import multiprocessing
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ipc import ControlServer, forward, ipc_available, resolve_paths
+
+# 已有播放器在執行時，把命令列參數轉交給它後立即結束，不必載入 Qt 與 libvlc
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 exe 後 process pool 需要，必須在轉送參數之前
+    if forward(sys.argv[1:]):
+        sys.exit(0)
+
+import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QLabel, QVBoxLayout,
-    QFileDialog, QListWidget, QHBoxLayout, QMessageBox, QSlider, QStyle, QFrame,
-    QComboBox, QSizePolicy
+    QFileDialog, QListView, QHBoxLayout, QMessageBox, QSlider, QStyle, QFrame,
+    QComboBox, QSizePolicy, QLineEdit, QStyledItemDelegate, QStyleOptionViewItem
+)
+from PyQt5.QtCore import (
+    Qt, QTimer, QPoint, QObject, QEvent, pyqtSignal, QAbstractListModel, QModelIndex,
+    QFileSystemWatcher, QSocketNotifier, QLineF, QSize, QBuffer, QByteArray, QIODevice
 )
-from PyQt5.QtCore import Qt, QTimer, QPoint
-from PyQt5.QtGui import QIcon
-import vlc
+from PyQt5.QtGui import QIcon, QBrush, QColor, QPainter, QPalette, QImage, QImageReader, QPixmap
+
+from artwork import LRUCache, ThumbnailCache, content_hash, find_artwork, folder_image
+from library import LibraryIndex, load_session, save_session
+from loudness import LoudnessAnalyzer, track_gain
+from metrics import StallWatchdog, metrics, start_profiler, timed
+from playlists import PLAYLIST_EXTENSIONS, PlaylistReader, write_playlist
+from prefetch import Prefetcher
+from scanner import AUDIO_EXTENSIONS, FolderScanner
+from search import SearchIndex, search_text
+from sorting import SORT_MODES, TAG_MODES, SortKeys
+from tags import TagExtractor
+from tracks import TrackStore
+from waveform import WaveformCache, track_peaks
+from watcher import Inotify, inotify_available
+
+# 設定 VLC DLL 路徑（只有 Windows 需要）
+if sys.platform == "win32":
+    os.add_dll_directory(r"C:\Program Files\VideoLAN\VLC")
+
+# libvlc 延後到第一次播放（或第一次需要解碼）時才載入，視窗不必等它
+vlc = None
+
+
+def load_vlc():
+    global vlc
+    if vlc is None:
+        import vlc as module
+        vlc = module
+    return vlc
+
+# 建立 libvlc instance 的參數；benchmark 會加上 --aout=dummy，不實際輸出聲音
+VLC_ARGS = ["--quiet"]
+
+
+class ScanBridge(QObject):
+    # 將掃描執行緒的結果安全地轉送到 Qt 主執行緒
+    batch = pyqtSignal(list)
+    progress = pyqtSignal(int, int, int)
+    finished = pyqtSignal(bool)
+
+
+class PlayerBridge(QObject):
+    # VLC 事件在 libvlc 的執行緒觸發，不能在回呼中直接操作播放器或 UI，
+    # 一律透過 queued signal 轉回 Qt 主執行緒
+    ended = pyqtSignal()
+    playing = pyqtSignal()
+    paused = pyqtSignal()
+
+
+class ProgressScheduler(QObject):
+    # 自適應的進度更新排程：
+    # - 暫停、視窗隱藏/最小化、沒有載入歌曲時完全停止計時器
+    # - VLC 回報的位置只記錄為基準點，兩次回報之間以本機時鐘內插
+    # - 每次喚醒的間隔約等於進度條移動一個像素或時間標籤跳一秒所需的時間
+    MIN_INTERVAL = 16
+    MAX_INTERVAL = 1000
+    RESYNC_AFTER = 1.0  # 超過這麼久沒收到 VLC 回報時才主動查詢
+
+    def __init__(self, on_tick, poll, parent=None):
+        super().__init__(parent)
+        self.on_tick = on_tick
+        self.poll = poll
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._tick)
+
+        self.anchor = None  # (媒體時間 ms, perf_counter 秒)
+        self.length = 0
+        self.rate = 1.0
+        self.pixels = 1000
+        self.playing = False
+        self.visible = True
+        self.last_position = 0
+
+        # 計數器
+        self.wakeups = 0
+        self.vlc_queries = 0
+        self.tick_seconds = 0.0
+        self.max_tick_seconds = 0.0
+
+    # sync / set_length 可能在 libvlc 的事件執行緒呼叫，只做單一屬性賦值
+    def sync(self, media_ms):
+        self.anchor = (media_ms, time.perf_counter())
+
+    def set_length(self, length_ms):
+        self.length = length_ms
+
+    def reset(self):
+        self.anchor = None
+        self.length = 0
+        self.last_position = 0
+
+    def set_rate(self, rate):
+        if self.anchor is not None:
+            self.sync(self.position())
+        self.rate = rate
+        self._reschedule()
+
+    def set_pixels(self, pixels):
+        self.pixels = max(1, pixels)
+
+    def set_playing(self, playing):
+        if playing != self.playing and self.anchor is not None:
+            # 暫停時凍結基準點，恢復播放時從這裡繼續內插
+            self.anchor = (self.position(), time.perf_counter())
+        self.playing = playing
+        self._reschedule()
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self._reschedule()
+
+    @property
+    def active(self):
+        return self.playing and self.visible
+
+    def position(self):
+        anchor = self.anchor
+        if anchor is None:
+            return 0
+        media_ms, wall = anchor
+        if self.playing:
+            media_ms += (time.perf_counter() - wall) * 1000 * self.rate
+        if self.length > 0:
+            media_ms = min(media_ms, self.length)
+        return int(media_ms)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "interval_ms": self.timer.interval() if self.timer.isActive() else None,
+            "wakeups": self.wakeups,
+            "vlc_queries": self.vlc_queries,
+            "tick_ms_total": self.tick_seconds * 1000,
+            "tick_ms_max": self.max_tick_seconds * 1000,
+        }
+
+    def _next_interval(self, position):
+        if self.length <= 0:
+            return self.MAX_INTERVAL
+        per_pixel = self.length / self.pixels
+        to_next_second = 1000 - position % 1000
+        interval = min(per_pixel, to_next_second) / self.rate
+        return int(min(max(interval, self.MIN_INTERVAL), self.MAX_INTERVAL))
+
+    def _reschedule(self):
+        if self.active:
+            if not self.timer.isActive():
+                self.timer.start(self.MIN_INTERVAL)
+        else:
+            self.timer.stop()
+
+    def _tick(self):
+        start = time.perf_counter()
+        self.wakeups += 1
+        anchor = self.anchor
+        if anchor is None or start - anchor[1] > self.RESYNC_AFTER:
+            self.vlc_queries += 1
+            media_ms = self.poll()
+            if media_ms >= 0:
+                self.sync(media_ms)
+        position = self.position()
+        # 基準點更新造成的小幅倒退不顯示，避免進度條來回抖動
+        if self.last_position - 250 < position < self.last_position:
+            position = self.last_position
+        self.last_position = position
+        self.on_tick(position)
+        if self.active:
+            self.timer.start(self._next_interval(position))
+        cost = time.perf_counter() - start
+        self.tick_seconds += cost
+        self.max_tick_seconds = max(self.max_tick_seconds, cost)
+
+
+class SeekScheduler(QObject):
+    # 拖曳進度條時合併連續的 seek：
+    # - 同一時間只有一個 seek 在進行；新的目標只覆蓋尚未送出的目標，舊目標直接丟棄
+    # - 上一個 seek 生效（VLC 回報的時間落在目標附近）或逾時後才送出下一個，
+    #   兩次 seek 之間至少間隔 MIN_INTERVAL
+    # - 放開滑桿時立即送出最後的位置
+    # 每個 seek 從送出到生效的時間記錄在 settle_times
+    MIN_INTERVAL = 0.05
+    SETTLE_TIMEOUT = 0.5
+    TOLERANCE_MS = 1000
+
+    settled = pyqtSignal(float)
+
+    def __init__(self, seek, parent=None):
+        super().__init__(parent)
+        self.seek = seek
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._issue)
+        self.settled.connect(self._on_settled)
+
+        self.target = None  # 尚未送出的目標（ms）
+        self.in_flight = None  # (目標 ms, 送出時的 perf_counter 秒)
+        self.last_issue = 0.0
+        self.settle_times = deque(maxlen=100)
+
+        # 計數器
+        self.requested = 0
+        self.issued = 0
+        self.unsettled = 0
+
+    def request(self, target_ms):
+        self.requested += 1
+        self.target = target_ms
+        if not self.timer.isActive():
+            self._issue()
+
+    def commit(self, target_ms):
+        self.requested += 1
+        self.timer.stop()
+        self.target = None
+        self._send(target_ms)
+
+    def cancel(self):
+        self.timer.stop()
+        self.target = None
+        self.in_flight = None
+
+    # 在 libvlc 的事件執行緒呼叫
+    def observe(self, media_ms):
+        flight = self.in_flight
+        if flight is not None and abs(media_ms - flight[0]) <= self.TOLERANCE_MS:
+            self.in_flight = None
+            self.settled.emit(time.perf_counter() - flight[1])
+
+    def stats(self):
+        times = sorted(self.settle_times)
+        return {
+            "requested": self.requested,
+            "issued": self.issued,
+            "unsettled": self.unsettled,
+            "settle_ms_p50": times[len(times) // 2] * 1000 if times else None,
+            "settle_ms_max": times[-1] * 1000 if times else None,
+        }
+
+    def _on_settled(self, seconds):
+        self.settle_times.append(seconds)
+        if metrics.enabled:
+            metrics.record("seek.settle", seconds)
+        self._issue()
+
+    def _issue(self):
+        if self.target is None:
+            return
+        now = time.perf_counter()
+        flight = self.in_flight
+        if flight is not None:
+            age = now - flight[1]
+            if age < self.SETTLE_TIMEOUT:
+                # 等待上一個 seek 生效；生效時 settled 會提早觸發
+                self.timer.start(int((self.SETTLE_TIMEOUT - age) * 1000) + 1)
+                return
+            self.unsettled += 1
+            self.in_flight = None
+        gap = now - self.last_issue
+        if gap < self.MIN_INTERVAL:
+            self.timer.start(int((self.MIN_INTERVAL - gap) * 1000) + 1)
+            return
+        target, self.target = self.target, None
+        self._send(target)
+
+    def _send(self, target_ms):
+        self.in_flight = (target_ms, time.perf_counter())
+        self.last_issue = self.in_flight[1]
+        self.issued += 1
+        self.seek(target_ms)
+
+
+class WaveformBridge(QObject):
+    # 波形由背景執行緒計算，結果連同請求編號送回主執行緒
+    ready = pyqtSignal(int, object)
+
+
+class WaveformSlider(QSlider):
+    # 在進度條溝槽的後方畫出整首歌的波形概覽，已播放的部分顏色較亮。
+    # 峰值在寬度改變時才重新縮放成每個像素一條線，重繪時只畫線
+    def __init__(self, orientation, parent=None):
+        super().__init__(orientation, parent)
+        self.peaks = None
+        self._lines = None
+        self.setMinimumHeight(32)
+
+    def set_peaks(self, peaks):
+        self.peaks = peaks
+        self._lines = None
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._lines = None
+
+    def _scale(self):
+        width, height = self.width(), self.height()
+        edges = (np.arange(width) * len(self.peaks)) // width
+        heights = np.maximum.reduceat(np.asarray(self.peaks), edges) / 255 * (height / 2 - 1)
+        mid = height / 2
+        self._lines = [QLineF(x + 0.5, mid - h, x + 0.5, mid + h) for x, h in enumerate(heights.tolist())]
+
+    def paintEvent(self, event):
+        if self.peaks is not None and self.width() > 0:
+            if self._lines is None:
+                self._scale()
+            split = QStyle.sliderPositionFromValue(self.minimum(), self.maximum(), self.value(), self.width())
+            color = QColor(self.palette().color(QPalette.WindowText))
+            painter = QPainter(self)
+            color.setAlpha(200)
+            painter.setPen(color)
+            painter.drawLines(self._lines[:split])
+            color.setAlpha(90)
+            painter.setPen(color)
+            painter.drawLines(self._lines[split:])
+            painter.end()
+        super().paintEvent(event)
+
+
+class PlaylistBridge(QObject):
+    # 播放清單檔由背景執行緒讀取，每次讀取使用新的 bridge（同 ScanBridge）
+    batch = pyqtSignal(list)
+    finished = pyqtSignal(bool)
+
+
+class TagBridge(QObject):
+    # 標籤解析結果由 process pool 的回呼執行緒送回主執行緒
+    ready = pyqtSignal(list)
+
+
+class ControlBridge(QObject):
+    # 控制介面的請求由 asyncio 執行緒送到主執行緒處理，結果寫入附帶的 Future
+    request = pyqtSignal(object, object)
+
+
+class LoudnessBridge(QObject):
+    # 響度分析結果同樣由 process pool 的回呼執行緒送回主執行緒
+    ready = pyqtSignal(list)
+
+
+class ArtworkLoader(QObject):
+    # 封面在背景執行緒池中取出、解碼並縮小，主執行緒只會拿到縮好的 QImage。
+    # 縮圖以圖片內容的雜湊存在磁碟上，記憶體中的 QImage 以總位元組數為上限做 LRU。
+    # 等待中的請求以堆疊處理：最後要求的先做，快速捲動時畫面上目前的列優先，捲過頭的舊請求會被丟棄
+    loaded = pyqtSignal(str, int)  # (path, 邊長) 的封面已可取得，或確定沒有封面
+    _finished = pyqtSignal(object, object, object)  # 背景執行緒 -> 主執行緒：(path, 邊長), 雜湊, QImage
+
+    def __init__(self, workers=None, memory=32 << 20, queue=256, parent=None):
+        super().__init__(parent)
+        self.queue = queue
+        try:
+            self.cache = ThumbnailCache()
+        except OSError as e:
+            print(f"Error opening thumbnail cache: {e}")
+            self.cache = None
+        self.images = LRUCache(memory)  # (雜湊, 邊長) -> QImage，成本為位元組數
+        self.digests = LRUCache(50_000)  # path -> 封面內容的雜湊；"" 表示沒有封面
+        self._folders = LRUCache(10_000)  # 目錄 -> 資料夾封面圖檔路徑；"" 表示沒有。背景執行緒共用，以 _lock 保護
+        self._pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                        thread_name_prefix="dmp-artwork")
+        self._lock = threading.Lock()
+        self._stack = []
+        self._pending = set()
+        self._closed = False
+        self.decoded = 0  # 從原圖解碼的次數（其餘來自磁碟快取）
+        self._finished.connect(self._on_finished)
+
+    def image(self, path, size):
+        # 已在記憶體中時直接回傳；否則排入背景載入並回傳 None，完成後發出 loaded
+        digest = self.digests.get(path)
+        if digest == "":
+            return None
+        if digest is not None:
+            image = self.images.get((digest, size))
+            if image is not None:
+                return image
+        self.request(path, size)
+        return None
+
+    def request(self, path, size):
+        key = (path, size)
+        with self._lock:
+            if self._closed or key in self._pending:
+                return
+            self._pending.add(key)
+            self._stack.append(key)
+            if len(self._stack) > self.queue:
+                self._pending.discard(self._stack.pop(0))
+        self._pool.submit(self._work)
+
+    def forget(self, paths=(), dirs=()):
+        # 檔案內容變動或被移除後，下次要求時重新取出封面
+        for path in paths:
+            self.digests.pop(path)
+        with self._lock:
+            for d in dirs:
+                self._folders.pop(d)
+
+    def _work(self):
+        # 在背景執行緒執行；每個工作處理堆疊頂端的一個請求
+        with self._lock:
+            if not self._stack:
+                return
+            key = self._stack.pop()
+        try:
+            digest, image = self._load(*key)
+        except Exception as e:
+            print(f"Error loading artwork: {e}")
+            digest, image = "", None
+        with self._lock:
+            if self._closed:
+                return
+        self._finished.emit(key, digest, image)
+
+    def _folder_image(self, directory):
+        with self._lock:
+            found = self._folders.get(directory)
+        if found is None:
+            found = folder_image(directory) or ""
+            with self._lock:
+                self._folders.put(directory, found)
+        return found
+
+    def _load(self, path, size):
+        data = find_artwork(path, self._folder_image)
+        if data is None:
+            return "", None
+        digest = content_hash(data)
+        image = QImage()
+        if self.cache is not None:
+            thumb = self.cache.load(digest, size)
+            if thumb is not None and image.loadFromData(thumb):
+                return digest, image
+        # JPEG 在解碼時就縮小（libjpeg 的 DCT 縮放），不必先解出整張原圖
+        buffer = QBuffer()
+        buffer.setData(QByteArray(data))
+        buffer.open(QIODevice.ReadOnly)
+        reader = QImageReader(buffer)
+        full = reader.size()
+        if full.isValid() and (full.width() > size or full.height() > size):
+            reader.setScaledSize(full.scaled(size, size, Qt.KeepAspectRatio))
+        image = reader.read()
+        if image.isNull():
+            return "", None
+        if image.width() > size or image.height() > size:
+            image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        image = image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        with self._lock:
+            self.decoded += 1
+        if self.cache is not None:
+            out = QByteArray()
+            buffer = QBuffer(out)
+            buffer.open(QIODevice.WriteOnly)
+            image.save(buffer, "PNG")
+            try:
+                self.cache.store(digest, size, bytes(out))
+            except OSError as e:
+                print(f"Error saving thumbnail: {e}")
+        return digest, image
+
+    def _on_finished(self, key, digest, image):
+        with self._lock:
+            self._pending.discard(key)
+        path, size = key
+        self.digests.put(path, digest)
+        if image is not None:
+            self.images.put((digest, size), image, image.sizeInBytes())
+        self.loaded.emit(path, size)
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            self._stack.clear()
+            self._pending.clear()
+        self._pool.shutdown(wait=False)
+
+
+class FolderWatcher(QObject):
+    # 監看音樂庫中的每個目錄；變動經過 debounce 合併後，以目錄清單一次送出。
+    # Linux 直接使用 inotify（只計入音樂檔與子目錄的事件），其他平台退回 QFileSystemWatcher
+    DEBOUNCE_MS = 500
+    MAX_DELAY_MS = 3000  # 持續有變動時（例如正在複製整張專輯），最久這麼久先送出一批
+    WATCH_CHUNK = 2000
+
+    changed = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.roots = []
+        self.pending = set()
+        self.first_pending = 0.0
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+        # 大型音樂庫有上萬個目錄，分批加入監看，不卡住啟動
+        self._to_watch = deque()
+        self._watch_timer = QTimer(self)
+        self._watch_timer.setInterval(0)
+        self._watch_timer.timeout.connect(self._watch_some)
+        self._warned = False
+
+        self.inotify = None
+        self.fallback = None
+        if inotify_available():
+            try:
+                self.inotify = Inotify(AUDIO_EXTENSIONS)
+                self.notifier = QSocketNotifier(self.inotify.fileno(), QSocketNotifier.Read, self)
+                self.notifier.activated.connect(self._read_inotify)
+            except OSError as e:
+                print(f"inotify unavailable, falling back to QFileSystemWatcher: {e}")
+                self.inotify = None
+        if self.inotify is None:
+            self.fallback = QFileSystemWatcher(self)
+            self.fallback.directoryChanged.connect(self._on_directory_changed)
+            self._watched = set()
+
+    def set_roots(self, roots):
+        self.roots = list(roots)
+        self.pending.clear()
+        self.timer.stop()
+        self._to_watch.clear()
+        if self.inotify is not None:
+            self.inotify.clear()
+        elif self._watched:
+            self.fallback.removePaths(list(self._watched))
+            self._watched.clear()
+
+    def add_root(self, root):
+        # 已監看的目錄與還沒送出的變動都保留；新資料夾中的目錄在掃描時才加入監看
+        if root not in self.roots:
+            self.roots.append(root)
+
+    def watch(self, dirs):
+        self._to_watch.extend(dirs)
+        self._watch_timer.start()
+
+    def _watch_some(self):
+        batch = [self._to_watch.popleft()
+                 for _ in range(min(self.WATCH_CHUNK, len(self._to_watch)))]
+        if self.inotify is not None:
+            for path in batch:
+                if not self.inotify.add(path) and self.inotify.limit_reached and not self._warned:
+                    self._warned = True
+                    print("inotify watch limit reached; raise fs.inotify.max_user_watches "
+                          "to watch the whole library")
+        else:
+            batch = [path for path in batch if path not in self._watched]
+            if batch:
+                self._watched.update(batch)
+                self.fallback.addPaths(batch)
+        if not self._to_watch:
+            self._watch_timer.stop()
+
+    def _read_inotify(self):
+        changed, overflow = self.inotify.read()
+        if overflow:
+            # 事件佇列溢位：不知道漏了什麼，重新檢查所有根目錄
+            changed.update(self.roots)
+        self._queue(changed)
+
+    def _on_directory_changed(self, path):
+        self._queue({path})
+
+    def _queue(self, dirs):
+        roots = [(r, os.path.join(r, "")) for r in self.roots]
+        dirs = {d for d in dirs if any(d == r or d.startswith(prefix) for r, prefix in roots)}
+        if not dirs:
+            return
+        now = time.monotonic()
+        if not self.pending:
+            self.first_pending = now
+        self.pending |= dirs
+        remaining = self.MAX_DELAY_MS - (now - self.first_pending) * 1000
+        self.timer.start(int(max(0, min(self.DEBOUNCE_MS, remaining))))
+
+    def flush(self):
+        self.timer.stop()
+        if self.pending:
+            dirs = sorted(self.pending)
+            self.pending.clear()
+            self.changed.emit(dirs)
+
+    def close(self):
+        self.set_roots([])
+        self._watch_timer.stop()
+        if self.inotify is not None:
+            self.notifier.setEnabled(False)
+            self.inotify.close()
+
+
+THUMB_SIZE = 24  # 播放清單縮圖的邊長
+COVER_SIZE = 64  # 目前歌曲封面的邊長
+
+
+class PlaylistModel(QAbstractListModel):
+    # 播放清單模型：songs 是依播放順序排列的 track id，歌曲資料都在 store 中，
+    # 顯示文字在 view 需要時才產生。
+    # 設定搜尋字串時，view 只顯示 visible 中的歌曲；song row 指 songs 中的位置，
+    # view row 指畫面上的位置，兩者在沒有篩選時相同
+    INDEX_CHUNK = 2000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = TrackStore()
+        self.songs = array("I")
+        self.current_row = -1
+        self.sort_keys = SortKeys(self.store)
+        self.sort_mode = None  # 最後一次排序的方式；None 表示維持載入的順序
+        self.current_brush = QBrush(Qt.black)
+        # 封面縮圖：artwork 為 ArtworkLoader 時顯示；還沒載入或沒有封面的列用同樣大小的空白圖，列高與文字位置不變
+        self.artwork = None
+        self.blank_thumb = None
+
+        # 搜尋
+        self.search_index = SearchIndex()
+        self.query = ""
+        self.visible = None  # 篩選後顯示的 track id；None 表示顯示全部
+        self._row_of = None  # track id -> song row，需要時才建立
+        self._view_row_of = None  # track id -> view row，需要時才建立
+        # 索引在事件迴圈空檔分批建立，避免載入大型音樂庫時卡住畫面
+        self._unindexed = array("I")
+        self._unindexed_pos = 0
+        self._index_timer = QTimer(self)
+        self._index_timer.setInterval(0)
+        self._index_timer.timeout.connect(self._index_some)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.songs) if self.visible is None else len(self.visible)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        tid = self.track_at(index.row())
+        if role == Qt.DisplayRole:
+            return self.display_name(tid)
+        if role == Qt.DecorationRole and self.artwork is not None:
+            return self.artwork.image(self.store.path(tid), THUMB_SIZE) or self.blank_thumb
+        if role == Qt.ToolTipRole:
+            return self.store.path(tid)
+        if role == Qt.BackgroundRole and 0 <= self.current_row < len(self.songs) \
+                and tid == self.songs[self.current_row]:
+            return self.current_brush
+        return None
+
+    def set_artwork(self, loader):
+        # 開關縮圖；版面由 view 重新配置
+        self.artwork = loader
+        if loader is not None and self.blank_thumb is None:
+            self.blank_thumb = QImage(THUMB_SIZE, THUMB_SIZE, QImage.Format_ARGB32_Premultiplied)
+            self.blank_thumb.fill(Qt.transparent)
+
+    def track_at(self, view_row):
+        return self.songs[view_row] if self.visible is None else self.visible[view_row]
+
+    def song_row(self, view_row):
+        if self.visible is None:
+            return view_row
+        return self._rows().get(self.visible[view_row], -1)
+
+    def row_of(self, tid):
+        # track id -> song row，不在清單中時回傳 -1
+        return self._rows().get(tid, -1)
+
+    def _rows(self):
+        if self._row_of is None:
+            self._row_of = {tid: row for row, tid in enumerate(self.songs)}
+        return self._row_of
+
+    def view_row(self, song_row):
+        if self.visible is None or not 0 <= song_row < len(self.songs):
+            return song_row
+        if self._view_row_of is None:
+            self._view_row_of = {tid: row for row, tid in enumerate(self.visible)}
+        return self._view_row_of.get(self.songs[song_row], -1)
+
+    def path(self, row):
+        return self.store.path(self.songs[row])
+
+    def title(self, row):
+        return self.display_name(self.songs[row])
+
+    def display_name(self, tid):
+        store = self.store
+        title = store.title(tid)
+        if title:
+            artist = store.artist(tid)
+            return f"{artist} - {title}" if artist else title
+        return store.name(tid)
+
+    def tracks_for(self, paths):
+        lookup = self.store.lookup
+        return {tid for tid in map(lookup, paths) if tid >= 0}
+
+    def set_songs(self, rows):
+        # rows 為音樂庫索引的列：(path, size, mtime, title, artist, album, duration, trackno)
+        self.beginResetModel()
+        self.store.clear()
+        self.sort_keys.clear()
+        self.songs = self.store.add(rows)
+        self.current_row = -1
+        self._row_of = None
+        self.search_index.clear()
+        self._unindexed = array("I", self.songs)
+        self._unindexed_pos = 0
+        self._filter()
+        self.endResetModel()
+        self._index_timer.start()
+
+    def append(self, rows):
+        if not rows:
+            return
+        tids = self.store.add(rows)
+        if self._row_of is not None:
+            self._row_of.update((tid, len(self.songs) + i) for i, tid in enumerate(tids))
+        if self.visible is None:
+            first = len(self.songs)
+            self.beginInsertRows(QModelIndex(), first, first + len(tids) - 1)
+            self.songs.extend(tids)
+            self.endInsertRows()
+            self._unindexed.extend(tids)
+            self._index_timer.start()
+            return
+        # 篩選中：新歌立即加入索引，符合條件的接在 visible 後面
+        self.songs.extend(tids)
+        self._index_tracks(tids)
+        matched = [tid for tid in tids if self.search_index.match(tid, self.query)]
+        if matched:
+            first = len(self.visible)
+            self.beginInsertRows(QModelIndex(), first, first + len(matched) - 1)
+            self.visible.extend(matched)
+            self._view_row_of = None
+            self.endInsertRows()
+
+    def update_tags(self, rows):
+        tids = self.store.set_tags(rows)
+        self.sort_keys.invalidate(tids, TAG_MODES)
+        # 已建立索引的歌曲更新搜尋文字；尚未索引的之後會用最新的標籤建立
+        doc_of = self.search_index.doc_of
+        self._index_tracks([tid for tid in tids if tid in doc_of])
+        if self.visible is not None:
+            self.refilter()
+        elif self.songs:
+            # view 只會重繪可見的列，所以整段通知即可，不必逐列查找
+            self.dataChanged.emit(self.index(0), self.index(len(self.songs) - 1), [Qt.DisplayRole])
+
+    def remove_rows(self, rows):
+        if not rows:
+            return
+        tids = [self.songs[row] for row in rows]
+        self.search_index.remove_many(tids)
+        self._row_of = None
+        filtering = self.visible is not None
+        if filtering:
+            self.beginResetModel()
+        # 由後往前移除連續區段，每段只發出一次訊號
+        rows = sorted(rows, reverse=True)
+        i = 0
+        while i < len(rows):
+            last = first = rows[i]
+            i += 1
+            while i < len(rows) and rows[i] == first - 1:
+                first = rows[i]
+                i += 1
+            if not filtering:
+                self.beginRemoveRows(QModelIndex(), first, last)
+            del self.songs[first:last + 1]
+            if self.current_row > last:
+                self.current_row -= last - first + 1
+            elif self.current_row >= first:
+                self.current_row = -1
+            if not filtering:
+                self.endRemoveRows()
+        self.store.remove(tids)
+        if filtering:
+            self._filter()
+            self.endResetModel()
+
+    def sort_by(self, mode):
+        # 依快取的排序鍵穩定排序（鍵相同的歌保持原本的相對順序），songs 原地改寫。
+        # 以 layoutChanged 通知 view，選取的列與捲動位置跟著歌曲移動，不必重設整個模型
+        self.sort_mode = mode
+        current = self.songs[self.current_row] if 0 <= self.current_row < len(self.songs) else None
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        moved = [self.track_at(index.row()) for index in persistent]
+        self.songs[:] = self.sort_keys.sorted(self.songs, mode)
+        self._row_of = None
+        if current is not None:
+            self.current_row = self.row_of(current)
+        if self.visible is not None:
+            self.visible = array("I", self._in_song_order(self.visible))
+        self._view_row_of = None
+        if persistent:
+            rows = self._rows() if self.visible is None else {tid: row for row, tid in enumerate(self.visible)}
+            self.changePersistentIndexList(persistent, [self.index(rows[tid]) for tid in moved])
+        self.layoutChanged.emit()
+
+    def _in_song_order(self, tids):
+        rows = self._rows()
+        return sorted(tids, key=rows.__getitem__)
+
+    def set_current(self, row):
+        # 換歌時只更新新舊兩列，不必重繪整個清單
+        previous, self.current_row = self.current_row, row
+        for r in (previous, row):
+            if 0 <= r < len(self.songs):
+                view_row = self.view_row(r)
+                if view_row >= 0:
+                    index = self.index(view_row)
+                    self.dataChanged.emit(index, index, [Qt.BackgroundRole])
+
+    def set_filter(self, query):
+        self.query = query
+        self.refilter()
+
+    def refilter(self):
+        self.beginResetModel()
+        self._filter()
+        self.endResetModel()
+
+    def _filter(self):
+        self._view_row_of = None
+        if not self.query.split():
+            self.visible = None
+            self.search_index.search("")
+            return
+        # 第一次搜尋時把還沒建立的索引一次補齊
+        self._index_remaining()
+        matches = self.search_index.search(self.query)
+        # 搜尋結果依加入的順序；排序過的清單要照目前的順序顯示
+        if self.sort_mode is not None:
+            matches = self._in_song_order(matches)
+        self.visible = array("I", matches)
+
+    def _search_text(self, tid):
+        store = self.store
+        return search_text(store.name(tid), store.title(tid), store.artist(tid), store.album(tid))
+
+    def _index_tracks(self, tids):
+        self.search_index.add_many((tid, self._search_text(tid)) for tid in tids)
+
+    def _index_some(self):
+        pending = self._unindexed
+        start = self._unindexed_pos
+        end = min(start + self.INDEX_CHUNK, len(pending))
+        self._unindexed_pos = end
+        # 等待期間已被移除的歌曲不再加入
+        alive = self.store.alive
+        self._index_tracks(tid for tid in pending[start:end] if alive(tid))
+        if end >= len(pending):
+            self._unindexed = array("I")
+            self._unindexed_pos = 0
+            self._index_timer.stop()
+
+    def _index_remaining(self):
+        while self._unindexed:
+            self._index_some()
+
+
+# 與主題無關的樣式，建立視窗時只設定一次
+BASE_STYLE = """
+QPushButton {
+    background: transparent;
+    border: none;
+    font-size: 16px;
+    padding: 5px;
+}
+QPushButton:hover {
+    border-radius: 3px;
+}
+QWidget#player QPushButton#playButton {
+    font-size: 20px;
+    border-radius: 17px;
+    padding: 0px;
+    text-align: center;
+}
+QWidget#player QPushButton#prevButton,
+QWidget#player QPushButton#nextButton,
+QWidget#player QPushButton#repeatButton,
+QWidget#player QPushButton#shuffleButton,
+QWidget#player QPushButton#gaplessButton,
+QWidget#player QPushButton#normalizeButton {
+    font-size: 18px;
+    border-radius: 17px;
+}
+QWidget#player QPushButton#thumbsButton {
+    border-radius: 3px;
+}
+QWidget#player QPushButton#playButton:hover,
+QWidget#player QPushButton#prevButton:hover,
+QWidget#player QPushButton#nextButton:hover {
+    background: rgba(255, 255, 255, 30);
+}
+QWidget#player QPushButton#repeatButton:checked,
+QWidget#player QPushButton#shuffleButton:checked,
+QWidget#player QPushButton#gaplessButton:checked,
+QWidget#player QPushButton#normalizeButton:checked,
+QWidget#player QPushButton#thumbsButton:checked {
+    color: #4CAF50;
+}
+QSlider::groove:horizontal {
+    height: 8px;
+    margin: 2px 0;
+    border-radius: 4px;
+}
+QSlider::handle:horizontal {
+    width: 18px;
+    margin: -2px 0;
+    border-radius: 9px;
+}
+QComboBox {
+    border: none;
+    border-radius: 3px;
+    padding: 2px 5px;
+}
+QComboBox::drop-down {
+    border: none;
+}
+QComboBox::down-arrow {
+    image: none;
+    border: none;
+}
+QLineEdit#searchBox {
+    border: none;
+    border-radius: 3px;
+    padding: 3px 5px;
+}
+QLabel#songLabel {
+    font-size: 18px;
+    qproperty-alignment: AlignCenter;
+}
+QLabel#timeLabel {
+    font-size: 16px;
+    qproperty-alignment: AlignCenter;
+}
+QWidget#player QLabel#titleLabel {
+    color: white;
+    font-size: 14px;
+}
+QLabel#volumeLabel {
+    font-size: 16px;
+}
+"""
+
+# 各主題的顏色，只作用在視窗的 theme 屬性等於主題名稱時。
+# 選擇器刻意不涵蓋播放清單：清單的顏色來自調色盤，切換主題時它不必重新套用樣式與排版
+THEME_STYLE = """
+{scope}, {scope} > .QWidget, {scope} QLabel, {scope} QSlider, {scope} QComboBox QAbstractItemView {{
+    background-color: {background};
+    color: {text};
+}}
+{scope} QPushButton {{
+    color: {text};
+}}
+{scope} QPushButton:hover {{
+    background: {button_hover};
+}}
+{scope} QPushButton#repeatButton:checked,
+{scope} QPushButton#shuffleButton:checked,
+{scope} QPushButton#gaplessButton:checked,
+{scope} QPushButton#normalizeButton:checked,
+{scope} QPushButton#thumbsButton:checked {{
+    background: {selected_bg};
+}}
+{scope} QSlider::groove:horizontal {{
+    border: 1px solid {text};
+    background: {slider_bg};
+}}
+{scope} QSlider::handle:horizontal {{
+    background: {text};
+    border: 1px solid {background};
+}}
+{scope} QComboBox, {scope} QLineEdit#searchBox {{
+    background: {combo_bg};
+    color: {text};
+}}
+"""
+
+
+def parse_color(text):
+    # Qt5 的 QColor 不認得 rgb()/rgba() 字串，自己解析；其餘（顏色名稱、#rrggbb）交給 QColor
+    match = re.fullmatch(r"rgba?\((\d+),\s*(\d+),\s*(\d+)(?:,\s*(\d+))?\)", text.strip())
+    if match is None:
+        return QColor(text)
+    r, g, b, a = match.groups()
+    return QColor(int(r), int(g), int(b), 255 if a is None else int(a))
+
+
+def compile_themes(themes):
+    # 回傳 (包含所有主題的樣式表, 主題名稱 -> 播放清單的調色盤)
+    sheets = [BASE_STYLE]
+    palettes = {}
+    for name, theme in themes.items():
+        sheets.append(THEME_STYLE.format(scope=f'QWidget#player[theme="{name}"]', **theme))
+        palette = QPalette()
+        for role, key in ((QPalette.Base, "background"), (QPalette.Window, "background"),
+                          (QPalette.Button, "background"), (QPalette.ButtonText, "text"),
+                          (QPalette.Text, "text"), (QPalette.WindowText, "text"),
+                          (QPalette.Highlight, "selected_bg"), (QPalette.HighlightedText, "text")):
+            palette.setColor(role, parse_color(theme[key]))
+        palettes[name] = palette
+    return "".join(sheets), palettes
+
+
+class PlaylistDelegate(QStyledItemDelegate):
+    # 列的內距與選取背景由 delegate 畫出，清單本身不套用樣式表
+    PADDING = 5
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        return QSize(size.width() + 2 * self.PADDING, size.height() + 2 * self.PADDING)
+
+    def paint(self, painter, option, index):
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        else:
+            background = index.data(Qt.BackgroundRole)
+            if background is not None:
+                painter.fillRect(option.rect, background)
+        option = QStyleOptionViewItem(option)
+        option.rect = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        option.state &= ~QStyle.State_Selected
+        super().paint(painter, option, index)
 
-# 設定 VLC DLL 路徑
-os.add_dll_directory(r"C:\Program Files\VideoLAN\VLC")
 
 class MusicPlayer(QWidget):
+    IMPORT_CHUNK = 500  # 匯入播放清單時每次事件迴圈空檔加入的歌數
+    TAG_CHUNK = 500  # 每次空檔套用的標籤解析結果列數
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Desktop Music Player")
+        self.setObjectName("player")  # 樣式表以這個名稱與 theme 屬性區分主題
         self.setMinimumSize(400, 500)  # 設定最小視窗大小
         self.setAttribute(Qt.WA_TranslucentBackground)  # 開啟透明背景
         self.setWindowFlags(Qt.FramelessWindowHint)  # 無邊框
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)  # 可拉伸
-        logo_path = os.path.join(os.path.dirname(__file__), "dmp_logo.png")
-        self.setWindowIcon(QIcon(logo_path))
+        self.started = False  # 第一次繪製之後才載入圖示、音樂庫與上次的播放狀態
+        self.ready = False  # finish_startup 完成
+        self.pending_open = []  # 啟動完成前收到的 open_paths 參數
+        self.session = load_session()  # 上次關閉時的播放狀態
 
         # 主題相關變數
         self.current_theme = "translucent"  # 預設主題
@@ -53,24 +1101,105 @@ class MusicPlayer(QWidget):
             }
         }
 
+        # 所有主題預先編譯成同一份樣式表與各自的播放清單調色盤
+        self.theme_style, self.theme_palettes = compile_themes(self.themes)
+        if self.session.get("theme") in self.themes:
+            self.current_theme = self.session["theme"]
+
         # 主題切換按鈕
         self.theme_button = QPushButton("🎨 Theme")
         self.theme_button.clicked.connect(self.toggle_theme)
 
-        # 設置初始主題
-        self.apply_theme(self.current_theme)
-
-        # VLC 播放器
-        self.player = vlc.MediaPlayer('--quiet')   
-        self.song_list = []
+        # VLC 播放器：第一次播放時才由 ensure_player 建立
+        self.vlc_instance = None
+        self.player = None
+        self.resume = None  # 還原的播放位置 (track id, ms)，第一次播放這首時從這裡開始
+        self.song_list = array("I")  # 播放順序中的 track id
         self.current_index = -1
         self.repeat = False
         self.shuffle = False
+        self.gapless = True
+        self.normalize = True  # 依響度分析結果自動調整每首歌的增益
+        self.equalizer = None  # 套用增益用的 vlc.AudioEqualizer（只用 preamp）
+        self.shuffle_queue = deque()  # 隨機模式下預先抽好的接下來幾首
+        self.prepared = None  # 預先建立並解析好的下一首：(index, track id, vlc.Media)
+        # 把接下來幾首預讀進 page cache，慢速儲存上開檔不必等待
+        self.prefetcher = Prefetcher()
+        self.prefetch_count = 3
+        self._load_start = None  # (開始載入的時間, 是否已預讀)，用來量測到開始出聲的時間
+        self.first_audio_times = {True: deque(maxlen=100), False: deque(maxlen=100)}
+        self.control_server = None  # 單一執行個體的控制介面，由 start_control_server 啟動
         self.current_speed = 1.0
         self.is_sliding = False
         self.last_position = 0
         self.position_unchanged_count = 0
 
+        # 背景資料夾掃描
+        self.scanner = None
+        self.scan_bridge = None
+        self.retired_bridges = set()  # 已取消但掃描執行緒尚未結束的 bridge
+        self.scan_autoplay = False
+        self.scan_quiet = False  # 監看觸發的重新掃描不顯示在按鈕上
+        self.scan_forced = []  # 重新掃描時強制重新列出的目錄
+        # 背景讀取播放清單檔；讀到的歌先放在 import_rows，在事件迴圈空檔分段加入清單
+        self.playlist_reader = None
+        self.playlist_bridge = None
+        self.import_rows = deque()
+        self.import_read = False  # 清單檔已讀完，import_rows 清空後匯入即完成
+        self.import_timer = QTimer(self)
+        self.import_timer.setInterval(0)
+        self.import_timer.timeout.connect(self.import_some)
+        # 啟動後延遲一段時間才重新掃描音樂庫
+        self.verify_timer = QTimer(self)
+        self.verify_timer.setSingleShot(True)
+        self.verify_timer.setInterval(3000)
+        self.verify_timer.timeout.connect(self.verify_library)
+
+        # 監看已載入的資料夾，檔案新增/刪除/改名時增量更新清單
+        self.watcher = FolderWatcher(self)
+        self.watcher.changed.connect(self.on_folders_changed)
+        self.changed_dirs = set()  # 掃描進行中時累積的變動，掃描結束後再處理
+
+        # 持久化音樂庫索引
+        try:
+            self.library = LibraryIndex()
+        except Exception as e:
+            print(f"Error opening library index: {e}")
+            self.library = LibraryIndex(":memory:")
+
+        # 波形概覽：單一背景執行緒計算，結果快取在資料目錄
+        self.waveform_bridge = WaveformBridge()
+        self.waveform_bridge.ready.connect(self.on_waveform_ready)
+        self.waveform_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dmp-waveform")
+        self.waveform_token = 0
+        self.waveform_vlc = None  # 解碼用的 libvlc instance，只在背景執行緒使用
+        try:
+            self.waveform_cache = WaveformCache()
+        except OSError as e:
+            print(f"Error opening waveform cache: {e}")
+            self.waveform_cache = None
+
+        # 封面：背景執行緒池取出並縮小，縮圖快取在資料目錄
+        self.artwork = ArtworkLoader(parent=self)
+        self.artwork.loaded.connect(self.on_artwork_loaded)
+        self.cover_path = None  # 封面區顯示中（或等待中）的歌
+
+        # 背景標籤解析（process pool）
+        self.tag_bridge = TagBridge()
+        self.tag_bridge.ready.connect(self.on_tags_ready)
+        # 解析結果可能一次湧入很多批（例如匯入大型播放清單時），先累積再於事件迴圈空檔分段套用
+        self.tag_rows = deque()
+        self.tag_timer = QTimer(self)
+        self.tag_timer.setInterval(0)
+        self.tag_timer.timeout.connect(self.apply_tags)
+        self.tag_extractor = TagExtractor(on_result=self.tag_bridge.ready.emit)
+
+        # 背景響度分析（低優先權的 process pool），結果存入音樂庫索引
+        self.loudness_bridge = LoudnessBridge()
+        self.loudness_bridge.ready.connect(self.on_loudness_ready)
+        self.loudness_analyzer = LoudnessAnalyzer(on_result=self.loudness_bridge.ready.emit)
+        self.loudness_submitted = set()  # 已送出、還沒有結果的 (path, size, mtime)
+
         # 自訂標題欄
         self.title_bar = QWidget(self)
         self.title_bar.setObjectName("title_bar")  # 設置物件名稱以應用樣式
@@ -82,7 +1211,7 @@ class MusicPlayer(QWidget):
         self.offset = QPoint()
 
         self.title_label = QLabel("Desktop Music Player", self.title_bar)
-        self.title_label.setStyleSheet("color: white; font-size: 14px;")
+        self.title_label.setObjectName("titleLabel")
         self.title_label.move(10, 5)
 
         # 關閉、最小化按鈕
@@ -122,13 +1251,20 @@ class MusicPlayer(QWidget):
         self.time_label.setContentsMargins(0, 0, 0, 0)
 
         # 進度條
-        self.progress_slider = QSlider(Qt.Horizontal)
+        self.progress_slider = WaveformSlider(Qt.Horizontal)
         self.progress_slider.setRange(0, 1000)
         self.progress_slider.sliderMoved.connect(self.set_position)
         self.progress_slider.sliderPressed.connect(self.slider_pressed)
         self.progress_slider.sliderReleased.connect(self.slider_released)
         self.progress_slider.setContentsMargins(0, 0, 0, 0)
 
+        # 目前歌曲的封面，放在歌名、時間與進度條的左邊；沒有封面時隱藏
+        self.cover_label = QLabel(self)
+        self.cover_label.setObjectName("coverLabel")
+        self.cover_label.setFixedSize(COVER_SIZE, COVER_SIZE)
+        self.cover_label.setAlignment(Qt.AlignCenter)
+        self.cover_label.hide()
+
         # 創建一個容器來包含這三個元素
         info_container = QWidget()
         info_layout = QVBoxLayout(info_container)
@@ -144,8 +1280,46 @@ class MusicPlayer(QWidget):
         self.speed_combo.setCurrentText('1.0x')
         self.speed_combo.currentTextChanged.connect(self.change_speed)
 
-        self.playlist_widget = QListWidget()
-        self.playlist_widget.itemDoubleClicked.connect(self.play_selected_song)
+        self.playlist_model = PlaylistModel(self)
+        self.song_list = self.playlist_model.songs
+        self.playlist_view = QListView()
+        self.playlist_view.setUniformItemSizes(True)  # 固定列高，大清單不必逐列量測
+        # 版面配置會對每一列呼叫 model.index()；分批進行，重設模型（例如每次搜尋輸入）時不會卡住 UI
+        self.playlist_view.setLayoutMode(QListView.Batched)
+        self.playlist_view.setBatchSize(500)
+        self.playlist_view.setModel(self.playlist_model)
+        self.playlist_view.setItemDelegate(PlaylistDelegate(self.playlist_view))
+        self.playlist_view.doubleClicked.connect(self.play_selected_song)
+
+        # 搜尋框：每次按鍵都以預先建立的索引篩選播放清單
+        self.search_box = QLineEdit()
+        self.search_box.setObjectName("searchBox")
+        self.search_box.setPlaceholderText("🔍 Search")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.playlist_model.set_filter)
+
+        # 排序方式；清單增加歌曲或標籤更新後，稍後依同樣的方式重新排序
+        self.sort_mode = "path"
+        self.sort_combo = QComboBox()
+        self.sort_combo.setObjectName("sortCombo")
+        self.sort_combo.setToolTip("Sort playlist")
+        for mode, text in zip(SORT_MODES, ("Name", "Path", "Artist", "Duration")):
+            self.sort_combo.addItem(text, mode)
+        self.sort_combo.addItem("Custom", None)  # 維持目前的順序，例如匯入的播放清單
+        self.sort_combo.setCurrentIndex(SORT_MODES.index(self.sort_mode))
+        self.sort_combo.currentIndexChanged.connect(
+            lambda i: self.set_sort_mode(self.sort_combo.itemData(i)))
+        self.sort_timer = QTimer(self)
+        self.sort_timer.setSingleShot(True)
+        self.sort_timer.setInterval(500)
+        self.sort_timer.timeout.connect(self.sort_playlist)
+
+        # 播放清單的封面縮圖（預設關閉）
+        self.thumbs_button = QPushButton("🖼")
+        self.thumbs_button.setObjectName("thumbsButton")
+        self.thumbs_button.setToolTip("Show cover thumbnails")
+        self.thumbs_button.setCheckable(True)
+        self.thumbs_button.clicked.connect(self.set_thumbnails)
 
         self.toggle_playlist_button = QPushButton("▲ Files")
         self.toggle_playlist_button.setCheckable(True)
@@ -156,89 +1330,60 @@ class MusicPlayer(QWidget):
         self.play_button = QPushButton("▶️")  # 播放圖示
         self.play_button.setFixedSize(35, 35)  # 調整為與其他按鈕相同大小
         self.play_button.setObjectName("playButton")  # 添加物件名稱
-        self.play_button.setStyleSheet("""
-            QPushButton#playButton {
-                font-size: 20px;
-                border-radius: 17px;
-                background: transparent;
-                border: none;
-                padding: 0px;
-                text-align: center;
-            }
-            QPushButton#playButton:hover {
-                background: rgba(255, 255, 255, 30);
-                border-radius: 17px;
-            }
-        """)
         self.play_button.clicked.connect(self.toggle_play)
 
         self.prev_button = QPushButton("◀◀")  # 上一首圖示
         self.prev_button.setFixedSize(35, 35)
         self.prev_button.setObjectName("prevButton")  # 添加物件名稱
-        self.prev_button.setStyleSheet("""
-            QPushButton#prevButton {
-                font-size: 18px;
-                border-radius: 17px;
-                background: transparent;
-                border: none;
-            }
-            QPushButton#prevButton:hover {
-                background: rgba(255, 255, 255, 30);
-                border-radius: 17px;
-            }
-        """)
         self.prev_button.clicked.connect(self.play_previous)
 
         self.next_button = QPushButton("▶▶")  # 下一首圖示
         self.next_button.setFixedSize(35, 35)
         self.next_button.setObjectName("nextButton")  # 添加物件名稱
-        self.next_button.setStyleSheet("""
-            QPushButton#nextButton {
-                font-size: 18px;
-                border-radius: 17px;
-                background: transparent;
-                border: none;
-            }
-            QPushButton#nextButton:hover {
-                background: rgba(255, 255, 255, 30);
-                border-radius: 17px;
-            }
-        """)
         self.next_button.clicked.connect(self.play_next)
 
         self.repeat_button = QPushButton("↻")  # 重播圖示
         self.repeat_button.setObjectName("repeatButton")
         self.repeat_button.setCheckable(True)
         self.repeat_button.setFixedSize(35, 35)
-        self.repeat_button.setStyleSheet("""
-            QPushButton {
-                font-size: 18px;
-                border-radius: 17px;
-            }
-        """)
         self.repeat_button.clicked.connect(self.toggle_repeat)
 
         self.shuffle_button = QPushButton("⇄")  # 隨機播放圖示
         self.shuffle_button.setObjectName("shuffleButton")
         self.shuffle_button.setCheckable(True)
         self.shuffle_button.setFixedSize(35, 35)
-        self.shuffle_button.setStyleSheet("""
-            QPushButton {
-                font-size: 18px;
-                border-radius: 17px;
-            }
-        """)
         self.shuffle_button.clicked.connect(self.toggle_shuffle)
 
+        self.gapless_button = QPushButton("⇥")  # 無縫播放圖示
+        self.gapless_button.setObjectName("gaplessButton")
+        self.gapless_button.setToolTip("Gapless playback")
+        self.gapless_button.setCheckable(True)
+        self.gapless_button.setChecked(self.gapless)
+        self.gapless_button.setFixedSize(35, 35)
+        self.gapless_button.clicked.connect(self.toggle_gapless)
+
+        self.normalize_button = QPushButton("⚖")  # 音量標準化圖示
+        self.normalize_button.setObjectName("normalizeButton")
+        self.normalize_button.setToolTip("Normalize loudness")
+        self.normalize_button.setCheckable(True)
+        self.normalize_button.setChecked(self.normalize)
+        self.normalize_button.setFixedSize(35, 35)
+        self.normalize_button.clicked.connect(self.toggle_normalize)
+
         self.add_folder_button = QPushButton("📁 Add Folder")
         self.add_folder_button.clicked.connect(self.add_folder)
 
+        # 播放清單檔的匯入與匯出
+        self.open_playlist_button = QPushButton("📂 Open Playlist")
+        self.open_playlist_button.clicked.connect(self.open_playlist)
+        self.save_playlist_button = QPushButton("💾 Save Playlist")
+        self.save_playlist_button.clicked.connect(self.save_playlist)
+
         self.volume_slider = QSlider(Qt.Horizontal)
         self.volume_slider.setRange(0, 100)
         self.volume_slider.setValue(50)
         self.volume_slider.setToolTip("Volume")
         self.volume_slider.valueChanged.connect(self.set_volume)
-        self.player.audio_set_volume(50)
 
         # 音量控制容器
         volume_container = QWidget()
@@ -247,7 +1392,7 @@ class MusicPlayer(QWidget):
         volume_layout.setSpacing(10)
         
         volume_label = QLabel("🔊")
-        volume_label.setStyleSheet("font-size: 16px;")
+        volume_label.setObjectName("volumeLabel")
         volume_layout.addWidget(volume_label)
         volume_layout.addWidget(self.volume_slider)
 
@@ -258,160 +1403,841 @@ class MusicPlayer(QWidget):
         controls.addWidget(self.next_button)
         controls.addWidget(self.repeat_button)
         controls.addWidget(self.shuffle_button)
+        controls.addWidget(self.gapless_button)
+        controls.addWidget(self.normalize_button)
         controls.addWidget(self.speed_combo)
         controls.addWidget(self.theme_button)  # 添加主題切換按鈕
 
         layout = QVBoxLayout()
         layout.addWidget(self.title_bar)
-        layout.addWidget(info_container)  # 使用新的容器
+        info_row = QHBoxLayout()
+        info_row.addWidget(self.cover_label)
+        info_row.addWidget(info_container)
+        layout.addLayout(info_row)
         layout.addLayout(controls)
         layout.addWidget(volume_container)  # 移動音量控制到這裡
-        layout.addWidget(self.add_folder_button)
+        files_row = QHBoxLayout()
+        files_row.addWidget(self.add_folder_button)
+        files_row.addWidget(self.open_playlist_button)
+        files_row.addWidget(self.save_playlist_button)
+        layout.addLayout(files_row)
         layout.addWidget(self.toggle_playlist_button)
-        layout.addWidget(self.playlist_widget)
+        search_row = QHBoxLayout()
+        search_row.addWidget(self.search_box)
+        search_row.addWidget(self.sort_combo)
+        search_row.addWidget(self.thumbs_button)
+        layout.addLayout(search_row)
+        layout.addWidget(self.playlist_view)
 
         self.setLayout(layout)
 
-        # 自動更新進度條的 timer
-        self.timer = QTimer()
-        self.timer.setInterval(1000)
-        self.timer.timeout.connect(self.update_ui)
-        self.timer.start()
+        # 設置初始主題（直接套用上次的主題）
+        self.apply_theme(self.current_theme)
 
-    def update_ui(self):
-        
-        # 檢查歌曲是否播放完畢
-        if not self.player.is_playing() and not self.is_sliding:
-            state = self.player.get_state()
-            if state == vlc.State.Ended:
-                self.play_next()
+        # 換歌與進度更新由 VLC 事件驅動，不再輪詢播放狀態
+        self.transition_budget_ms = 50
+        self.transition_times = deque(maxlen=100)  # 最近幾次換歌的延遲 (ms)
+        self._transition_start = None
+        self.player_bridge = PlayerBridge()
+        self.player_bridge.ended.connect(self.on_song_end)
+        self.player_bridge.playing.connect(self.on_playing)
+        self.player_bridge.paused.connect(self.on_paused)
+        self.progress = ProgressScheduler(self.update_ui, self.player_time, self)
+        # 拖曳進度條時的 seek 合併
+        self.seeker = SeekScheduler(self.seek_to, self)
+
+        if metrics.enabled:
+            self.start_metrics()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        # 視窗第一次畫出來之後才做其餘的啟動工作
+        if not self.started:
+            self.started = True
+            QTimer.singleShot(0, self.finish_startup)
+
+    @timed("startup.finish")
+    def finish_startup(self):
+        self.load_icon()
+        self.restore_session()
+        self.ready = True
+        pending, self.pending_open = self.pending_open, []
+        for files, folders in pending:
+            self.open_paths(files, folders)
+
+    def load_icon(self):
+        # 圖示檔約 1 MB，解碼不放在視窗出現之前
+        logo_path = os.path.join(os.path.dirname(__file__), "dmp_logo.png")
+        self.setWindowIcon(QIcon(logo_path))
+
+    def restore_session(self):
+        # 從索引載入清單，並還原上次的歌、位置、音量與各開關；不建立 libvlc
+        session = self.session
+        self.repeat = bool(session.get("repeat", self.repeat))
+        self.shuffle = bool(session.get("shuffle", self.shuffle))
+        self.gapless = bool(session.get("gapless", self.gapless))
+        self.normalize = bool(session.get("normalize", self.normalize))
+        self.repeat_button.setChecked(self.repeat)
+        self.shuffle_button.setChecked(self.shuffle)
+        self.gapless_button.setChecked(self.gapless)
+        self.normalize_button.setChecked(self.normalize)
+        if isinstance(session.get("volume"), int):
+            self.volume_slider.setValue(session["volume"])
+        if session.get("speed") in (0.5, 0.75, 1.0, 1.25, 1.5, 2.0):
+            self.speed_combo.setCurrentText(f"{session['speed']}x")
+        if session.get("sort") in SORT_MODES:
+            self.sort_mode = session["sort"]
+            self.sort_combo.blockSignals(True)
+            self.sort_combo.setCurrentIndex(SORT_MODES.index(self.sort_mode))
+            self.sort_combo.blockSignals(False)
+        if session.get("thumbnails"):
+            self.set_thumbnails(True)
+        self.load_library()
+        tid = self.playlist_model.store.lookup(session.get("path") or "")
+        row = self.playlist_model.row_of(tid) if tid >= 0 else -1
+        if row < 0:
             return
+        self.current_index = row
+        position, length = session.get("position_ms") or 0, session.get("length_ms") or 0
+        song_name = self.playlist_model.title(row)
+        self.label.setText(song_name)
+        self.setWindowTitle(f"Desktop Music Player - {song_name}")
+        self.playlist_model.set_current(row)
+        self.show_cover(self.playlist_model.path(row))
+        self.progress.set_length(length)
+        self.progress.sync(position)
+        self.progress.last_position = position
+        self.update_ui(position)
+        self.resume = (tid, position)
+
+    def save_session(self):
+        index = self.current_index
+        current = 0 <= index < len(self.song_list)
+        position = self.progress.position() if current else 0
+        if current and self.resume is not None and self.resume[0] == self.song_list[index]:
+            position = self.resume[1]
+        save_session({
+            "path": self.playlist_model.path(index) if current else None,
+            "position_ms": position,
+            "length_ms": self.progress.length if current else 0,
+            "volume": self.volume_slider.value(),
+            "speed": self.current_speed,
+            "repeat": self.repeat, "shuffle": self.shuffle,
+            "gapless": self.gapless, "normalize": self.normalize,
+            "theme": self.current_theme,
+            "sort": self.sort_mode,
+            "thumbnails": self.thumbs_button.isChecked(),
+        })
+
+    @timed("vlc.init")
+    def ensure_player(self):
+        # 第一次播放時才載入 libvlc、建立播放器並接上事件
+        if self.player is not None:
+            return
+        load_vlc()
+        self.vlc_instance = vlc.Instance(VLC_ARGS)
+        self.player = self.vlc_instance.media_player_new()
+        metrics.wrap(self.player, "set_media", "vlc.set_media")
+        metrics.wrap(self.player, "play", "vlc.play")
+        self.player.audio_set_volume(self.volume_slider.value())
+        events = self.player.event_manager()
+        events.event_attach(vlc.EventType.MediaPlayerEndReached, self._vlc_end_reached)
+        events.event_attach(vlc.EventType.MediaPlayerTimeChanged, self._vlc_time_changed)
+        events.event_attach(vlc.EventType.MediaPlayerLengthChanged, self._vlc_length_changed)
+        events.event_attach(vlc.EventType.MediaPlayerPlaying, self._vlc_playing)
+        events.event_attach(vlc.EventType.MediaPlayerPaused, self._vlc_paused)
+        events.event_attach(vlc.EventType.MediaPlayerStopped, self._vlc_paused)
+
+    def is_playing(self):
+        return self.player is not None and bool(self.player.is_playing())
+
+    def player_time(self):
+        return self.player.get_time() if self.player is not None else -1
+
+    def start_metrics(self):
+        # 事件迴圈卡頓偵測，並定期把統計寫入 metrics.jsonl
+        self.watchdog = StallWatchdog(metrics)
+        self.watchdog_timer = QTimer(self)
+        self.watchdog_timer.setInterval(int(self.watchdog.interval * 1000))
+        self.watchdog_timer.timeout.connect(self.watchdog.beat)
+        self.watchdog_timer.start()
+        self.watchdog.start()
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(10000)
+        self.metrics_timer.timeout.connect(metrics.flush)
+        self.metrics_timer.start()
+
+    # 以下方法在 libvlc 的事件執行緒中執行，只負責轉送
+    def _vlc_end_reached(self, event):
+        self._transition_start = time.perf_counter()
+        self.player_bridge.ended.emit()
+
+    def _vlc_time_changed(self, event):
+        # 只更新內插基準點，不喚醒 Qt 主執行緒（seek 生效時才會送出訊號）
+        self.progress.sync(event.u.new_time)
+        self.seeker.observe(event.u.new_time)
+
+    def _vlc_length_changed(self, event):
+        self.progress.set_length(event.u.new_length)
 
+    def _vlc_playing(self, event):
+        self.player_bridge.playing.emit()
+
+    def _vlc_paused(self, event):
+        self.player_bridge.paused.emit()
+
+    def measure_transition(self):
+        # 記錄上一首結束到下一首開始播放的時間
+        if self._transition_start is None:
+            return
+        elapsed = (time.perf_counter() - self._transition_start) * 1000
+        self._transition_start = None
+        self.transition_times.append(elapsed)
+        if metrics.enabled:
+            metrics.record("transition", elapsed / 1000)
+        if elapsed > self.transition_budget_ms:
+            print(f"Slow track transition: {elapsed:.1f} ms")
+
+    def measure_first_audio(self):
+        # load_and_play 到 VLC 開始播放的時間，依是否命中預讀分開統計
+        if self._load_start is None:
+            return
+        started, prefetched = self._load_start
+        self._load_start = None
+        elapsed = time.perf_counter() - started
+        self.first_audio_times[prefetched].append(elapsed * 1000)
+        if metrics.enabled:
+            metrics.record("first_audio.prefetched" if prefetched else "first_audio.cold", elapsed)
+
+    def on_playing(self):
+        self.measure_transition()
+        self.measure_first_audio()
+        if self.progress.length <= 0:
+            self.progress.set_length(self.player.get_length())
+        self.progress.set_pixels(min(self.progress_slider.width(), 1000))
+        self.progress.set_playing(True)
+        # 目前這首開始播放後，趁空檔準備下一首
+        self.prepare_next()
+
+    def on_paused(self):
+        self.progress.set_playing(False)
+
+    @timed("update_ui")
+    def update_ui(self, current_ms):
+        if self.is_sliding:
+            return
         try:
             # 更新進度條
-            length = self.player.get_length()
-            if length > 0:
-                time = self.player.get_time()
-            if time >= 0:
-                current_position = int(time * 1000 / length)
+            length = self.progress.length
+            if length > 0 and current_ms >= 0:
+                current_position = int(current_ms * 1000 / length)
                 self.progress_slider.setValue(current_position)
                 # 更新時間顯示
-                current_time = self.format_time(time)
+                current_time = self.format_time(current_ms)
                 total_time = self.format_time(length)
                 self.time_label.setText(f"{current_time} / {total_time}")
         except Exception as e:
             print(f"Error updating UI: {e}")
-    
+            metrics.count("error.update_ui")
+
     def format_time(self, ms):
         seconds = int(ms / 1000)
         minutes = int(seconds / 60)
         seconds = int(seconds % 60)
         return f"{minutes:02d}:{seconds:02d}"
     
+    @timed("seek.move")
     def set_position(self, position):
-        if not self.player.is_playing() or not self.is_sliding:
+        if not self.is_playing() or not self.is_sliding:
             return
         try:
-            length = self.player.get_length()
+            length = self.progress.length or self.player.get_length()
             if length > 0:
-                # 計算新的播放位置
-                new_time = int(position * length / 1000)
-                # 設置新的播放位置
-                self.player.set_time(new_time)
+                # 拖曳中的位置交給 seek 排程合併，不直接呼叫 set_time
+                self.seeker.request(int(position * length / 1000))
         except Exception as e:
             print(f"Error setting position: {e}")
+            metrics.count("error.seek")
+
+    def seek_to(self, media_ms):
+        if self.player is None:
+            return
+        self.player.set_time(media_ms)
+        self.progress.sync(media_ms)
 
     def slider_pressed(self):
         self.is_sliding = True
-        self.timer.stop()
 
+    @timed("seek.release")
     def slider_released(self):
         self.is_sliding = False
-        self.timer.start()
-        # 在釋放時重新設置位置
+        # 在釋放時精確地跳到最後的位置，取代尚未送出的目標
         try:
             position = self.progress_slider.value()
-            length = self.player.get_length()
+            length = self.progress.length or (self.player.get_length() if self.player else 0)
             if length > 0:
                 new_time = int(position * length / 1000)
-                self.player.set_time(new_time)
+                if self.player is None:
+                    # 還沒開始播放：只更新還原的位置，播放時從這裡開始
+                    if self.resume is not None:
+                        self.resume = (self.resume[0], new_time)
+                    self.progress.sync(new_time)
+                    self.update_ui(new_time)
+                else:
+                    self.seeker.commit(new_time)
+                self.progress.last_position = new_time
         except Exception as e:
             print(f"Error setting final position: {e}")
+            metrics.count("error.seek")
 
     def change_speed(self, speed_text):
         speed = float(speed_text.replace('x', ''))
-        self.player.set_rate(speed)
+        if self.player is not None:
+            self.player.set_rate(speed)
         self.current_speed = speed
+        self.progress.set_rate(speed)
 
     def add_folder(self):
+        # 掃描進行中時，按鈕改為取消掃描
+        if self.scanner is not None and self.scanner.running and not self.scan_quiet:
+            self.scanner.cancel()
+            return
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
         if folder:
-            self.song_list = [os.path.join(folder, f) for f in os.listdir(folder)
-                              if f.endswith(('.mp3', '.wav', '.flac'))]
-            self.playlist_widget.clear()
-            for song in self.song_list:
-                self.playlist_widget.addItem(os.path.basename(song))
-            if self.song_list:
-                self.current_index = 0
-                self.load_and_play(self.current_index)
+            self.add_root(folder)
+
+    def add_root(self, folder):
+        # 把資料夾合併進目前的音樂庫：清單與播放狀態不變，只掃描新加入的資料夾
+        folder = os.path.normpath(folder)
+        if not self.library.add_root(folder):
+            return
+        roots = self.library.roots()
+        self.watcher.add_root(folder)
+        # 還在掃描其他資料夾時一起重新掃描（沒變動的目錄會略過），不會因為取消而漏掉
+        scanning = self.scanner is not None and self.scanner.running
+        self.start_scan(roots if scanning else [folder], autoplay=self.current_index == -1)
+
+    def load_library(self):
+        # 啟動時直接從索引載入清單；確認有沒有變動的背景掃描稍後才開始，
+        # 不和啟動搶 I/O（這段期間的變動由資料夾監看處理）
+        self.set_songs(self.library.load())
+        self.tag_extractor.submit(self.library.untagged())
+        self.analyze_loudness(self.library.unanalyzed())
+        roots = self.library.roots()
+        self.watcher.set_roots(roots)
+        self.watcher.watch(self.library.dirs())
+        if roots:
+            self.verify_timer.start()
+
+    def verify_library(self):
+        # 使用者已換了資料夾或已有掃描在進行時不必再掃
+        roots = self.library.roots()
+        if self.scanner is None and roots:
+            self.start_scan(roots, autoplay=False)
+
+    def load_folder(self, folder):
+        folder = os.path.normpath(folder)
+        self.verify_timer.stop()
+        self.cancel_scan()
+        self.library.set_roots([folder])
+        self.watcher.set_roots([folder])
+        self.watcher.watch(self.library.dirs())
+        self.changed_dirs.clear()
+        self.set_songs(self.library.load())
+        self.tag_extractor.submit(self.library.untagged())
+        self.analyze_loudness(self.library.unanalyzed())
+        self.current_index = -1
+        if self.song_list:
+            self.current_index = 0
+            self.load_and_play(self.current_index)
+        self.start_scan([folder], autoplay=True)
+
+    def set_songs(self, rows):
+        # 整個清單換掉時 track id 從 0 重新編號：預先準備的下一首、隨機模式抽好的位置
+        # 與還原的播放位置都指向舊清單的歌
+        self.discard_prepared()
+        self.shuffle_queue.clear()
+        self.resume = None
+        self.playlist_model.set_songs(rows)
+        self.song_list = self.playlist_model.songs
+        # 索引依路徑載入，其他排序方式要重新排列
+        if self.sort_mode not in (None, "path"):
+            self.playlist_model.sort_by(self.sort_mode)
+
+    def set_sort_mode(self, mode):
+        self.sort_mode = mode
+        self.sort_playlist()
+        # 排序後把目前的歌捲到畫面中
+        view_row = self.playlist_model.view_row(self.current_index)
+        if view_row >= 0:
+            self.playlist_view.scrollTo(self.playlist_model.index(view_row))
+
+    @timed("sort")
+    def sort_playlist(self):
+        # current_index 依 track id 找回新的位置；隨機模式預先抽好的位置與預先準備的下一首隨之失效
+        self.sort_timer.stop()
+        if self.sort_mode is None:
+            return
+        index = self.current_index
+        current = self.song_list[index] if 0 <= index < len(self.song_list) else None
+        self.playlist_model.sort_by(self.sort_mode)
+        if current is not None:
+            self.current_index = self.playlist_model.row_of(current)
+        self.shuffle_queue.clear()
+        self.prepare_next()
+
+    def open_playlist(self):
+        # 讀取進行中時，按鈕改為取消讀取
+        if self.playlist_reader is not None:
+            self.cancel_playlist()
+            self.open_playlist_button.setText("📂 Open Playlist")
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Open Playlist", "", "Playlists (*.m3u *.m3u8 *.pls);;All files (*)")
+        if path:
+            self.load_playlist(path)
+
+    def load_playlist(self, path):
+        # 以清單檔取代目前的播放清單，保持檔案中的順序（排序方式改為 Custom）；
+        # 清單檔在背景讀取，讀到的歌分批加入，第一批到達時開始播放
+        self.cancel_playlist()
+        self.sort_timer.stop()
+        self.sort_mode = None
+        self.sort_combo.blockSignals(True)
+        self.sort_combo.setCurrentIndex(self.sort_combo.findData(None))
+        self.sort_combo.blockSignals(False)
+        self.set_songs([])
+        self.current_index = -1
+        self.open_playlist_button.setText("✖ Cancel Import")
+        self.import_read = False
+        bridge = PlaylistBridge()
+        bridge.batch.connect(self.on_playlist_batch)
+        bridge.finished.connect(self.on_playlist_finished)
+        self.playlist_bridge = bridge
+        self.playlist_reader = PlaylistReader(path, on_batch=bridge.batch.emit, on_finished=bridge.finished.emit)
+        self.playlist_reader.start()
+
+    def cancel_playlist(self):
+        self.import_timer.stop()
+        self.import_rows.clear()
+        if self.playlist_reader is not None:
+            self.playlist_reader.cancel()
+            self.playlist_reader = None
+            # 讀取執行緒送出 finished 之前 bridge 都要保留
+            self.retired_bridges.add(self.playlist_bridge)
+        self.playlist_bridge = None
+
+    def on_playlist_batch(self, rows):
+        if self.sender() is not self.playlist_bridge:
+            return
+        # 讀得比清單加入得快時批次會堆積在佇列中；這裡只記下，實際加入由 import_some 分段進行
+        self.import_rows.extend(rows)
+        self.import_timer.start()
+
+    def import_some(self):
+        count = min(self.IMPORT_CHUNK, len(self.import_rows))
+        rows = [self.import_rows.popleft() for _ in range(count)]
+        if not self.import_rows:
+            self.import_timer.stop()
+            if self.import_read:
+                self.finish_import()
+        if not rows:
+            return
+        # 索引中解析過的歌直接使用快取的標籤，其餘的才交給背景解析；響度分析同樣只做還沒有有效結果的歌
+        cached = self.library.cached_tags(rows)
+        blank = (None,) * 5
+        self.playlist_model.append([row + cached.get(row[0], blank) for row in rows])
+        self.tag_extractor.submit([row for row in rows if row[0] not in cached])
+        analyzed = self.library.cached_loudness(rows)
+        self.analyze_loudness([row for row in rows if row[0] not in analyzed])
+        if self.playlist_reader is not None:
+            self.open_playlist_button.setText(f"✖ Cancel Import ({len(self.song_list)} tracks)")
+        if self.current_index == -1 and self.song_list:
+            self.current_index = 0
+            self.load_and_play(self.current_index)
+        else:
+            self.prepare_next()
+
+    def on_playlist_finished(self, cancelled):
+        if self.sender() is not self.playlist_bridge:
+            self.retired_bridges.discard(self.sender())
+            return
+        self.import_read = True
+        if not self.import_rows:
+            self.finish_import()
 
+    def finish_import(self):
+        reader = self.playlist_reader
+        if reader.error is not None:
+            print(f"Error reading playlist: {reader.error}")
+        self.open_playlist_button.setToolTip(
+            f"Last import: {reader.found} tracks, {reader.missing} not found")
+        self.playlist_reader = None
+        self.playlist_bridge = None
+        self.open_playlist_button.setText("📂 Open Playlist")
+
+    def save_playlist(self):
+        path, selected = QFileDialog.getSaveFileName(
+            self, "Save Playlist", "playlist.m3u8", "M3U8 (*.m3u8);;M3U (*.m3u);;PLS (*.pls)")
+        if not path:
+            return
+        if not path.lower().endswith(PLAYLIST_EXTENSIONS):
+            ext = re.search(r"\*(\.\w+)", selected)
+            path += ext.group(1) if ext else ".m3u8"
+        self.export_playlist(path)
+
+    @timed("playlist.save")
+    def export_playlist(self, path):
+        # 依目前的播放順序寫出整個清單（不受搜尋篩選影響）
+        model = self.playlist_model
+        store = model.store
+        try:
+            return write_playlist(path, ((store.path(tid), store.duration(tid), model.display_name(tid))
+                                         for tid in self.song_list))
+        except OSError as e:
+            print(f"Error saving playlist: {e}")
+            QMessageBox.critical(self, "Error", f"Failed to save the playlist: {e}")
+            return 0
+
+    def remove_songs(self, paths):
+        gone = self.playlist_model.tracks_for(paths)
+        rows = [row for row, tid in enumerate(self.song_list) if tid in gone]
+        if self.current_index >= 0:
+            # 目前播放的歌被移除時，讓「下一首」接續原本的位置
+            self.current_index -= sum(1 for r in rows if r <= self.current_index)
+        self.playlist_model.remove_rows(rows)
+
+    def start_scan(self, roots, autoplay, known_dirs=None, quiet=False, forced=()):
+        self.cancel_scan()
+        self.scan_autoplay = autoplay
+        self.scan_quiet = quiet
+        self.scan_forced = list(forced)
+        self.scan_started = time.perf_counter()
+        if not quiet:
+            self.add_folder_button.setText("✖ Cancel Scan")
+        # 每次掃描使用新的 bridge，舊掃描殘留在佇列中的訊號會被忽略
+        bridge = ScanBridge()
+        bridge.batch.connect(self.on_scan_batch)
+        bridge.progress.connect(self.on_scan_progress)
+        bridge.finished.connect(self.on_scan_finished)
+        self.scan_bridge = bridge
+        self.scanner = FolderScanner(
+            roots,
+            on_batch=bridge.batch.emit,
+            on_progress=bridge.progress.emit,
+            on_finished=bridge.finished.emit,
+            known_dirs=self.library.known_dirs() if known_dirs is None else known_dirs,
+        )
+        self.scanner.start()
+
+    def cancel_scan(self):
+        if self.scanner is not None:
+            # 被取消的重新掃描：強制重新列出的目錄放回待處理，下次掃描結束後再檢查
+            # （只改了檔案內容時目錄的 mtime 不變，一般掃描不會重新列出它們）
+            self.changed_dirs.update(self.scan_forced)
+            self.scanner.cancel()
+            self.scanner = None
+            # 掃描執行緒可能還在送出訊號，bridge 要保留到它送出 finished 為止
+            self.retired_bridges.add(self.scan_bridge)
+        self.scan_bridge = None
+
+    def on_scan_batch(self, scanned):
+        if self.sender() is not self.scan_bridge:
+            return
+        added, changed, removed = self.library.apply_scan(scanned)
+        self.watcher.watch(d.path for d in scanned)
+        # 內容變動的歌重新取出封面；重新列出的目錄可能換了資料夾封面
+        self.artwork.forget([row[0] for row in changed] + removed, [d.path for d in scanned])
+        if removed:
+            self.remove_songs(removed)
+        self.playlist_model.append(added)
+        self.tag_extractor.submit([row[:3] for row in added] + changed)
+        self.analyze_loudness([row[:3] for row in added] + changed)
+        if added:
+            self.sort_timer.start()
+        if removed or added:
+            # 清單變動可能改變下一首，重新準備（沒變時 prepare_next 不做事）
+            self.prepare_next()
+        # 第一批到達時立即開始播放，不必等待掃描完成
+        if self.scan_autoplay and self.current_index == -1 and self.song_list:
+            self.current_index = 0
+            self.load_and_play(self.current_index)
+
+    def on_tags_ready(self, rows):
+        self.tag_rows.extend(rows)
+        self.tag_timer.start()
+
+    def apply_tags(self):
+        rows = [self.tag_rows.popleft() for _ in range(min(self.TAG_CHUNK, len(self.tag_rows)))]
+        if not self.tag_rows:
+            self.tag_timer.stop()
+        if not rows:
+            return
+        self.library.store_tags(rows)
+        self.playlist_model.update_tags(rows)
+        if self.sort_mode in TAG_MODES:
+            self.sort_timer.start()
+        if 0 <= self.current_index < len(self.song_list):
+            self.label.setText(self.playlist_model.title(self.current_index))
+
+    def analyze_loudness(self, items):
+        # 已經在排隊或分析中的歌不重複送出（例如反覆切換標準化時）
+        if not self.normalize:
+            return
+        items = [tuple(item[:3]) for item in items]
+        items = [item for item in items if item not in self.loudness_submitted]
+        self.loudness_submitted.update(items)
+        self.loudness_analyzer.submit(items)
+
+    def on_loudness_ready(self, rows):
+        self.loudness_submitted.difference_update(row[:3] for row in rows)
+        self.library.store_loudness(rows)
+        if metrics.enabled:
+            metrics.count("loudness.files", len(rows))
+        # 正在播放的歌剛分析完時立即套用
+        if 0 <= self.current_index < len(self.song_list):
+            path = self.playlist_model.path(self.current_index)
+            if any(row[0] == path for row in rows):
+                self.apply_gain(path)
+
+    def apply_gain(self, path):
+        # 以等化器的 preamp 套用增益，不影響音量滑桿的數值；
+        # 沒有開啟標準化、也從未套用過增益時不建立等化器
+        gain = 0.0
+        if self.normalize:
+            row = self.library.loudness(path)
+            if row is not None:
+                gain = track_gain(*row)
+        if self.player is None:
+            return
+        if self.equalizer is None:
+            if not gain:
+                return
+            self.equalizer = vlc.AudioEqualizer()
+        self.equalizer.set_preamp(gain)
+        self.player.set_equalizer(self.equalizer)
+
+    def on_scan_progress(self, dirs_done, dirs_found, files_found):
+        if self.sender() is not self.scan_bridge or self.scan_quiet:
+            return
+        self.add_folder_button.setText(
+            f"✖ Cancel Scan ({files_found} files, {dirs_done}/{dirs_found} folders)")
+
+    def on_scan_finished(self, cancelled):
+        if self.sender() is not self.scan_bridge:
+            self.retired_bridges.discard(self.sender())
+            return
+        if metrics.enabled:
+            metrics.record("scan.quiet" if self.scan_quiet else "scan", time.perf_counter() - self.scan_started)
+            metrics.count("scan.files", self.scanner.files_found)
+            metrics.count("scan.dirs_listed", self.scanner.dirs_done - self.scanner.dirs_skipped)
+        self.scanner = None
+        self.scan_bridge = None
+        self.scan_forced = []
+        self.add_folder_button.setText("📁 Add Folder")
+        if self.changed_dirs:
+            dirs, self.changed_dirs = self.changed_dirs, set()
+            self.rescan_folders(dirs)
+
+    def on_folders_changed(self, dirs):
+        if self.scanner is not None and self.scanner.running:
+            self.changed_dirs.update(dirs)
+            return
+        self.rescan_folders(dirs)
+
+    def rescan_folders(self, dirs):
+        # 只重新列出有變動的目錄，新出現的子目錄會一併掃描；
+        # 差異照一般掃描的流程套用，不影響正在播放的歌
+        dirs = sorted(set(dirs))
+        roots = []
+        for d in dirs:
+            if not roots or not d.startswith(os.path.join(roots[-1], "")):
+                roots.append(d)
+        known = self.library.known_dirs()
+        for d in dirs:
+            # 檔案內容變動不會更新目錄的 mtime，強制重新列出
+            known.pop(d, None)
+        self.start_scan(roots, autoplay=False, known_dirs=known, quiet=True, forced=dirs)
+
+    @timed("load_and_play")
     def load_and_play(self, index):
         if not self.song_list or not (0 <= index < len(self.song_list)):
             return
         try:
-            self.player.set_media(vlc.Media(self.song_list[index]))
-            song_name = os.path.basename(self.song_list[index])
+            self.progress.reset()
+            self.seeker.cancel()
+            path = self.playlist_model.path(index)
+            # 開啟目前這首時暫停預讀，不和它搶 I/O；開始播放後再預讀接下來的歌
+            prefetched = self.prefetcher.claim(path)
+            self.prefetcher.pause()
+            if metrics.enabled:
+                metrics.count("prefetch.hit" if prefetched else "prefetch.miss")
+            self._load_start = (time.perf_counter(), prefetched)
+            self.ensure_player()
+            media = self.take_prepared(index)
+            if self.resume is not None and self.resume[0] == self.song_list[index] and self.resume[1] > 0:
+                # 還原上次關閉時的位置
+                media.add_option(f"start-time={self.resume[1] / 1000:.3f}")
+            self.resume = None
+            self.player.set_media(media)
+            self.load_waveform(path)
+            self.show_cover(path)
+            song_name = self.playlist_model.title(index)
             self.label.setText(song_name)
             # 更新視窗標題
             self.setWindowTitle(f"Desktop Music Player - {song_name}")
+            self.apply_gain(path)
             self.player.play()
             self.play_button.setText("⏸")  # 顯示暫停圖示
             
             # 更新播放列表中的當前歌曲高亮
-            for i in range(self.playlist_widget.count()):
-                item = self.playlist_widget.item(i)
-                if i == index:
-                    item.setBackground(Qt.black)
-                else:
-                    item.setBackground(Qt.transparent)
+            self.playlist_model.set_current(index)
             
             # 設置播放速度
             self.player.set_rate(self.current_speed)
+            self.save_session()
         except Exception as e:
             print(f"Error loading song: {e}")
+            metrics.count("error.load_and_play")
             self.label.setText("Error loading song")
             self.setWindowTitle("Desktop Music Player")  # 發生錯誤時恢復預設標題
 
+    def load_waveform(self, path):
+        # 換歌時丟棄舊的請求；還在計算中的舊歌會在下一次檢查時中止
+        self.waveform_token += 1
+        self.progress_slider.set_peaks(None)
+        if self.waveform_cache is not None:
+            self.waveform_pool.submit(self._compute_waveform, self.waveform_token, path)
+
+    def _compute_waveform(self, token, path):
+        # 在背景執行緒執行
+        def cancelled():
+            return token != self.waveform_token
+
+        if cancelled():
+            return
+        try:
+            if self.waveform_vlc is None and not path.lower().endswith(".wav"):
+                self.waveform_vlc = load_vlc().Instance(["--quiet", "--no-video"])
+            peaks, _ = track_peaks(path, self.waveform_cache, cancelled, self.waveform_vlc)
+        except Exception as e:
+            print(f"Error computing waveform: {e}")
+            return
+        if peaks is not None:
+            self.waveform_bridge.ready.emit(token, peaks)
+
+    def on_waveform_ready(self, token, peaks):
+        if token == self.waveform_token:
+            self.progress_slider.set_peaks(peaks)
+
+    def show_cover(self, path):
+        # 封面還沒載入時先隱藏，載入完成後由 on_artwork_loaded 再呼叫一次
+        self.cover_path = path
+        image = self.artwork.image(path, COVER_SIZE) if path else None
+        if image is None:
+            self.cover_label.hide()
+            self.cover_label.clear()
+            return
+        self.cover_label.setPixmap(QPixmap.fromImage(image))
+        self.cover_label.show()
+
+    def on_artwork_loaded(self, path, size):
+        if size == COVER_SIZE and path == self.cover_path:
+            self.show_cover(path)
+        elif size == THUMB_SIZE and self.playlist_model.artwork is not None:
+            # 多個縮圖同時完成時 Qt 會合併成一次重繪，只重畫看得到的列
+            self.playlist_view.viewport().update()
+
+    def set_thumbnails(self, enabled):
+        self.thumbs_button.setChecked(enabled)
+        self.playlist_model.set_artwork(self.artwork if enabled else None)
+        self.playlist_view.setIconSize(QSize(THUMB_SIZE, THUMB_SIZE) if enabled else QSize())
+        # 固定列高時 view 只量測一次列高，開關縮圖後要重新配置
+        self.playlist_view.doItemsLayout()
+
     def toggle_play(self):
         if not self.song_list:  # 如果播放列表為空
             return
-        if self.player.is_playing():
+        if self.player is None:
+            # 啟動後第一次播放：從還原的歌與位置開始
+            self.current_index = max(self.current_index, 0)
+            self.load_and_play(self.current_index)
+        elif self.player.is_playing():
             self.player.pause()
             self.play_button.setText("▶️")  # 顯示播放圖示
         else:
             self.player.play()
             self.play_button.setText("⏸️")  # 顯示暫停圖示
 
-    def play_selected_song(self, item):
-        self.current_index = self.playlist_widget.row(item)
+    def play_selected_song(self, index):
+        self.current_index = self.playlist_model.song_row(index.row())
         self.load_and_play(self.current_index)
 
     def play_next(self):
         if not self.song_list:  # 如果播放列表為空
             return
-        if self.player.is_playing():
+        if self.is_playing():
             # 暫停當前歌曲，再播放下一首
             self.player.stop()
         
-        if self.repeat:
-            self.current_index = self.current_index
-        elif self.shuffle:
-            self.current_index = random.randint(0, len(self.song_list) - 1)
-        else:
-            self.current_index = (self.current_index + 1) % len(self.song_list)
-            
+        self.current_index = self.next_index()
+        if self.shuffle_queue:
+            self.shuffle_queue.popleft()
         self.load_and_play(self.current_index)
 
+    def next_index(self):
+        return self.upcoming(1)[0]
+
+    def upcoming(self, count):
+        # 依 repeat / shuffle 預測接下來的 count 首；隨機模式先抽好並記住，
+        # 讓預先準備與預讀的歌就是實際會播放的歌
+        if self.repeat:
+            return [self.current_index]
+        n = len(self.song_list)
+        if self.shuffle:
+            # 清單縮短後失效的位置直接丟掉
+            self.shuffle_queue = deque(i for i in self.shuffle_queue if i < n)
+            while len(self.shuffle_queue) < count:
+                self.shuffle_queue.append(random.randint(0, n - 1))
+            return list(self.shuffle_queue)[:count]
+        return list(dict.fromkeys((self.current_index + k) % n for k in range(1, count + 1)))
+
+    def prefetch_upcoming(self):
+        self.prefetcher.predict(self.playlist_model.path(i) for i in self.upcoming(self.prefetch_count))
+
+    def prepare_next(self):
+        # 無縫模式：預先建立下一首的 Media 並在 libvlc 的背景執行緒解析，
+        # 換歌時 demuxer 不必從頭探測檔案；不論是否無縫都預讀接下來幾首
+        if not self.song_list or self.current_index < 0:
+            return
+        self.prefetch_upcoming()
+        if not self.gapless or self.vlc_instance is None:
+            return
+        index = self.next_index()
+        tid = self.song_list[index]
+        if self.prepared is not None and self.prepared[:2] == (index, tid):
+            return
+        self.discard_prepared()
+        try:
+            media = self.vlc_instance.media_new(self.playlist_model.path(index))
+            media.parse_with_options(vlc.MediaParseFlag.local, -1)
+            self.prepared = (index, tid, media)
+        except Exception as e:
+            print(f"Error preparing next song: {e}")
+
+    def take_prepared(self, index):
+        prepared, self.prepared = self.prepared, None
+        if prepared is not None and prepared[:2] == (index, self.song_list[index]):
+            return prepared[2]
+        if prepared is not None:
+            prepared[2].release()
+        return self.vlc_instance.media_new(self.playlist_model.path(index))
+
+    def discard_prepared(self):
+        if self.prepared is not None:
+            self.prepared[2].release()
+            self.prepared = None
+
     def play_previous(self):
         if not self.song_list:  # 如果播放列表為空
             return
@@ -426,19 +2252,44 @@ class MusicPlayer(QWidget):
     def toggle_repeat(self):
         self.repeat = not self.repeat
         self.repeat_button.setChecked(self.repeat)
+        self.prepare_next()
 
     def toggle_shuffle(self):
         self.shuffle = not self.shuffle
         self.shuffle_button.setChecked(self.shuffle)
+        self.shuffle_queue.clear()
+        self.prepare_next()
+
+    def toggle_gapless(self):
+        self.gapless = not self.gapless
+        self.gapless_button.setChecked(self.gapless)
+        if self.gapless:
+            self.prepare_next()
+        else:
+            self.discard_prepared()
+
+    def toggle_normalize(self):
+        self.normalize = not self.normalize
+        self.normalize_button.setChecked(self.normalize)
+        if self.normalize:
+            self.analyze_loudness(self.library.unanalyzed())
+        if 0 <= self.current_index < len(self.song_list):
+            self.apply_gain(self.playlist_model.path(self.current_index))
 
     def set_volume(self, value):
-        self.player.audio_set_volume(value)
+        if self.player is not None:
+            self.player.audio_set_volume(value)
 
     def toggle_playlist_visibility(self):
         if self.toggle_playlist_button.isChecked():
             self.toggle_playlist_button.setText("▲ Files")
-            self.playlist_widget.show()
+            self.search_box.show()
+            self.sort_combo.show()
+            self.thumbs_button.show()
+            self.playlist_view.show()
             self.add_folder_button.show()
+            self.open_playlist_button.show()
+            self.save_playlist_button.show()
             # 恢復最小高度
             self.setMinimumHeight(500)
             # 如果當前高度小於最小高度，則調整到最小高度
@@ -446,13 +2297,36 @@ class MusicPlayer(QWidget):
                 self.resize(self.width(), 500)
         else:
             self.toggle_playlist_button.setText("▼ Files")
-            self.playlist_widget.hide()
+            self.search_box.hide()
+            self.sort_combo.hide()
+            self.thumbs_button.hide()
+            self.playlist_view.hide()
             self.add_folder_button.hide()
+            self.open_playlist_button.hide()
+            self.save_playlist_button.hide()
             # 設置較小的最小高度，但保持足夠空間給其他元素
             self.setMinimumHeight(250)
             # 調整視窗高度到較小的高度，但保持足夠空間
             self.resize(self.width(), 250)
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.progress.set_visible(not self.isMinimized())
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.progress.set_visible(False)
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        # 最小化時不一定會收到 hideEvent，這裡也一併處理
+        if event.type() == QEvent.WindowStateChange:
+            self.progress.set_visible(self.isVisible() and not self.isMinimized())
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.progress.set_pixels(min(self.progress_slider.width(), 1000))
+
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
             if self.title_bar.geometry().contains(event.pos()):
@@ -467,9 +2341,149 @@ class MusicPlayer(QWidget):
         if event.button() == Qt.LeftButton:
             self.dragging = False
 
-    def on_song_end(self, event):
+    def start_control_server(self):
+        # 單一執行個體：監聽本機 socket，接收之後啟動時轉送的參數與外部控制命令
+        if not ipc_available():
+            return False
+        self.control_bridge = ControlBridge()
+        self.control_bridge.request.connect(self.on_control_request)
+        server = ControlServer(self._submit_control, AUDIO_EXTENSIONS)
+        try:
+            server.start()
+        except OSError as e:
+            print(f"Error starting control server: {e}")
+            return False
+        self.control_server = server
+        return True
+
+    def _submit_control(self, request):
+        # 在 asyncio 執行緒中執行
+        future = Future()
+        self.control_bridge.request.emit(request, future)
+        return future
+
+    def on_control_request(self, request, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self.handle_command(request))
+        except Exception as e:
+            metrics.count("error.control")
+            future.set_exception(e)
+
+    def handle_command(self, request):
+        cmd = request.get("cmd")
+        if cmd == "play":
+            if "index" in request:
+                self.play_index(int(request["index"]))
+            elif self.current_index < 0:
+                self.play_index(0)
+            elif not self.is_playing():
+                self.toggle_play()
+        elif cmd == "pause":
+            if self.is_playing():
+                self.toggle_play()
+        elif cmd == "toggle":
+            if self.current_index < 0:
+                self.play_index(0)
+            else:
+                self.toggle_play()
+        elif cmd == "next":
+            self.play_next()
+        elif cmd == "previous":
+            self.play_previous()
+        elif cmd == "enqueue":
+            return {"ok": True, "added": self.enqueue(request["files"], request.get("play", False))}
+        elif cmd == "open":
+            self.open_paths(request["files"], request["folders"])
+            # 從檔案管理員開啟時把視窗帶到前面
+            self.showNormal()
+            self.raise_()
+            self.activateWindow()
+        elif cmd != "state":
+            raise ValueError(f"unknown command: {cmd}")
+        return dict(self.state(), ok=True)
+
+    def state(self):
+        index = self.current_index
+        current = 0 <= index < len(self.song_list)
+        return {
+            "playing": self.is_playing(),
+            "index": index if current else None,
+            "title": self.playlist_model.title(index) if current else None,
+            "path": self.playlist_model.path(index) if current else None,
+            "position_ms": self.progress.position() if current else None,
+            "length_ms": self.progress.length if current else None,
+            "tracks": len(self.song_list),
+            "repeat": self.repeat, "shuffle": self.shuffle,
+            "volume": self.volume_slider.value(),
+        }
+
+    def play_index(self, index):
+        if 0 <= index < len(self.song_list):
+            self.current_index = index
+            self.load_and_play(index)
+
+    def open_paths(self, files, folders):
+        # 命令列或第二次啟動傳入的路徑：資料夾取代音樂庫，檔案加入清單並播放第一首；
+        # 啟動還沒完成時先記下，等音樂庫載入後再處理
+        if not self.ready:
+            self.pending_open.append((files, folders))
+            return
+        if folders:
+            self.load_folder(folders[0])
+        if files:
+            self.enqueue(files, play=True)
+
+    def enqueue(self, files, play=False):
+        # files: (path, size, mtime)；已在清單中的歌不重複加入，整批一次插入
+        present = self.playlist_model.tracks_for(path for path, _, _ in files)
+        known = {self.playlist_model.store.path(tid) for tid in present}
+        fresh = [(path, size, mtime, None, None, None, None, None)
+                 for path, size, mtime in dict.fromkeys(files) if path not in known]
+        self.playlist_model.append(fresh)
+        self.tag_extractor.submit([row[:3] for row in fresh])
+        self.analyze_loudness([row[:3] for row in fresh])
+        if fresh:
+            self.sort_timer.start()
+        if play and files:
+            self.play_index(self.playlist_model.row_of(self.playlist_model.store.lookup(files[0][0])))
+        elif fresh:
+            self.prepare_next()
+        return len(fresh)
+
+    def closeEvent(self, event):
+        if self.control_server is not None:
+            self.control_server.close()
+        self.verify_timer.stop()
+        self.sort_timer.stop()
+        self.cancel_scan()
+        self.cancel_playlist()
+        self.watcher.close()
+        self.discard_prepared()
+        self.prefetcher.close()
+        if self.ready:
+            self.save_session()
+        self.tag_extractor.shutdown()
+        self.loudness_analyzer.shutdown()
+        self.waveform_token += 1
+        self.waveform_pool.shutdown(wait=False)
+        self.artwork.shutdown()
+        # 仍在佇列中的分析結果不能再寫入已關閉的索引
+        self.tag_bridge.ready.disconnect()
+        self.loudness_bridge.ready.disconnect()
+        self.tag_timer.stop()
+        self.library.store_tags(self.tag_rows)  # 還沒套用的結果照樣存起來，下次不必重新解析
+        self.tag_rows.clear()
+        self.library.close()
+        if metrics.enabled:
+            self.watchdog.stop()
+            metrics.flush()
+        super().closeEvent(event)
+
+    def on_song_end(self):
         try:
-            self.play_next
+            self.play_next()
         except Exception as e:
             print(f"Error during song change: {e}")
             QMessageBox.critical(self, "Error", f"Failed to load the next song: {e}")
@@ -486,89 +2500,36 @@ class MusicPlayer(QWidget):
         self.apply_theme(self.current_theme)
 
     def apply_theme(self, theme_name):
-        theme = self.themes[theme_name]
-        
-        # 更新視窗背景
+        # 樣式表只在第一次設定；之後切換主題只改變 theme 屬性，重新套用控制列等少數元件的樣式，
+        # 播放清單只換調色盤，不論有多少列都不必重新排版
         if theme_name == "translucent":
             self.setAttribute(Qt.WA_TranslucentBackground)
         else:
             self.setAttribute(Qt.WA_TranslucentBackground, False)
-        
-        # 設置樣式表
-        self.setStyleSheet(f"""
-            QWidget {{
-                background-color: {theme['background']};
-                color: {theme['text']};
-            }}
-            QWidget#title_bar {{
-                background-color: {theme['background']};
-            }}
-            QPushButton {{
-                background: transparent;
-                color: {theme['text']};
-                border: none;
-                font-size: 16px;
-                padding: 5px;
-            }}
-            QPushButton:hover {{
-                background: {theme['button_hover']};
-                border-radius: 3px;
-            }}
-            QPushButton#repeatButton:checked,
-            QPushButton#shuffleButton:checked {{
-                color: #4CAF50;
-                background: {theme['selected_bg']};
-                border-radius: 3px;
-            }}
-            QSlider::groove:horizontal {{
-                border: 1px solid {theme['text']};
-                height: 8px;
-                background: {theme['slider_bg']};
-                margin: 2px 0;
-                border-radius: 4px;
-            }}
-            QSlider::handle:horizontal {{
-                background: {theme['text']};
-                border: 1px solid {theme['background']};
-                width: 18px;
-                margin: -2px 0;
-                border-radius: 9px;
-            }}
-            QComboBox {{
-                background: {theme['combo_bg']};
-                border: none;
-                border-radius: 3px;
-                padding: 2px 5px;
-                color: {theme['text']};
-            }}
-            QComboBox::drop-down {{
-                border: none;
-            }}
-            QComboBox::down-arrow {{
-                image: none;
-                border: none;
-            }}
-            QListWidget::item:selected {{
-                background: {theme['selected_bg']};
-                color: {theme['text']};
-            }}
-            QListWidget::item {{
-                padding: 5px;
-            }}
-            QLabel#songLabel {{
-                color: {theme['text']};
-                font-size: 18px;
-                qproperty-alignment: AlignCenter;
-            }}
-            QLabel#timeLabel {{
-                color: {theme['text']};
-                font-size: 16px;
-                qproperty-alignment: AlignCenter;
-            }}
-        """)
+        self.setProperty("theme", theme_name)
+        # viewport 與捲軸的調色盤在套用樣式表時被單獨設定過，不會跟著清單改變，要逐一設定
+        palette = self.theme_palettes[theme_name]
+        for widget in [self.playlist_view] + self.playlist_view.findChildren(QWidget):
+            widget.setPalette(palette)
+        if self.styleSheet() != self.theme_style:
+            self.setStyleSheet(self.theme_style)
+            return
+        for widget in [self] + self.findChildren(QWidget):
+            if widget is self.playlist_view or self.playlist_view.isAncestorOf(widget):
+                continue
+            widget.style().unpolish(widget)
+            widget.style().polish(widget)
+            widget.update()
 
 if __name__ == "__main__":
+    stop_profiler = start_profiler()  # DMP_PROFILE=cprofile 或 sample 時啟用
     app = QApplication(sys.argv)
     window = MusicPlayer()
+    window.start_control_server()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if len(sys.argv) > 1:
+        window.open_paths(*resolve_paths(sys.argv[1:], os.getcwd(), AUDIO_EXTENSIONS))
+    code = app.exec_()
+    if stop_profiler is not None:
+        stop_profiler()
+    sys.exit(code)
\ No newline at end of file
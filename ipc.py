@@ -0,0 +1,211 @@
+# 單一執行個體與本機控制介面：執行中的播放器在資料目錄下監聽一個 Unix domain socket。
+# 協定是一行一個 JSON 物件的請求與回應，可連續送出多個請求（依序回應）：
+#   {"cmd": "play" | "pause" | "toggle" | "next" | "previous" | "state" | "ping"}
+#   {"cmd": "enqueue", "paths": [...], "play": false}
+#   {"cmd": "open", "args": [...], "cwd": "..."}（第二次啟動時轉送的命令列參數）
+# 伺服器在自己的執行緒中跑 asyncio；檔案的 stat 也在這裡完成，
+# 只有真正要操作播放器的部分才交給 Qt 主執行緒
+import asyncio
+import errno
+import json
+import os
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from library import data_dir
+
+# 這些命令需要先在背景確認路徑，再交給主執行緒
+PATH_COMMANDS = ("open", "enqueue")
+
+
+def ipc_available():
+    return hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+
+
+def socket_path():
+    return os.path.join(data_dir(), "dmp.sock")
+
+
+class Client:
+    # 同步的用戶端：不需要事件迴圈，第二次啟動時可以很快地轉送參數後結束
+    def __init__(self, path=None, timeout=5.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path or socket_path())
+        except OSError:
+            self.sock.close()
+            raise
+        self.file = self.sock.makefile("rb")
+
+    def send(self, request):
+        self.sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+    def receive(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("player closed the connection")
+        return json.loads(line)
+
+    def request(self, request):
+        self.send(request)
+        return self.receive()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def forward(args, path=None):
+    # 已有播放器在執行時把命令列參數交給它並回傳 True；沒有時回傳 False
+    if not ipc_available():
+        return False
+    try:
+        client = Client(path)
+    except OSError:
+        return False
+    # 連上之後請求可能已經被處理了：沒等到回應也不能再啟動第二個播放器
+    with client:
+        try:
+            response = client.request({"cmd": "open", "args": list(args), "cwd": os.getcwd()})
+        except socket.timeout:
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Could not hand the arguments to the running player: {e}")
+            return True
+    if not response.get("ok"):
+        print(f"Running player rejected the request: {response.get('error')}")
+    return True
+
+
+def resolve_paths(paths, cwd, extensions):
+    # 回傳 (歌曲列 (path, size, mtime_ns), 資料夾)；不存在或不是音樂檔的路徑略過
+    files, folders = [], []
+    for path in paths:
+        path = os.path.normpath(os.path.join(cwd, os.path.expanduser(path)))
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if os.path.isdir(path):
+            folders.append(path)
+        elif path.lower().endswith(extensions):
+            files.append((path, st.st_size, st.st_mtime_ns))
+    return files, folders
+
+
+def listen(path):
+    # 綁定 socket；已有播放器在監聽時丟出 FileExistsError，前一次異常結束留下的檔案則清掉重綁
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.bind(path)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)
+                sock.bind(path)
+            else:
+                raise FileExistsError(errno.EEXIST, "another player is listening", path)
+            finally:
+                probe.close()
+        os.chmod(path, 0o600)  # 只有同一個使用者可以控制播放器
+        sock.listen(64)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class ControlServer:
+    # dispatch(request) 在 asyncio 執行緒中呼叫，回傳 concurrent.futures.Future，
+    # 由主執行緒填入回應（dict）
+    def __init__(self, dispatch, extensions, path=None):
+        self.dispatch = dispatch
+        self.extensions = extensions
+        self.path = path or socket_path()
+        self.sock = None
+        self._server = None
+        self._writers = set()  # 目前連線中的用戶端
+        self._loop = None
+        self._thread = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dmp-ipc-stat")
+
+    def start(self):
+        self.sock = listen(self.path)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="dmp-ipc", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_unix_server(self._serve, sock=self.sock))
+        self._loop.run_forever()
+        # 不等待用戶端斷線，直接關閉仍連著的連線；等候主執行緒回應的請求不再等待
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        tasks = asyncio.all_tasks(self._loop)
+        if tasks:
+            self._loop.run_until_complete(asyncio.wait(tasks, timeout=0.2))
+        self._loop.close()
+
+    async def _serve(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self._handle(json.loads(line))
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        cmd = request.get("cmd")
+        if cmd == "ping":
+            # 不經過主執行緒，用來量測傳輸本身的延遲
+            return {"ok": True}
+        if cmd in PATH_COMMANDS:
+            paths = request.get("args" if cmd == "open" else "paths") or []
+            cwd = request.get("cwd") or os.getcwd()
+            request = dict(request)
+            request["files"], request["folders"] = await self._loop.run_in_executor(
+                self._io, resolve_paths, paths, cwd, self.extensions)
+        return await asyncio.wrap_future(self.dispatch(request))
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(1.0)
+            self._loop = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        self._io.shutdown(wait=False)
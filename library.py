@@ -0,0 +1,251 @@
+# 持久化的音樂庫索引（SQLite）：記錄每首歌的路徑、大小、修改時間與標籤
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# load() 回傳的欄位順序
+TRACK_COLUMNS = ("path", "size", "mtime", "title", "artist", "album", "duration", "trackno")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    parent TEXT,
+    mtime INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tracks_dir ON tracks(dir);
+CREATE TABLE IF NOT EXISTS tags (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    duration INTEGER,
+    trackno INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS loudness (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    lufs REAL,
+    peak REAL
+) WITHOUT ROWID;
+"""
+
+
+def data_dir():
+    # 使用者資料目錄，可用 DMP_HOME 環境變數覆寫（測試與 benchmark 使用）
+    path = os.environ.get("DMP_HOME") or os.path.join(os.path.expanduser("~"), ".dmp")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def atomic_write(path, mode="wb", **kwargs):
+    # 先寫暫存檔再改名，讀取端不會看到寫到一半的檔案；寫入失敗時刪除暫存檔。
+    # 暫存檔名含行程與執行緒，同時寫同一個檔案的執行緒不會互相干擾
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_session(path=None):
+    # 上次關閉時的播放狀態（目前的歌、位置、音量與各開關）；沒有或無法讀取時回傳空 dict
+    try:
+        with open(path or os.path.join(data_dir(), "session.json")) as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return session if isinstance(session, dict) else {}
+
+
+def save_session(session, path=None):
+    path = path or os.path.join(data_dir(), "session.json")
+    try:
+        with atomic_write(path, "w") as f:
+            json.dump(session, f)
+    except OSError as e:
+        print(f"Error saving session: {e}")
+
+
+def _under(path, root):
+    return path == root or path.startswith(os.path.join(root, ""))
+
+
+class LibraryIndex:
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(data_dir(), "library.db")
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def roots(self):
+        return [r for (r,) in self.conn.execute("SELECT path FROM roots")]
+
+    def set_roots(self, roots):
+        roots = [os.path.normpath(r) for r in roots]
+        with self.conn:
+            self.conn.execute("DELETE FROM roots")
+            self.conn.executemany("INSERT INTO roots VALUES (?)", [(r,) for r in roots])
+            # 移除不在任何根目錄底下的資料，保留其餘部分以便增量重新掃描
+            stale = [(d,) for (d,) in self.conn.execute("SELECT path FROM dirs")
+                     if not any(_under(d, r) for r in roots)]
+            self.conn.executemany("DELETE FROM tracks WHERE dir = ?", stale)
+            self.conn.executemany("DELETE FROM dirs WHERE path = ?", stale)
+
+    def add_root(self, path):
+        # 合併一個根目錄；已在既有根目錄底下時不變並回傳 False，包含既有根目錄時取代它們
+        path = os.path.normpath(path)
+        roots = self.roots()
+        if any(_under(path, r) for r in roots):
+            return False
+        self.set_roots([r for r in roots if not _under(r, path)] + [path])
+        return True
+
+    def load(self):
+        # 依路徑排序一次讀出全部歌曲，不觸碰檔案系統；
+        # 標籤快取以 (path, size, mtime) 為鍵，檔案變更後自動失效
+        return self.conn.execute(
+            "SELECT t.path, t.size, t.mtime, g.title, g.artist, g.album, g.duration, g.trackno"
+            " FROM tracks t LEFT JOIN tags g"
+            " ON g.path = t.path AND g.size = t.size AND g.mtime = t.mtime"
+            " ORDER BY t.path").fetchall()
+
+    def untagged(self):
+        # 尚未解析、或檔案在解析後有變動的歌曲
+        return self.conn.execute(
+            "SELECT t.path, t.size, t.mtime FROM tracks t LEFT JOIN tags g"
+            " ON g.path = t.path AND g.size = t.size AND g.mtime = t.mtime"
+            " WHERE g.path IS NULL").fetchall()
+
+    def store_tags(self, rows):
+        # rows: (path, size, mtime, title, artist, album, duration, trackno)
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _cached(self, table, columns, items):
+        # items: (path, size, mtime)；回傳 table 中大小與時間都相符（之後沒有變動）的列：path -> columns 的值
+        stored = {}
+        for i in range(0, len(items), 500):
+            chunk = [item[0] for item in items[i:i + 500]]
+            marks = ", ".join("?" * len(chunk))
+            for row in self.conn.execute(
+                    f"SELECT path, size, mtime, {columns} FROM {table} WHERE path IN ({marks})", chunk):
+                stored[row[0]] = row
+        cached = {}
+        for path, size, mtime in items:
+            row = stored.get(path)
+            if row is not None and row[1] == size and row[2] == mtime:
+                cached[path] = row[3:]
+        return cached
+
+    def cached_tags(self, items):
+        # 已解析過的歌：path -> (title, artist, album, duration, trackno)
+        return self._cached("tags", "title, artist, album, duration, trackno", items)
+
+    def cached_loudness(self, items):
+        # 已分析過響度的歌：path -> (lufs, peak)
+        return self._cached("loudness", "lufs, peak", items)
+
+    def unanalyzed(self):
+        # 尚未分析響度、或檔案在分析後有變動的歌曲
+        return self.conn.execute(
+            "SELECT t.path, t.size, t.mtime FROM tracks t LEFT JOIN loudness l"
+            " ON l.path = t.path AND l.size = t.size AND l.mtime = t.mtime"
+            " WHERE l.path IS NULL").fetchall()
+
+    def store_loudness(self, rows):
+        # rows: (path, size, mtime, lufs, peak)；無法分析的歌 lufs 為 NULL
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?, ?)", rows)
+
+    def loudness(self, path):
+        # 回傳 (lufs, peak)；沒有有效的分析結果時回傳 None。
+        # 以檔案目前的大小與時間比對，不在音樂庫中的歌（匯入的播放清單、從外部加入的檔案）也適用
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return self.conn.execute(
+            "SELECT lufs, peak FROM loudness WHERE path = ? AND size = ? AND mtime = ?",
+            (path, st.st_size, st.st_mtime_ns)).fetchone()
+
+    def dirs(self):
+        return [p for (p,) in self.conn.execute("SELECT path FROM dirs")]
+
+    def known_dirs(self):
+        return {path: (mtime, json.loads(subdirs))
+                for path, mtime, subdirs in self.conn.execute(
+                    "SELECT path, mtime, subdirs FROM dirs")}
+
+    def apply_scan(self, scanned):
+        # 將掃描結果寫入索引，回傳 (新增的歌曲列, 內容變更的 (path, size, mtime), 已移除的路徑)
+        added = []
+        changed_files = []
+        removed = []
+        cur = self.conn.cursor()
+        with self.conn:
+            for d in scanned:
+                old_files = {path: (size, mtime) for path, size, mtime in cur.execute(
+                    "SELECT path, size, mtime FROM tracks WHERE dir = ?", (d.path,))}
+                new_files = {path: (size, mtime) for path, size, mtime in d.files}
+
+                gone = [p for p in old_files if p not in new_files]
+                cur.executemany("DELETE FROM tracks WHERE path = ?", [(p,) for p in gone])
+                removed.extend(gone)
+
+                # 內容變更的檔案：更新大小與時間，舊的標籤快取隨之失效
+                changed = [(size, mtime, path) for path, (size, mtime) in new_files.items()
+                           if path in old_files and old_files[path] != (size, mtime)]
+                cur.executemany("UPDATE tracks SET size = ?, mtime = ? WHERE path = ?", changed)
+                changed_files.extend((path, size, mtime) for size, mtime, path in changed)
+
+                fresh = [(path, d.path, size, mtime) for path, size, mtime in d.files
+                         if path not in old_files]
+                cur.executemany(
+                    "INSERT INTO tracks (path, dir, size, mtime) VALUES (?, ?, ?, ?)", fresh)
+                added.extend((path, size, mtime, None, None, None, None, None)
+                             for path, _, size, mtime in fresh)
+
+                row = cur.execute("SELECT subdirs FROM dirs WHERE path = ?", (d.path,)).fetchone()
+                if row is not None:
+                    for name in set(json.loads(row[0])) - set(d.subdirs):
+                        removed.extend(self._drop_tree(cur, os.path.join(d.path, name)))
+                cur.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                            (d.path, d.parent, d.mtime, json.dumps(d.subdirs)))
+        return added, changed_files, removed
+
+    def _drop_tree(self, cur, path):
+        prefix = os.path.join(path, "")
+        n = len(prefix)
+        paths = [p for (p,) in cur.execute(
+            "SELECT path FROM tracks WHERE dir = ? OR substr(dir, 1, ?) = ?", (path, n, prefix))]
+        cur.execute("DELETE FROM tracks WHERE dir = ? OR substr(dir, 1, ?) = ?", (path, n, prefix))
+        cur.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, n, prefix))
+        return paths
@@ -0,0 +1,156 @@
+# 響度分析（ITU-R BS.1770 / EBU R128）：整合響度 (LUFS) 與取樣峰值。
+# K-weighting 在頻域套用：每 100 ms 一段做 rFFT，以濾波器的 |H(f)|² 加權後由 Parseval
+# 定理得到該段濾波後的能量，不需要逐樣本的 IIR 迴圈（也不需要 scipy）。
+# 400 ms 的量測區塊（75% 重疊）即四個相鄰小段的能量總和，再依 -70 LUFS 絕對閘門
+# 與 -10 LU 相對閘門求整合響度
+import math
+import os
+
+import numpy as np
+
+from audio import decode, wav_format
+from batchpool import BatchPool
+
+TARGET_LUFS = -18.0  # 與 ReplayGain 2.0 相同的參考響度
+MAX_GAIN_DB = 20.0  # VLC 等化器 preamp 的範圍是 ±20 dB
+
+
+def _biquad_power(b, a, freqs, rate):
+    z = np.exp(-2j * np.pi * freqs / rate)
+    h = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(h) ** 2
+
+
+def k_weighting(freqs, rate):
+    # BS.1770 的兩段濾波器（高頻架式 + 高通），係數依取樣率換算（與 libebur128 相同）
+    f0, gain, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / rate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _biquad_power(((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+                          (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0), freqs, rate)
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / rate)
+    a0 = 1 + k / q + k * k
+    highpass = _biquad_power((1.0, -2.0, 1.0), (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0), freqs, rate)
+    return shelf * highpass
+
+
+class LoudnessMeter:
+    def __init__(self, rate):
+        self.rate = rate
+        self.step = rate // 10  # 100 ms
+        self.weights = k_weighting(np.fft.rfftfreq(self.step, 1 / rate), rate)
+        self.energies = []  # 每 100 ms 一段、各聲道加總的平均能量
+        self.tail = None
+        self.peak = 0.0
+
+    def add(self, samples):
+        if samples.size:
+            self.peak = max(self.peak, float(np.abs(samples).max()))
+        if self.tail is not None and self.tail.size:
+            samples = np.concatenate((self.tail, samples))
+        whole = len(samples) - len(samples) % self.step
+        self.tail = samples[whole:]
+        if not whole:
+            return
+        # (段數, 聲道, 每段樣本數)
+        segments = samples[:whole].reshape(-1, self.step, samples.shape[1]).transpose(0, 2, 1)
+        spectrum = np.abs(np.fft.rfft(segments, axis=2)) ** 2
+        # 單邊頻譜：除了 DC 與 Nyquist 以外的頻率要計兩次
+        spectrum[..., 1:(self.step + 1) // 2] *= 2
+        energy = (spectrum * self.weights).sum(axis=2) / (self.step * self.step)
+        self.energies.append(energy.sum(axis=1))
+
+    def integrated(self):
+        if not self.energies:
+            return None
+        parts = np.concatenate(self.energies)
+        if len(parts) < 4:
+            return None
+        blocks = (parts[:-3] + parts[1:-2] + parts[2:-1] + parts[3:]) / 4
+        blocks = blocks[blocks > 0]
+        loudness = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[loudness > -70]
+        if not gated.size:
+            return None
+        relative = -0.691 + 10 * np.log10(gated.mean()) - 10
+        gated = gated[-0.691 + 10 * np.log10(gated) > relative]
+        return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def track_gain(lufs, peak, target=TARGET_LUFS):
+    # 要套用的增益 (dB)；正增益不超過讓峰值剛好到 0 dBFS 的量
+    if lufs is None:
+        return 0.0
+    gain = target - lufs
+    if peak and peak > 0:
+        gain = min(gain, -20 * math.log10(peak))
+    return max(-MAX_GAIN_DB, min(MAX_GAIN_DB, gain))
+
+
+_instance = None
+
+
+def analyze(path):
+    # 回傳 (整合響度 LUFS 或 None, 取樣峰值 或 None)
+    global _instance
+    meter = None
+
+    def sink(samples):
+        nonlocal meter
+        if meter is None:
+            meter = LoudnessMeter(rate)
+        meter.add(samples)
+
+    rate = 44100
+    pcm = False
+    if path.lower().endswith(".wav"):
+        try:
+            rate = wav_format(path)[0]
+            pcm = True
+        except Exception:
+            pass
+    # 不是 PCM WAV（包括壓縮過的 WAV）時 decode 改用 VLC，共用同一個 instance
+    if not pcm and _instance is None:
+        import vlc
+        _instance = vlc.Instance(["--quiet", "--no-video"])
+    complete, _ = decode(path, sink, instance=_instance)
+    if not complete or meter is None:
+        return None, None
+    return meter.integrated(), meter.peak
+
+
+def analyze_many(items):
+    # items: (path, size, mtime)；回傳 loudness 表的列，失敗的歌也記錄下來避免反覆重試
+    rows = []
+    for path, size, mtime in items:
+        try:
+            lufs, peak = analyze(path)
+        except Exception:
+            lufs, peak = None, None
+        rows.append((path, size, mtime, lufs, peak))
+    return rows
+
+
+def _lower_priority():
+    # 分析行程以較低的優先權執行，不和播放搶 CPU
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+class LoudnessAnalyzer(BatchPool):
+    # 以低優先權的 process pool 分析響度；同時送出的批次有上限，其餘排隊。on_result 會在背景執行緒被呼叫
+    def __init__(self, on_result, workers=None, chunk_size=4, max_in_flight=None):
+        workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        super().__init__(analyze_many, on_result, workers=workers, chunk_size=chunk_size,
+                         max_in_flight=max_in_flight or workers * 2, initializer=_lower_priority)
+        self.audio_bytes = 0
+
+    def _count(self, chunk, rows):
+        super()._count(chunk, rows)
+        self.audio_bytes += sum(size for _, size, _ in chunk)
@@ -0,0 +1,202 @@
+# 熱點路徑的量測：計時器、計數器、事件迴圈卡頓偵測與可選的 profiler。
+# 只有設定 DMP_METRICS=1 時才啟用；停用時 timed() 直接回傳原函式、wrap() 不做事，
+# 也不會建立任何計時器或執行緒，對播放器沒有額外成本。
+# 啟用後每隔一段時間把統計附加到資料目錄下的 metrics.jsonl（超過大小上限時輪替）
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from library import data_dir
+
+ENABLED = os.environ.get("DMP_METRICS", "") not in ("", "0")
+# DMP_PROFILE=cprofile 或 sample；結果寫入資料目錄
+PROFILE = os.environ.get("DMP_PROFILE", "")
+
+
+class Metrics:
+    MAX_SAMPLES = 10000  # 每個計時器在一個統計區間內保留的樣本數上限
+    MAX_FILE_BYTES = 1 << 20
+
+    def __init__(self, enabled=ENABLED, path=None):
+        self.enabled = enabled
+        self.path = path
+        self.timers = {}
+        self.counters = Counter()
+        self.stall_stacks = deque(maxlen=5)
+        self.window_start = time.time()
+
+    def record(self, name, seconds):
+        samples = self.timers.get(name)
+        if samples is None:
+            samples = self.timers[name] = []
+        if len(samples) < self.MAX_SAMPLES:
+            samples.append(seconds)
+        self.counters[name] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def snapshot(self, reset=True):
+        timers = {}
+        for name, samples in self.timers.items():
+            if not samples:
+                continue
+            samples = sorted(samples)
+            timers[name] = {
+                "n": self.counters[name],
+                "total_ms": sum(samples) * 1000,
+                "p50_ms": samples[len(samples) // 2] * 1000,
+                "p95_ms": samples[int(len(samples) * 0.95)] * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        now = time.time()
+        result = {
+            "time": now, "window_s": now - self.window_start, "timers": timers,
+            "counters": {k: v for k, v in self.counters.items() if k not in self.timers},
+        }
+        if self.stall_stacks:
+            result["stall_stacks"] = list(self.stall_stacks)
+        if reset:
+            self.timers = {}
+            self.counters = Counter()
+            self.stall_stacks.clear()
+            self.window_start = now
+        return result
+
+    def flush(self):
+        # 附加一行統計到 metrics.jsonl；檔案太大時輪替成 metrics.jsonl.1
+        if not self.enabled:
+            return
+        path = self.path or os.path.join(data_dir(), "metrics.jsonl")
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > self.MAX_FILE_BYTES:
+                os.replace(path, path + ".1")
+            with open(path, "a") as f:
+                f.write(json.dumps(self.snapshot()) + "\n")
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+    def timed(self, name):
+        # 方法的計時 decorator；停用時原封不動回傳
+        def decorate(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - t0)
+            return wrapper
+        return decorate
+
+    def wrap(self, obj, attr, name):
+        # 替單一物件（例如 vlc.MediaPlayer）的方法加上計時
+        if self.enabled:
+            setattr(obj, attr, self.timed(name)(getattr(obj, attr)))
+
+
+metrics = Metrics()
+timed = metrics.timed
+
+
+class StallWatchdog:
+    # 主執行緒定期呼叫 beat()；beat 延遲超過門檻即記為一次卡頓。
+    # 監看執行緒在卡頓「進行中」就擷取主執行緒的堆疊，才看得出是哪段程式碼卡住
+    def __init__(self, metrics, interval=0.05, threshold=0.1):
+        self.metrics = metrics
+        self.interval = interval
+        self.threshold = threshold
+        self.main_id = threading.get_ident()
+        self.last_beat = time.perf_counter()
+        self._captured = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dmp-watchdog", daemon=True)
+
+    def start(self):
+        self.last_beat = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def beat(self):
+        now = time.perf_counter()
+        late = now - self.last_beat - self.interval
+        self.last_beat = now
+        self._captured = False
+        if late > self.threshold:
+            self.metrics.record("stall", late)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._captured or time.perf_counter() - self.last_beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self.main_id)
+            if frame is not None:
+                self._captured = True
+                self.metrics.stall_stacks.append(
+                    [" ".join(line.split()) for line in traceback.format_stack(frame)[-12:]])
+
+
+class SamplingProfiler:
+    # 低成本的取樣 profiler：定期記錄主執行緒的呼叫堆疊，
+    # 輸出 collapsed stack 格式（可直接交給 flamegraph 工具）
+    def __init__(self, path, interval=0.005):
+        self.path = path
+        self.interval = interval
+        self.main_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dmp-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.main_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        with open(self.path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+def start_profiler(mode=PROFILE):
+    # 回傳一個停止並寫出結果的函式；沒有啟用時回傳 None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        path = os.path.join(data_dir(), "profile.prof")
+
+        def stop():
+            profiler.disable()
+            profiler.dump_stats(path)
+            print(f"cProfile stats written to {path}")
+        return stop
+    if mode == "sample":
+        sampler = SamplingProfiler(os.path.join(data_dir(), "profile-samples.txt"))
+        sampler.start()
+
+        def stop():
+            sampler.stop()
+            print(f"Sampled stacks written to {sampler.path}")
+        return stop
+    return None
@@ -0,0 +1,193 @@
+# 播放清單檔案（M3U / M3U8 / PLS）的讀寫。
+# 讀取時逐行串流解析，相對路徑以清單檔所在的目錄為準；檔案是否存在由背景執行緒分批以執行緒池平行檢查，
+# 存在的歌依清單順序分批回傳，大型清單（或網路磁碟上的清單）不必整份讀完才開始顯示
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from library import atomic_write
+from scanner import AUDIO_EXTENSIONS
+
+PLAYLIST_EXTENSIONS = (".m3u", ".m3u8", ".pls")
+
+
+def _decode(raw):
+    # 清單內的路徑照原本的位元組還原（非 UTF-8 的檔名也找得到，與 os.fsdecode 相同）
+    return raw.decode("utf-8", "surrogateescape")
+
+
+def resolve_entry(entry, base):
+    # 清單中的一項 -> 絕對路徑；串流網址等無法播放的項目回傳 None
+    entry = entry.strip()
+    if not entry:
+        return None
+    if entry[:7].lower() == "file://":
+        url = urlparse(entry)
+        entry = url2pathname(url.path)  # 會一併還原 %xx
+        if url.netloc and url.netloc != "localhost":
+            entry = f"//{url.netloc}{entry}"  # UNC 路徑
+    elif "://" in entry:
+        return None
+    elif os.sep == "/" and "\\" in entry:
+        # Windows 上產生的清單
+        entry = entry.replace("\\", "/")
+    return os.path.normpath(os.path.join(base, entry))
+
+
+def iter_entries(path):
+    # 逐一產生清單中的路徑（已轉成絕對路徑），依清單的順序；不會一次把整個檔案讀入
+    base = os.path.dirname(os.path.abspath(path))
+    pls = path.lower().endswith(".pls")
+    with open(path, "rb", buffering=1 << 20) as f:
+        for n, raw in enumerate(f):
+            line = _decode(raw)
+            if n == 0:
+                line = line.lstrip("\ufeff")
+            if pls:
+                key, sep, value = line.partition("=")
+                if not sep or not key.strip().lower().startswith("file"):
+                    continue
+                line = value
+            elif line.startswith("#"):
+                continue
+            entry = resolve_entry(line, base)
+            if entry is not None:
+                yield entry
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+
+class PlaylistReader:
+    # 在背景執行緒讀取清單：每 batch_size 項以執行緒池一起 stat，存在的音樂檔以 (path, size, mtime_ns)
+    # 依清單順序交給 on_batch；重複的歌只保留第一次出現的位置。回呼都在背景執行緒被呼叫
+    def __init__(self, path, on_batch, on_finished=None, workers=8, batch_size=500,
+                 flush_interval=0.1, extensions=AUDIO_EXTENSIONS):
+        self.path = path
+        self.on_batch = on_batch
+        self.on_finished = on_finished
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self._cancel = threading.Event()
+        self._thread = None
+
+        # 統計
+        self.entries = 0  # 清單中可解析的項目
+        self.found = 0  # 加入的歌
+        self.missing = 0  # 不存在或不是音樂檔
+        self.error = None  # 讀不到清單檔時的例外
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dmp-playlist", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def _run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dmp-playlist-stat") as pool:
+                self._read(pool)
+        except (OSError, ValueError) as e:
+            self.error = e
+        if self.on_finished is not None:
+            self.on_finished(self._cancel.is_set())
+
+    def _read(self, pool):
+        seen = set()
+        pending = []
+        ready = []
+        last_flush = 0.0
+        for entry in iter_entries(self.path):
+            if self._cancel.is_set():
+                return
+            self.entries += 1
+            if entry in seen:
+                continue
+            seen.add(entry)
+            pending.append(entry)
+            if len(pending) < self.batch_size:
+                continue
+            ready.extend(self._check(pool, pending))
+            pending = []
+            # 第一批立即送出；之後累積到 flush_interval，避免每批都觸發一次 UI 更新
+            now = time.monotonic()
+            if ready and (not last_flush or now - last_flush >= self.flush_interval):
+                self._flush(ready)
+                ready = []
+                last_flush = now
+        ready.extend(self._check(pool, pending))
+        if ready:
+            self._flush(ready)
+
+    def _check(self, pool, paths):
+        rows = []
+        for path, st in zip(paths, pool.map(_stat, paths)):
+            if st is not None and stat.S_ISREG(st.st_mode) and path.lower().endswith(self.extensions):
+                rows.append((path, st.st_size, st.st_mtime_ns))
+            else:
+                self.missing += 1
+        return rows
+
+    def _flush(self, rows):
+        if self._cancel.is_set():
+            return
+        self.found += len(rows)
+        self.on_batch(rows)
+
+
+def _relative(path, base):
+    # 清單檔所在目錄底下的歌寫成相對路徑，整個資料夾搬到別處（或從別的電腦掛載）仍然有效
+    if path.startswith(base):
+        return path[len(base):]
+    return path
+
+
+def write_playlist(path, entries, chunk=4096):
+    # entries: (path, 長度 ms 或 None, 顯示名稱)。依副檔名寫成 PLS 或（擴充的）M3U，一律使用 UTF-8；
+    # 每 chunk 項組成一個字串一次寫入；寫入失敗時原本的清單檔不受影響
+    base = os.path.join(os.path.dirname(os.path.abspath(path)), "")
+    pls = path.lower().endswith(".pls")
+    count = 0
+    with atomic_write(path, "w", encoding="utf-8", errors="surrogateescape", newline="\n",
+                      buffering=1 << 20) as f:
+        f.write("[playlist]\n" if pls else "#EXTM3U\n")
+        lines = []
+        for count, (track, length, title) in enumerate(entries, 1):
+            seconds = -1 if length is None else round(length / 1000)
+            # 換行會破壞一行一項的格式
+            title = (title or os.path.basename(track)).replace("\r", " ").replace("\n", " ")
+            if pls:
+                lines.append(f"File{count}={_relative(track, base)}\nTitle{count}={title}\nLength{count}={seconds}\n")
+            else:
+                lines.append(f"#EXTINF:{seconds},{title}\n{_relative(track, base)}\n")
+            if len(lines) >= chunk:
+                f.write("".join(lines))
+                lines = []
+        f.write("".join(lines))
+        if pls:
+            f.write(f"NumberOfEntries={count}\nVersion=2\n")
+    return count
@@ -0,0 +1,173 @@
+# 預讀即將播放的歌：在背景把檔案讀進作業系統的 page cache，VLC 開檔時不必等待慢速儲存（NFS/SMB）。
+# 先讀每首歌的開頭與結尾（demuxer 探測、開始播放與檔尾標籤所需），預算還有剩再讀完整首。
+# 支援 posix_fadvise 時先送出 WILLNEED 讓核心非同步預讀，但網路檔案系統常忽略這個提示，
+# 所以仍以固定大小的區塊實際讀過一次；資料讀進同一個重複使用的緩衝區後即丟棄，行程本身不佔記憶體
+import os
+import threading
+from collections import OrderedDict
+
+HEAD_BYTES = 1 << 20
+TAIL_BYTES = 128 << 10  # ID3v1/APE 標籤與部分 MP4 的 moov 在檔尾
+CHUNK_BYTES = 256 << 10
+BUDGET_BYTES = 64 << 20  # 一次預測中所有歌曲預讀量的上限
+MAX_ENTRIES = 256
+
+
+def evict(path):
+    # 把檔案移出 page cache（benchmark 用來製造冷快取）
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+class Prefetcher:
+    def __init__(self, budget=BUDGET_BYTES, head=HEAD_BYTES, tail=TAIL_BYTES, chunk=CHUNK_BYTES):
+        self.budget = budget
+        self.head = head
+        self.tail = tail
+        self._buffer = memoryview(bytearray(chunk))
+        self._cond = threading.Condition()
+        self._wanted = []  # 依優先順序排列的路徑
+        self._generation = 0  # 每次 predict/pause 遞增，讓背景執行緒放棄手上的工作
+        self._closed = False
+        self._thread = None
+        # 已預讀的檔案：path -> ((size, mtime), 是否整首讀完)；以 LRU 限制數量
+        self.warm = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+
+    def predict(self, paths):
+        with self._cond:
+            if self._closed:
+                return
+            paths = list(dict.fromkeys(paths))
+            if paths == self._wanted:
+                return
+            self._wanted = paths
+            self._generation += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="dmp-prefetch", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pause(self):
+        # 停止目前的預讀，例如正在開啟要播放的歌時不和它搶頻寬
+        with self._cond:
+            self._wanted = []
+            self._generation += 1
+
+    def claim(self, path):
+        # 要播放 path 時呼叫：回傳它是否已預讀，並計入命中率
+        with self._cond:
+            hit = path in self.warm and self.warm[path][0] == self._stat(path)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return hit
+
+    def stats(self):
+        with self._cond:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else None,
+                    "mb_read": self.bytes_read / 2 ** 20}
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._wanted = []
+            self._generation += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def _current(self, generation):
+        return self._generation == generation and not self._closed
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._wanted and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation, paths = self._generation, self._wanted
+            self._warm_all(generation, paths)
+            with self._cond:
+                if self._generation == generation:
+                    self._wanted = []
+
+    def _warm_all(self, generation, paths):
+        # 第一輪：每首的開頭與結尾；第二輪：依序把整首讀完，直到用完預算
+        remaining = self.budget
+        plans = []
+        for path in paths:
+            key = self._stat(path)
+            if key is None:
+                continue
+            size = key[0]
+            head = min(size, self.head)
+            tail = min(size - head, self.tail)
+            with self._cond:
+                known = self.warm.get(path)
+            done = known is not None and known[0] == key
+            if not done:
+                if head + tail > remaining:
+                    break
+                if not (self._read(generation, path, 0, head)
+                        and self._read(generation, path, size - tail, tail)):
+                    return
+                self._mark(path, key, size == head + tail)
+            remaining -= head + tail
+            plans.append((path, key, head, size - tail, done and known[1]))
+        for path, key, start, end, full in plans:
+            if full or start >= end:
+                continue
+            if end - start > remaining:
+                # 預算不夠讀完整首時只讀一部分，但不標記為讀完
+                if remaining > 0:
+                    self._read(generation, path, start, remaining)
+                return
+            if not self._read(generation, path, start, end - start):
+                return
+            remaining -= end - start
+            self._mark(path, key, True)
+
+    def _mark(self, path, key, full):
+        with self._cond:
+            self.warm[path] = (key, full)
+            self.warm.move_to_end(path)
+            while len(self.warm) > MAX_ENTRIES:
+                self.warm.popitem(last=False)
+
+    def _read(self, generation, path, offset, length):
+        # 讀完回傳 True；被新的預測取代或讀取失敗時回傳 False
+        try:
+            with open(path, "rb", buffering=0) as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), offset, length, os.POSIX_FADV_WILLNEED)
+                f.seek(offset)
+                while length > 0:
+                    if not self._current(generation):
+                        return False
+                    n = f.readinto(self._buffer[:min(length, len(self._buffer))])
+                    if not n:
+                        break
+                    length -= n
+                    self.bytes_read += n
+        except OSError:
+            return False
+        return True
@@ -0,0 +1,172 @@
+# 背景資料夾掃描器：以執行緒池遞迴走訪目錄，並分批串流回傳找到的音樂檔
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac')
+
+# 一個實際列出內容的目錄：files 為 (path, size, mtime_ns)，subdirs 為子目錄名稱
+ScannedDir = namedtuple("ScannedDir", "path parent mtime files subdirs")
+
+
+class FolderScanner:
+    def __init__(self, roots, on_batch, on_progress=None, on_finished=None,
+                 workers=8, batch_size=256, flush_interval=0.1,
+                 extensions=AUDIO_EXTENSIONS, known_dirs=None):
+        if isinstance(roots, str):
+            roots = [roots]
+        self.roots = list(roots)
+        # {目錄: (mtime_ns, [子目錄名稱])}；mtime 沒變的目錄不再重新列出
+        self.known_dirs = known_dirs or {}
+        self.on_batch = on_batch
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.extensions = tuple(ext.lower() for ext in extensions)
+
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._buffer = []
+        self._buffered_files = 0
+        self._last_flush = 0.0
+        self._last_progress = 0.0
+        self._flushed_once = False
+
+        # 進度統計
+        self.dirs_found = 0
+        self.dirs_done = 0
+        self.dirs_skipped = 0
+        self.files_found = 0
+        self.errors = 0
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def running(self):
+        return self._executor is not None and not self._done.is_set()
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="dmp-scan")
+        roots = [r for r in self.roots if os.path.isdir(r)]
+        if not roots:
+            self._finish()
+            return
+        with self._lock:
+            self._pending = len(roots)
+            self.dirs_found = len(roots)
+        for root in roots:
+            self._executor.submit(self._scan_dir, root, None)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _scan_dir(self, path, parent):
+        result = None
+        subdirs = []
+        if not self._cancel.is_set():
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                known = self.known_dirs.get(path)
+                if known is not None and known[0] == mtime:
+                    # 目錄內容未變：沿用已知的子目錄，不必重新列出檔案
+                    subdirs = [os.path.join(path, name) for name in known[1]]
+                else:
+                    result = self._list_dir(path, parent, mtime)
+                    subdirs = [os.path.join(path, name) for name in result.subdirs]
+            except OSError:
+                with self._lock:
+                    self.errors += 1
+
+        with self._lock:
+            if self._cancel.is_set():
+                # 取消後列出的子目錄不計入 _pending，也就不必結清
+                subdirs = []
+            else:
+                self._pending += len(subdirs)
+                self.dirs_found += len(subdirs)
+                if result is None:
+                    self.dirs_skipped += 1
+                else:
+                    self.files_found += len(result.files)
+                    self._buffer.append(result)
+                    self._buffered_files += len(result.files) + 1
+            self.dirs_done += 1
+            self._pending -= 1
+            finished = self._pending == 0
+            now = time.monotonic()
+            # 第一批盡快送出，讓第一首歌可以在掃描完成前開始播放
+            if self._buffer and (finished or not self._flushed_once
+                                 or self._buffered_files >= self.batch_size
+                                 or now - self._last_flush >= self.flush_interval):
+                batch = self._buffer
+                self._buffer = []
+                self._buffered_files = 0
+                self._last_flush = now
+                self._flushed_once = True
+                # 在鎖內送出，確保所有批次都在 on_finished 之前到達
+                if not self._cancel.is_set():
+                    self.on_batch(batch)
+            progress = None
+            # 進度回報同樣節流，避免每個目錄都觸發一次 UI 更新
+            if finished or now - self._last_progress >= self.flush_interval:
+                self._last_progress = now
+                progress = (self.dirs_done, self.dirs_found, self.files_found)
+
+        if progress is not None and self.on_progress is not None:
+            self.on_progress(*progress)
+
+        if finished:
+            self._finish()
+            return
+        for sub in subdirs:
+            if self._cancel.is_set():
+                # 已取消：直接把尚未處理的子目錄結清
+                self._mark_skipped()
+                continue
+            self._executor.submit(self._scan_dir, sub, path)
+
+    def _list_dir(self, path, parent, mtime):
+        files = []
+        subdirs = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.name.lower().endswith(self.extensions) and entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.path, st.st_size, st.st_mtime_ns))
+                except OSError:
+                    continue
+        files.sort()
+        subdirs.sort()
+        return ScannedDir(path, parent, mtime, files, subdirs)
+
+    def _mark_skipped(self):
+        with self._lock:
+            self._pending -= 1
+            finished = self._pending == 0
+        if finished:
+            self._finish()
+
+    def _finish(self):
+        if self._done.is_set():
+            return
+        self._done.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self.on_finished is not None:
+            self.on_finished(self._cancel.is_set())
@@ -0,0 +1,195 @@
+# 播放清單搜尋索引：詞彙表 + 每個詞的 posting list，詞彙表另有 trigram 索引。
+# 查詢字詞不含空白，所以「字詞是文件的子字串」等同於「字詞是文件中某個詞的子字串」，
+# 只要在（遠小於文件數的）詞彙表上找子字串即可。
+import os
+from array import array
+from bisect import bisect_left
+
+
+def search_text(path, title=None, artist=None, album=None):
+    # 檔名（不含副檔名）加上標籤欄位，統一轉成 casefold 方便比對
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return " ".join(f for f in (stem, title, artist, album) if f).casefold()
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    COMPACT_MIN_DEAD = 10000
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.texts = []  # doc id -> 文字；已刪除的 doc 為空字串
+        self.keys = []  # doc id -> key
+        self.doc_of = {}  # key -> 目前有效的 doc id
+        self.word_ids = {}  # 詞 -> word id
+        self.words = []  # word id -> 詞
+        self.word_docs = []  # word id -> array of doc id（遞增）
+        self.word_grams = {}  # trigram -> array of word id
+        self.dead = 0
+        self.generation = 0
+        self._last_query = None
+        self._last_docs = None
+
+    def __len__(self):
+        return len(self.doc_of)
+
+    def add(self, key, text):
+        # 同一個 key 再次加入時視為更新，保留原本的 doc id（也就是原本的順序）
+        doc = self.doc_of.get(key)
+        if doc is not None:
+            self._update(doc, text)
+            return
+        doc = len(self.texts)
+        self.texts.append(text)
+        self.keys.append(key)
+        self.doc_of[key] = doc
+        word_ids = self.word_ids
+        for word in set(text.split()):
+            wid = word_ids.get(word)
+            if wid is None:
+                wid = self._new_word(word)
+            self.word_docs[wid].append(doc)
+        self.generation += 1
+
+    def _update(self, doc, text):
+        # 舊詞的 posting 不移除（查詢時一律以文字再確認），新詞則依序插入
+        old_words = set(self.texts[doc].split())
+        self.texts[doc] = text
+        for word in set(text.split()) - old_words:
+            wid = self.word_ids.get(word)
+            if wid is None:
+                wid = self._new_word(word)
+            posting = self.word_docs[wid]
+            i = bisect_left(posting, doc)
+            if i == len(posting) or posting[i] != doc:
+                posting.insert(i, doc)
+        self.generation += 1
+
+    def _new_word(self, word):
+        wid = len(self.words)
+        self.word_ids[word] = wid
+        self.words.append(word)
+        self.word_docs.append(array("I"))
+        grams = self.word_grams
+        for gram in _trigrams(word):
+            posting = grams.get(gram)
+            if posting is None:
+                grams[gram] = array("I", (wid,))
+            else:
+                posting.append(wid)
+        return wid
+
+    def add_many(self, items):
+        for key, text in items:
+            self.add(key, text)
+        self._maybe_compact()
+
+    def remove(self, key):
+        doc = self.doc_of.pop(key, None)
+        if doc is not None:
+            self.texts[doc] = ""
+            self.dead += 1
+            self.generation += 1
+
+    def remove_many(self, keys):
+        for key in keys:
+            self.remove(key)
+        self._maybe_compact()
+
+    def match(self, key, query):
+        doc = self.doc_of.get(key)
+        if doc is None:
+            return False
+        text = self.texts[doc]
+        return all(token in text for token in query.casefold().split())
+
+    def search(self, query):
+        # 回傳符合的 key 清單（依加入順序）；空查詢回傳 None 表示不篩選
+        folded = query.casefold()
+        tokens = folded.split()
+        if not tokens:
+            self._last_query = None
+            return None
+        last = self._last_query
+        if last is not None and last[0] == self.generation and folded.startswith(last[1]):
+            # 逐字輸入時結果只會變少，直接從上一次的結果繼續篩，
+            # 且上一次已經滿足的字詞不必再比對
+            docs = self._last_docs
+            done = set(last[2])
+        else:
+            docs, done = self._seed(tokens)
+        texts = self.texts
+        for token in tokens:
+            if token not in done:
+                docs = [d for d in docs if token in texts[d]]
+                done.add(token)
+        self._last_query = (self.generation, folded, tokens)
+        self._last_docs = docs
+        keys = self.keys
+        return [keys[d] for d in docs]
+
+    def _seed(self, tokens):
+        # 挑出 posting 總量最小的字詞作為起點，回傳的候選都已確認包含該字詞；
+        # 其餘字詞只在候選上做子字串比對
+        texts = self.texts
+        limit = len(texts) // 2
+        best = None
+        for token in set(tokens):
+            if len(token) < 3:
+                continue
+            wids = self._words_containing(token)
+            total = 0
+            for w in wids:
+                total += len(self.word_docs[w])
+                if total > limit:
+                    break
+            if best is None or total < best[0]:
+                best = (total, token, wids)
+        if best is None or best[0] > limit:
+            # 只有很短或很常見的字詞時，直接線性掃描所有文件反而最快
+            if len(tokens) == 1:
+                a = tokens[0]
+                return [d for d, text in enumerate(texts) if a in text], {a}
+            a, b = tokens[0], tokens[1]
+            return [d for d, text in enumerate(texts) if a in text and b in text], {a, b}
+        total, token, wids = best
+        if len(wids) == 1:
+            docs = self.word_docs[wids[0]]
+        else:
+            docs = set()
+            for w in wids:
+                docs.update(self.word_docs[w])
+            docs = sorted(docs)
+        # posting 可能含有已刪除或已更新的 doc
+        return [d for d in docs if token in texts[d]], {token}
+
+    def _words_containing(self, token):
+        words = self.words
+        lists = []
+        for gram in _trigrams(token):
+            posting = self.word_grams.get(gram)
+            if posting is None:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            if len(candidates) * 8 < len(posting):
+                break
+            candidates.intersection_update(posting)
+        return [w for w in candidates if token in words[w]]
+
+    def _maybe_compact(self):
+        # 刪除的 doc 多於有效的 doc 時重建，回收 posting list 與詞彙表
+        if self.dead < self.COMPACT_MIN_DEAD or self.dead < len(self.doc_of):
+            return
+        items = sorted(self.doc_of.items(), key=lambda item: item[1])
+        texts = [(key, self.texts[doc]) for key, doc in items]
+        self.clear()
+        for key, text in texts:
+            self.add(key, text)
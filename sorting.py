@@ -0,0 +1,98 @@
+# 播放清單的排序：每首歌每種排序方式只計算一次排序鍵並快取，再把鍵換成整數排名。
+# 重新排序時只是以 track id 查排名後做穩定的 argsort，不必逐次比較字串或呼叫比較函式
+import re
+import sys
+from array import array
+
+import numpy as np
+
+from tracks import NO_VALUE
+
+# 排序方式：自然排序的檔名、完整路徑、演出者/專輯/曲目編號、長度
+SORT_MODES = ("name", "path", "artist", "duration")
+
+# 依標籤計算的排序方式，標籤更新後鍵要重新計算
+TAG_MODES = ("artist", "duration")
+
+_DIGITS = re.compile(r"(\d+)")
+_LAST = "\U0010ffff"  # 沒有值的欄位排在最後
+_SEP = "\0\0"  # 組合鍵的欄位分隔；比 natural_key 中數字段落的標記（\0 加長度）小，短的欄位排在前面
+
+
+def natural_key(text):
+    # 不分大小寫，數字段落依數值比較（"2" 在 "10" 之前）。
+    # 數字段落改寫成「\0、長度、去掉前導零的數字」，結果仍是單純的字串，可以直接比較
+    parts = _DIGITS.split(text.casefold())
+    for i in range(1, len(parts), 2):
+        digits = parts[i].lstrip("0") or "0"
+        parts[i] = "\0" + chr(len(digits)) + digits
+    return "".join(parts)
+
+
+class SortKeys:
+    def __init__(self, store):
+        self.store = store
+        self._keys = {}  # 排序方式 -> list，track id -> 鍵；None 表示還沒計算或已失效
+        self._ranks = {}  # 排序方式 -> array，track id -> 依鍵排序的名次（鍵相同的名次相同）
+
+    def clear(self):
+        self._keys = {}
+        self._ranks = {}
+
+    def invalidate(self, tids, modes=SORT_MODES):
+        for mode in modes:
+            self._ranks.pop(mode, None)
+            keys = self._keys.get(mode)
+            if keys is None:
+                continue
+            for tid in tids:
+                if tid < len(keys):
+                    keys[tid] = None
+
+    def keys(self, mode, tids):
+        # 補齊 tids 中還沒有的鍵，回傳整個鍵表
+        keys = self._keys.setdefault(mode, [])
+        if len(keys) < len(self.store):
+            keys.extend([None] * (len(self.store) - len(keys)))
+        make = getattr(self, f"_{mode}_key")
+        for tid in tids:
+            if keys[tid] is None:
+                keys[tid] = make(tid)
+        return keys
+
+    def sorted(self, tids, mode):
+        # 回傳排序後的 track id（array）。有新歌或鍵失效時以鍵排序一次並重建名次，之後只用名次排序
+        rank = self._ranks.get(mode)
+        if rank is not None and len(rank) == len(self.store):
+            ids = np.frombuffer(array("I", tids), dtype=np.uint32)
+            order = ids[np.argsort(np.frombuffer(rank, dtype=np.uint32)[ids], kind="stable")]
+            return array("I", order.tobytes())
+        keys = self.keys(mode, tids)
+        order = sorted(tids, key=keys.__getitem__)
+        rank = array("I", [0]) * len(self.store)
+        previous, place = None, 0
+        for i, tid in enumerate(order):
+            key = keys[tid]
+            if key != previous:
+                previous, place = key, i
+            rank[tid] = place
+        self._ranks[mode] = rank
+        return array("I", order)
+
+    def _name_key(self, tid):
+        return natural_key(self.store.name(tid))
+
+    def _path_key(self, tid):
+        # 與音樂庫索引 ORDER BY path 的順序相同
+        return self.store.path(tid)
+
+    def _artist_key(self, tid):
+        store = self.store
+        artist, album = store.artist(tid), store.album(tid)
+        trackno = store.tracknos[tid]
+        return _SEP.join((natural_key(artist) if artist else _LAST, natural_key(album) if album else _LAST,
+                          _LAST if trackno == NO_VALUE else f"{trackno:010d}", natural_key(store.name(tid))))
+
+    def _duration_key(self, tid):
+        duration = self.store.durations[tid]
+        return sys.maxsize if duration == NO_VALUE else duration
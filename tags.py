@@ -0,0 +1,324 @@
+# 標籤解析：ID3v2/ID3v1 (MP3)、FLAC Vorbis comments、WAV 標頭與 LIST INFO
+# 只依賴標準函式庫，方便在 process pool 的子行程中匯入
+import os
+import struct
+
+from batchpool import BatchPool
+from tracks import MAX_NUMBER
+
+TAG_FIELDS = ("title", "artist", "album", "duration", "trackno")
+
+_ID3_FRAMES = {
+    "TIT2": "title", "TT2": "title",
+    "TPE1": "artist", "TP1": "artist",
+    "TALB": "album", "TAL": "album",
+    "TRCK": "trackno", "TRK": "trackno",
+    "TLEN": "duration", "TLE": "duration",
+}
+_VORBIS_KEYS = {"TITLE": "title", "ARTIST": "artist", "ALBUM": "album", "TRACKNUMBER": "trackno"}
+_INFO_KEYS = {b"INAM": "title", b"IART": "artist", b"IPRD": "album", b"ITRK": "trackno", b"IPRT": "trackno"}
+
+# MPEG 音訊 bitrate（kbps）與取樣率表
+_MPEG_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MPEG_BITRATES[(2, 3)] = _MPEG_BITRATES[(2, 2)]
+_MPEG_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _syncsafe(b):
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _decode_text(data):
+    if not data:
+        return ""
+    enc, data = data[0], data[1:]
+    if enc == 0:
+        text = data.decode("latin-1")
+    elif enc == 1:
+        text = data.decode("utf-16", "replace")
+    elif enc == 2:
+        text = data.decode("utf-16-be", "replace")
+    else:
+        text = data.decode("utf-8", "replace")
+    # 多值欄位以 NUL 分隔，只取第一個
+    return text.split("\x00")[0].strip()
+
+
+def _track_number(value):
+    try:
+        return int(str(value).split("/")[0].strip())
+    except ValueError:
+        return None
+
+
+def _finish(tags):
+    if tags.get("trackno") is not None and not isinstance(tags["trackno"], int):
+        tags["trackno"] = _track_number(tags["trackno"])
+    # 長度與曲目編號以 32 位元整數存放，超出範圍的是損壞的標籤
+    for key in ("duration", "trackno"):
+        if tags.get(key) is not None and not 0 <= tags[key] <= MAX_NUMBER:
+            tags[key] = None
+    for key in ("title", "artist", "album"):
+        if not tags.get(key):
+            tags[key] = None
+    return tags
+
+
+def _frame_body(body, major, fflags, tag_flags):
+    # 去掉 frame 內容前的附加資料並還原 unsynchronisation；壓縮或加密的 frame 無法處理，回傳 None
+    if fflags & (0x0C if major == 4 else 0xC0):
+        return None
+    if major == 3 and fflags & 0x20:
+        body = body[1:]  # 群組識別碼
+    if major == 4:
+        if fflags & 0x40:
+            body = body[1:]
+        if fflags & 0x01:
+            body = body[4:]  # 資料長度
+        if fflags & 0x02 or tag_flags & 0x80:
+            body = body.replace(b"\xff\x00", b"\xff")
+    return body
+
+
+def read_id3v2(f, wanted, max_size=None):
+    # f 位於 ID3v2 標籤可能的開頭。回傳 (標籤之後的位置, [(frame id, 內容)])，依標籤中的順序；
+    # 只讀入 wanted 中的 frame，其他的（例如不需要的封面）直接跳過，超過 max_size 的視為損壞。
+    # 沒有 ID3v2 標籤時位置為原本的位置
+    start = f.tell()
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"ID3":
+        return start, []
+    major, flags = header[3], header[5]
+    size = _syncsafe(header[6:10])
+    end = start + 10 + size + (10 if flags & 0x10 else 0)
+
+    if flags & 0x80 and major < 4:
+        # 整個標籤經過 unsynchronisation，只能一次讀入後還原
+        data = f.read(size).replace(b"\xff\x00", b"\xff")
+        size = len(data)
+
+        def read(pos, n):
+            return data[pos:pos + n]
+    else:
+        def read(pos, n):
+            f.seek(start + 10 + pos)
+            return f.read(n)
+
+    pos = 0
+    if flags & 0x40:
+        ext = read(0, 4)
+        pos = _syncsafe(ext) if major == 4 else struct.unpack(">I", ext)[0] + 4
+    head_len = 6 if major == 2 else 10
+    frames = []
+    while pos + head_len <= size:
+        fh = read(pos, head_len)
+        if len(fh) < head_len or fh[0] == 0:
+            break
+        if major == 2:
+            fid, fsize, fflags = fh[:3].decode("latin-1"), int.from_bytes(fh[3:6], "big"), 0
+        else:
+            fid = fh[:4].decode("latin-1")
+            fsize = _syncsafe(fh[4:8]) if major == 4 else struct.unpack(">I", fh[4:8])[0]
+            fflags = fh[9]
+        pos += head_len
+        if pos + fsize > size:
+            break
+        if fid in wanted and fsize and (max_size is None or fsize <= max_size):
+            body = _frame_body(read(pos, fsize), major, fflags, flags)
+            if body:
+                frames.append((fid, body))
+        pos += fsize
+    return end, frames
+
+
+def flac_blocks(f, wanted, max_size=None):
+    # f 位於 fLaC 標記可能的位置。回傳 wanted 中類型的 metadata 區塊 [(類型, 內容)]，
+    # 其他區塊直接跳過，超過 max_size 的視為損壞；不是 FLAC 時回傳 None
+    if f.read(4) != b"fLaC":
+        return None
+    blocks = []
+    last = False
+    while not last:
+        head = f.read(4)
+        if len(head) < 4:
+            break
+        last, kind = bool(head[0] & 0x80), head[0] & 0x7F
+        length = int.from_bytes(head[1:4], "big")
+        if kind in wanted and (max_size is None or length <= max_size):
+            blocks.append((kind, f.read(length)))
+        else:
+            f.seek(length, os.SEEK_CUR)
+    return blocks
+
+
+def _read_id3v2(f, tags):
+    # 回傳音訊資料的起始位置；沒有 ID3v2 時為 0
+    end, frames = read_id3v2(f, _ID3_FRAMES)
+    for fid, body in frames:
+        field = _ID3_FRAMES[fid]
+        text = _decode_text(body)
+        if field == "duration":
+            tags[field] = int(text) if text.isdigit() else None
+        else:
+            tags[field] = text
+    return end
+
+
+def _read_id3v1(f, tags):
+    f.seek(-128, os.SEEK_END)
+    data = f.read(128)
+    if data[:3] != b"TAG":
+        return
+    def text(b):
+        return b.split(b"\x00")[0].decode("latin-1").strip()
+    tags.setdefault("title", text(data[3:33]))
+    tags.setdefault("artist", text(data[33:63]))
+    tags.setdefault("album", text(data[63:93]))
+    if data[125] == 0 and data[126]:
+        tags.setdefault("trackno", data[126])
+
+
+def _mp3_duration(f, start, file_size):
+    # 由第一個 MPEG frame 估算長度：有 Xing/Info/VBRI 標頭時用 frame 數，否則視為 CBR
+    f.seek(start)
+    buf = f.read(8192)
+    i = buf.find(b"\xff")
+    while 0 <= i < len(buf) - 4:
+        b1, b2 = buf[i + 1], buf[i + 2]
+        if b1 & 0xE0 == 0xE0:
+            ver_bits, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+            br_idx, sr_idx = b2 >> 4, (b2 >> 2) & 3
+            if ver_bits != 1 and layer_bits != 0 and 0 < br_idx < 15 and sr_idx < 3:
+                version = {3: 1, 2: 2, 0: 2.5}[ver_bits]
+                layer = 4 - layer_bits
+                rate = _MPEG_RATES[version][sr_idx]
+                bitrate = _MPEG_BITRATES[(1 if version == 1 else 2, layer)][br_idx] * 1000
+                if layer == 1:
+                    spf = 384
+                elif layer == 3 and version != 1:
+                    spf = 576
+                else:
+                    spf = 1152
+                mono = (buf[i + 3] >> 6) == 3
+                side = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+                xing = i + 4 + side
+                for tag, off in ((b"Xing", xing), (b"Info", xing), (b"VBRI", i + 36)):
+                    if buf[off:off + 4] == tag:
+                        if tag == b"VBRI":
+                            frames = struct.unpack(">I", buf[off + 14:off + 18])[0]
+                        elif struct.unpack(">I", buf[off + 4:off + 8])[0] & 1:
+                            frames = struct.unpack(">I", buf[off + 8:off + 12])[0]
+                        else:
+                            continue
+                        return int(frames * spf * 1000 / rate)
+                return int((file_size - start - i) * 8 * 1000 / bitrate)
+        i = buf.find(b"\xff", i + 1)
+    return None
+
+
+def read_mp3(f, file_size):
+    tags = {}
+    start = _read_id3v2(f, tags)
+    if file_size >= 128:
+        _read_id3v1(f, tags)
+    if not tags.get("duration"):
+        tags["duration"] = _mp3_duration(f, start, file_size)
+    return tags
+
+
+def read_flac(f, file_size):
+    tags = {}
+    start, _ = read_id3v2(f, ())
+    f.seek(start)
+    for kind, block in flac_blocks(f, (0, 4)) or ():
+        if kind == 0:
+            rate = int.from_bytes(block[10:13], "big") >> 4
+            total = int.from_bytes(block[13:18], "big") & 0xFFFFFFFFF
+            if rate:
+                tags["duration"] = int(total * 1000 / rate)
+        else:
+            vendor = struct.unpack("<I", block[:4])[0]
+            pos = 4 + vendor
+            count = struct.unpack("<I", block[pos:pos + 4])[0]
+            pos += 4
+            for _ in range(count):
+                n = struct.unpack("<I", block[pos:pos + 4])[0]
+                key, _, value = block[pos + 4:pos + 4 + n].decode("utf-8", "replace").partition("=")
+                pos += 4 + n
+                field = _VORBIS_KEYS.get(key.upper())
+                if field is not None and field not in tags:
+                    tags[field] = value.strip()
+    return tags
+
+
+def read_wav(f, file_size):
+    tags = {}
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return tags
+    byte_rate = 0
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        cid, size = chunk[:4], struct.unpack("<I", chunk[4:8])[0]
+        if cid == b"fmt ":
+            fmt = f.read(size)
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+        elif cid == b"data":
+            if byte_rate:
+                # 串流錄音的 data 大小可能不正確，以實際檔案大小為上限
+                size = min(size, file_size - f.tell())
+                tags["duration"] = int(size * 1000 / byte_rate)
+            f.seek(size, os.SEEK_CUR)
+        elif cid == b"LIST":
+            body = f.read(size)
+            if body[:4] == b"INFO":
+                pos = 4
+                while pos + 8 <= len(body):
+                    sid, n = body[pos:pos + 4], struct.unpack("<I", body[pos + 4:pos + 8])[0]
+                    field = _INFO_KEYS.get(sid)
+                    if field is not None:
+                        tags[field] = body[pos + 8:pos + 8 + n].split(b"\x00")[0].decode("utf-8", "replace").strip()
+                    pos += 8 + n + (n & 1)
+        else:
+            f.seek(size, os.SEEK_CUR)
+        if size & 1:
+            f.seek(1, os.SEEK_CUR)
+    return tags
+
+
+_READERS = {".mp3": read_mp3, ".flac": read_flac, ".wav": read_wav}
+
+
+def read_tags(path):
+    tags = {}
+    reader = _READERS.get(os.path.splitext(path)[1].lower())
+    if reader is not None:
+        try:
+            with open(path, "rb") as f:
+                tags = reader(f, os.fstat(f.fileno()).st_size)
+        except (OSError, ValueError, struct.error, IndexError, KeyError):
+            tags = {}
+    return _finish(tags)
+
+
+def read_tags_many(items):
+    # process pool 的工作單位：items 為 (path, size, mtime)，回傳可直接寫入索引的列
+    rows = []
+    for path, size, mtime in items:
+        tags = read_tags(path)
+        rows.append((path, size, mtime) + tuple(tags.get(k) for k in TAG_FIELDS))
+    return rows
+
+
+class TagExtractor(BatchPool):
+    # 以 process pool 批次解析標籤；on_result 會在背景執行緒被呼叫
+    def __init__(self, on_result, workers=None, chunk_size=64):
+        super().__init__(read_tags_many, on_result, workers=workers, chunk_size=chunk_size)
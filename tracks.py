@@ -0,0 +1,221 @@
+# 精簡的歌曲儲存：每首歌以整數 track id 表示，欄位分開存放在 array / bytearray 中。
+# 目錄字串只存一份（目錄表），檔名與曲名以 UTF-8 連續存放在 bytearray，
+# 演出者與專輯名稱重複率高，同樣以字串表去重，百萬首的音樂庫也只佔幾十 MB
+import os
+from array import array
+
+NO_VALUE = -1  # duration / trackno 沒有值
+MAX_NUMBER = 0x7FFFFFFF  # duration / trackno 以 32 位元有號整數存放
+DEAD = 0xFFFFFFFF  # 已移除的歌曲在 dir_of 中的標記
+
+
+def _number(value):
+    # 索引中可能留有舊版寫入、超出範圍的數字，視為沒有值
+    if value is None or not 0 <= value <= MAX_NUMBER:
+        return NO_VALUE
+    return value
+
+
+class StringTable:
+    # 去重的字串表；id 0 保留給 None
+    def __init__(self):
+        self.strings = [None]
+        self.ids = {None: 0}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, text):
+        sid = self.ids.get(text)
+        if sid is None:
+            sid = self.ids[text] = len(self.strings)
+            self.strings.append(text)
+        return sid
+
+    def get(self, text):
+        return self.ids.get(text)
+
+
+class TextColumn:
+    # 每列一段 UTF-8 文字，全部串接在同一個 bytearray；修改時把新值接在尾端
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q")
+        self.lengths = array("I")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, text):
+        self.offsets.append(len(self.data))
+        if not text:
+            self.lengths.append(0)
+            return
+        raw = text.encode("utf-8", "surrogateescape")
+        self.lengths.append(len(raw))
+        self.data += raw
+
+    def set(self, row, text):
+        raw = text.encode("utf-8", "surrogateescape") if text else b""
+        if len(raw) <= self.lengths[row]:
+            # 不比舊值長時直接覆寫原位置
+            start = self.offsets[row]
+            self.data[start:start + len(raw)] = raw
+        else:
+            self.offsets[row] = len(self.data)
+            self.data += raw
+        self.lengths[row] = len(raw)
+
+    def raw(self, row):
+        start = self.offsets[row]
+        return self.data[start:start + self.lengths[row]]
+
+    def get(self, row):
+        if not self.lengths[row]:
+            return None
+        return self.raw(row).decode("utf-8", "surrogateescape")
+
+    def equals(self, row, raw):
+        start = self.offsets[row]
+        length = self.lengths[row]
+        return length == len(raw) and self.data[start:start + length] == raw
+
+    def nbytes(self):
+        return (len(self.data) + self.offsets.itemsize * len(self.offsets)
+                + self.lengths.itemsize * len(self.lengths))
+
+
+class TrackStore:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.dirs = StringTable()
+        self.dir_of = array("I")  # track id -> 目錄 id
+        self.names = TextColumn()  # track id -> 檔名
+        self.titles = TextColumn()
+        self.people = StringTable()  # 演出者與專輯名稱共用
+        self.artists = array("I")
+        self.albums = array("I")
+        self.durations = array("i")
+        self.tracknos = array("i")
+        self.dir_tracks = [None]  # 目錄 id -> 該目錄中的 track id，用於依路徑查找
+        self.removed = 0
+        self._hint = None  # 上一次查找到的 (目錄 id, 位置)
+
+    def __len__(self):
+        # track id 的數量（含已移除的）
+        return len(self.dir_of)
+
+    def alive(self, tid):
+        return self.dir_of[tid] != DEAD
+
+    def add(self, rows):
+        # rows 為音樂庫索引的列：(path, size, mtime, title, artist, album, duration, trackno)，
+        # 回傳依序配發的 track id
+        first = len(self.dir_of)
+        dirs = self.dirs
+        dir_tracks = self.dir_tracks
+        tid = first
+        for row in rows:
+            directory, name = os.path.split(row[0])
+            # 先算好所有欄位再寫入，任何一個值有問題時各欄位的長度仍然一致
+            tags = self._tag_values(row)
+            did = dirs.intern(directory)
+            if did == len(dir_tracks):
+                dir_tracks.append(array("I"))
+            dir_tracks[did].append(tid)
+            self.dir_of.append(did)
+            self.names.append(name)
+            title, artist, album, duration, trackno = tags
+            self.titles.append(title)
+            self.artists.append(artist)
+            self.albums.append(album)
+            self.durations.append(duration)
+            self.tracknos.append(trackno)
+            tid += 1
+        return array("I", range(first, tid))
+
+    def _tag_values(self, row):
+        title, artist, album, duration, trackno = row[3:8]
+        return (title, self.people.intern(artist or None), self.people.intern(album or None),
+                _number(duration), _number(trackno))
+
+    def set_tags(self, rows):
+        # 依路徑更新標籤，回傳有對應到的 track id
+        updated = []
+        for row in rows:
+            tid = self.lookup(row[0])
+            if tid < 0:
+                continue
+            title, artist, album, duration, trackno = self._tag_values(row)
+            self.titles.set(tid, title)
+            self.artists[tid] = artist
+            self.albums[tid] = album
+            self.durations[tid] = duration
+            self.tracknos[tid] = trackno
+            updated.append(tid)
+        return updated
+
+    def remove(self, tids):
+        for tid in tids:
+            did = self.dir_of[tid]
+            if did == DEAD:
+                continue
+            tracks = self.dir_tracks[did]
+            del tracks[tracks.index(tid)]
+            self.dir_of[tid] = DEAD
+            self.removed += 1
+        self._hint = None
+
+    def lookup(self, path):
+        # 路徑 -> track id，找不到時回傳 -1。
+        # 只在同一目錄的歌曲中比對檔名；連續查找同一目錄時（例如依序回來的標籤）
+        # 先試上一次位置的下一個，通常一次就命中
+        directory, name = os.path.split(path)
+        did = self.dirs.get(directory)
+        if did is None:
+            return -1
+        tracks = self.dir_tracks[did]
+        raw = name.encode("utf-8", "surrogateescape")
+        names = self.names
+        start = 0
+        if self._hint is not None and self._hint[0] == did:
+            start = self._hint[1] + 1
+        n = len(tracks)
+        for i in range(n):
+            pos = (start + i) % n
+            if names.equals(tracks[pos], raw):
+                self._hint = (did, pos)
+                return tracks[pos]
+        return -1
+
+    def path(self, tid):
+        return os.path.join(self.dirs.strings[self.dir_of[tid]], self.names.get(tid))
+
+    def name(self, tid):
+        return self.names.get(tid)
+
+    def title(self, tid):
+        return self.titles.get(tid)
+
+    def artist(self, tid):
+        return self.people.strings[self.artists[tid]]
+
+    def album(self, tid):
+        return self.people.strings[self.albums[tid]]
+
+    def duration(self, tid):
+        value = self.durations[tid]
+        return None if value == NO_VALUE else value
+
+    def trackno(self, tid):
+        value = self.tracknos[tid]
+        return None if value == NO_VALUE else value
+
+    def nbytes(self):
+        # 欄位本身佔用的位元組數（不含字串表中的 Python 字串）
+        arrays = (self.dir_of, self.artists, self.albums, self.durations, self.tracknos)
+        return (sum(a.itemsize * len(a) for a in arrays)
+                + self.names.nbytes() + self.titles.nbytes()
+                + sum(a.itemsize * len(a) for a in self.dir_tracks[1:]))
@@ -0,0 +1,130 @@
+# Linux inotify 的精簡包裝（ctypes，不需額外套件）。
+# inotify 不會遞迴監看，每個目錄各自加入；read() 只回報哪些目錄有變動，
+# 實際差異交給增量重新掃描計算
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+# 只關心會改變目錄內容或檔案大小/時間的事件；IN_MODIFY 在寫入過程中會大量觸發，
+# 改用 IN_CLOSE_WRITE 在寫完時通知一次
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK)
+
+_EVENT = struct.Struct("iIII")
+
+
+def inotify_available():
+    return sys.platform.startswith("linux")
+
+
+class Inotify:
+    def __init__(self, extensions=None):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        # 只有檔名符合副檔名的檔案事件才算數；目錄事件一律計入
+        self.extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self.paths = {}  # wd -> 目錄
+        self.wds = {}  # 目錄 -> wd
+        self.failed = 0
+        self.limit_reached = False
+
+    def fileno(self):
+        return self.fd
+
+    def __len__(self):
+        return len(self.wds)
+
+    def add(self, path):
+        if path in self.wds:
+            return True
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # ENOSPC 表示超過 max_user_watches；目錄已不存在時也會失敗
+            self.failed += 1
+            if ctypes.get_errno() == errno.ENOSPC:
+                self.limit_reached = True
+            return False
+        self.paths[wd] = path
+        self.wds[path] = wd
+        return True
+
+    def remove(self, path):
+        wd = self.wds.pop(path, None)
+        if wd is not None:
+            del self.paths[wd]
+            self._rm_watch(self.fd, wd)
+
+    def clear(self):
+        for path in list(self.wds):
+            self.remove(path)
+
+    def read(self):
+        # 讀出所有待處理的事件，回傳 (有變動的目錄集合, 是否溢位)
+        changed = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                path = self.paths.get(wd)
+                if path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # 目錄被刪除或移走，核心已自動移除監看
+                    del self.paths[wd]
+                    self.wds.pop(path, None)
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    # 移走的目錄之後的事件會對應到錯誤的路徑，直接停止監看，由上層目錄處理
+                    changed.add(os.path.dirname(path))
+                    if mask & IN_MOVE_SELF:
+                        self.remove(path)
+                elif mask & IN_ISDIR or self._wanted(name):
+                    changed.add(path)
+        return changed, overflow
+
+    def _wanted(self, name):
+        return self.extensions is None or os.fsdecode(name).lower().endswith(self.extensions)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+            self.paths.clear()
+            self.wds.clear()
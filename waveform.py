@@ -0,0 +1,79 @@
+# 波形概覽：把整首歌解碼後縮成 BINS 個峰值（uint8），供進度條繪製。
+# 結果以 .npy 存在資料目錄的 waveforms/ 之下，以 (path, size, mtime) 為鍵，載入時以 mmap 開啟
+import hashlib
+import os
+
+import numpy as np
+
+from audio import decode
+from library import atomic_write, data_dir
+
+BINS = 1000  # 與進度條的範圍 0..1000 相同
+BLOCK = 1024  # 先以固定長度的 frame 區塊取峰值，最後再縮成 BINS 個
+
+
+class PeakAccumulator:
+    # 逐段加入 (frames, channels) 的 float32 樣本，只保留每個區塊的最大絕對值
+    def __init__(self):
+        self.blocks = []
+        self.tail = np.zeros(0, dtype=np.float32)
+
+    def add(self, samples):
+        mono = np.abs(samples).max(axis=1) if samples.ndim == 2 else np.abs(samples)
+        if self.tail.size:
+            mono = np.concatenate((self.tail, mono))
+        whole = mono.size - mono.size % BLOCK
+        if whole:
+            self.blocks.append(mono[:whole].reshape(-1, BLOCK).max(axis=1))
+        self.tail = mono[whole:]
+
+    def finish(self, bins=BINS):
+        parts = self.blocks + ([np.array([self.tail.max()], dtype=np.float32)] if self.tail.size else [])
+        if not parts:
+            return np.zeros(bins, dtype=np.uint8)
+        coarse = np.concatenate(parts)
+        # 每個 bin 取所涵蓋區塊的最大值；區塊比 bin 少時重複取用
+        edges = (np.arange(bins) * len(coarse)) // bins
+        peaks = np.maximum.reduceat(coarse, edges)
+        return np.clip(np.rint(peaks * 255), 0, 255).astype(np.uint8)
+
+
+def compute_peaks(path, bins=BINS, cancelled=None, instance=None):
+    acc = PeakAccumulator()
+    complete, _ = decode(path, acc.add, cancelled=cancelled, instance=instance)
+    return acc.finish(bins) if complete else None
+
+
+class WaveformCache:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(data_dir(), "waveforms")
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(self.path, digest[:2], digest + ".npy")
+
+    def load(self, key):
+        try:
+            return np.load(self._file(key), mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def store(self, key, peaks):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            np.save(f, peaks)
+
+
+def track_peaks(path, cache, cancelled=None, instance=None):
+    # 讀取或計算一首歌的峰值；回傳 (peaks, 是否來自快取)，取消或失敗時 peaks 為 None
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    peaks = cache.load(key)
+    if peaks is not None:
+        return peaks, True
+    peaks = compute_peaks(path, cancelled=cancelled, instance=instance)
+    if peaks is not None:
+        cache.store(key, peaks)
+    return peaks, False